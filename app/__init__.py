@@ -7,6 +7,7 @@ from flask_cors import CORS
 # Import config and initialization functions
 from .config import config
 from .ml_models import initialize_models, are_models_ready # Import initialization function
+from .llm_client import warm_up_model
 
 def create_app():
     """Create and configure the Flask application instance."""
@@ -38,6 +39,11 @@ def create_app():
     else:
         app.logger.info("Models detected as already initialized.")
 
+    # Load the LLM into Ollama now, not on the first user request (pointless if the app cannot serve)
+    if are_models_ready():
+        warm_up_model()
+    else:
+        app.logger.warning("Skipping the Ollama warm-up: models failed to initialize.")
 
     # Register Blueprints (routes)
     from .routes import main_bp
@@ -0,0 +1,208 @@
+# app/answer_cache.py
+"""
+Semantic answer cache in front of the Ollama call.
+
+A cached answer is reused when a new query was answered from exactly the
+same retrieved chunks, in the same language, and its embedding is close
+enough (cosine >= ANSWER_CACHE_SIMILARITY) to a previously answered query.
+Entries are grouped by that scope, so a lookup is a single matrix-vector
+product over the few entries that share it.
+
+The cache is per worker process, bounded by entry count, TTL and an
+approximate memory cap, and is dropped when the corpus changes. The corpus
+version, polled every ANSWER_CACHE_VERSION_CHECK_INTERVAL seconds, is
+max(data.id) plus the latest category_profile update. Every loader run
+that changes the corpus (an in-place sync, a full reload that swaps in
+shadow tables, or a rollback) ends with rebuild_category_profiles, which
+bumps the profile timestamp. A sync that only deletes files leaves
+max(id) unchanged, so invalidation then depends on that rebuild
+succeeding; if it fails, cached answers live until their TTL.
+"""
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+import numpy as np
+import psycopg2
+
+from .config import config
+from .db import get_pool
+
+# Bookkeeping overhead per entry (dict slots, scope tuple, dataclass) on top of
+# the embedding and the response text.
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+@dataclass
+class _Entry:
+    scope: Hashable
+    embedding: np.ndarray
+    response: str
+    expires_at: float
+    size: int
+
+
+def get_corpus_version() -> Optional[tuple]:
+    """
+    Returns a cheap fingerprint of the loaded corpus (highest chunk id and the
+    last category profile update), or None if the database is unavailable.
+    """
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT (SELECT max(id) FROM data), (SELECT max(updated_at) FROM category_profile);"
+            )
+            return tuple(cur.fetchone())
+    except psycopg2.Error as e:
+        logging.warning(f"Could not read the corpus version: {e}")
+        return None
+
+
+class SemanticAnswerCache:
+    """
+    A thread-safe LRU + TTL cache of generated answers, looked up by query
+    embedding similarity within a (language, retrieved chunk ids) scope.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_bytes: int, similarity: float,
+                 version_check_interval: float, name: str = "answers"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.similarity = similarity
+        self.version_check_interval = version_check_interval
+        self.name = name
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._scopes: Dict[Hashable, list[int]] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._corpus_version: Optional[tuple] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_scope(language: str, chunk_ids: Iterable[int]) -> tuple:
+        """The cache scope of a query: its language and the set of retrieved chunk ids."""
+        return (language, tuple(sorted(chunk_ids)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size
+        scope_ids = self._scopes[entry.scope]
+        scope_ids.remove(entry_id)
+        if not scope_ids:
+            del self._scopes[entry.scope]
+
+    def _check_corpus_version(self) -> None:
+        """Clears the cache if the corpus changed since the last check (rate-limited)."""
+        now = time.monotonic()
+        if self.version_check_interval <= 0 or now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = get_corpus_version()
+        if version is None:
+            return
+        with self._lock:
+            if self._corpus_version is not None and version != self._corpus_version and self._entries:
+                logging.info(f"Corpus changed ({self._corpus_version} -> {version}); dropping {len(self._entries)} cached answers.")
+                self._clear_locked()
+                self.invalidations += 1
+            self._corpus_version = version
+
+    def get(self, query_embedding: Optional[np.ndarray], language: str, chunk_ids: Iterable[int]) -> Optional[str]:
+        """Returns a cached answer for a semantically equivalent query, or None."""
+        if not self.enabled or query_embedding is None:
+            return None
+        self._check_corpus_version()
+        scope = self.make_scope(language, chunk_ids)
+        with self._lock:
+            now = time.monotonic()
+            for entry_id in list(self._scopes.get(scope, ())):
+                if self.ttl > 0 and self._entries[entry_id].expires_at <= now:
+                    self._remove(entry_id)
+            entry_ids = self._scopes.get(scope)
+            if not entry_ids:
+                self.misses += 1
+                return None
+            matrix = np.stack([self._entries[entry_id].embedding for entry_id in entry_ids])
+            similarities = matrix @ np.asarray(query_embedding, dtype=np.float32)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity:
+                self.misses += 1
+                return None
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            logging.info(f"Answer cache hit (similarity {similarities[best]:.3f}).")
+            return self._entries[entry_id].response
+
+    def set(self, query_embedding: Optional[np.ndarray], language: str, chunk_ids: Iterable[int], response: str) -> None:
+        """Stores a generated answer, evicting least recently used entries beyond the size/memory caps."""
+        if not self.enabled or query_embedding is None or not response:
+            return
+        embedding = np.array(query_embedding, dtype=np.float32)
+        scope = self.make_scope(language, chunk_ids)
+        size = embedding.nbytes + sys.getsizeof(response) + sys.getsizeof(scope[1]) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(scope, embedding, response, time.monotonic() + self.ttl, size)
+            self._scopes.setdefault(scope, []).append(entry_id)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _clear_locked(self) -> None:
+        self._entries.clear()
+        self._scopes.clear()
+        self._bytes = 0
+
+    def clear(self) -> None:
+        """Removes all entries (counters are kept)."""
+        with self._lock:
+            self._clear_locked()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns size, memory use and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "memory_mib": round(self._bytes / (1024 * 1024), 3),
+                "max_memory_mib": round(self.max_bytes / (1024 * 1024), 3),
+                "similarity_threshold": self.similarity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    maxsize=config.ANSWER_CACHE_SIZE if config.ANSWER_CACHE_ENABLED else 0,
+    ttl=config.ANSWER_CACHE_TTL,
+    max_bytes=int(config.ANSWER_CACHE_MAX_MB * 1024 * 1024),
+    similarity=config.ANSWER_CACHE_SIMILARITY,
+    version_check_interval=config.ANSWER_CACHE_VERSION_CHECK_INTERVAL,
+)
@@ -0,0 +1,253 @@
+# app/asgi_app.py
+"""
+Asyncio serving path. POST /chat and /health are native async endpoints; all
+other routes are served by the Flask app through an ASGI adapter.
+
+Within a chat request the Ollama call is awaited on an async HTTP client,
+CPU-bound work (query embedding, category routing) runs on a small bounded
+thread pool, and the database query runs on a thread pool sized to the DB
+connection pool. A slow LLM answer therefore only holds a coroutine, so one
+worker process can keep hundreds of conversations in flight.
+"""
+import time
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+import psycopg2
+from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from .config import config
+from .llm_client import get_async_ollama_client, get_chat_kwargs
+from .ml_models import are_models_ready, enable_async_serving, inference_batching_enabled
+from .rag_core import QueryContext, select_categories, fetch_context_chunks
+from .context_builder import assemble_context
+from .utils import extract_message_content
+from .chat_service import (
+    NOT_READY_ERROR,
+    RETRIEVAL_ERROR,
+    INSUFFICIENT_CONTEXT_RESPONSE,
+    GENERATION_FAILED_RESPONSE,
+    SSE_HEADERS,
+    ChatRequestError,
+    ChatStream,
+    parse_chat_request,
+    build_context_text,
+    has_sufficient_context,
+    build_ollama_messages,
+    ollama_error_message,
+    get_cached_answer,
+    cache_answer,
+)
+
+# Executors are created lazily so none of their threads exist in the
+# preloading gunicorn master at fork time.
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_cpu_executor() -> ThreadPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        max_workers = config.ASYNC_CPU_WORKERS
+        if inference_batching_enabled():
+            # Threads mostly wait on the batcher; allow enough callers to fill a batch
+            max_workers = max(max_workers, config.INFERENCE_BATCH_MAX_SIZE)
+        _cpu_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-cpu")
+    return _cpu_executor
+
+
+def _get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=config.DB_POOL_MAX_SIZE, thread_name_prefix="rag-db")
+    return _db_executor
+
+
+async def _run_in(executor: ThreadPoolExecutor, func: Callable, *args):
+    """Awaits func(*args) on the given executor."""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args))
+
+
+async def retrieve_context_async(query: str, context: QueryContext) -> list[dict]:
+    """
+    Async counterpart of rag_core.retrieve_context: like it, returns [] on
+    database errors, so the request gets the insufficient-context answer.
+    """
+    selected_categories = await _run_in(_get_cpu_executor(), select_categories, query, context)
+    if not selected_categories:
+        logging.warning(f"No categories selected for query '{query[:50]}...', cannot retrieve context.")
+        return []
+    query_embedding = await _run_in(_get_cpu_executor(), lambda: context.embedding)
+    try:
+        return await _run_in(_get_db_executor(), fetch_context_chunks, selected_categories, query_embedding, query)
+    except psycopg2.Error as db_err:
+        logging.exception(f"Database error during context retrieval: {db_err}")
+        return [] # Return empty list on DB error
+    except Exception as e:
+        logging.exception(f"General error during context retrieval: {e}")
+        return [] # Return empty list on other errors
+
+
+def _log_cache_write_error(future: Future) -> None:
+    """Done callback of the fire-and-forget answer cache write."""
+    error = future.exception()
+    if error is not None:
+        logging.error(f"Storing the answer in the cache failed: {error!r}")
+
+
+async def _stream_chat_response(ollama_messages: list, request_start: float, retrieval_ms: float, on_complete=None):
+    """Async generator yielding SSE frames for a streamed Ollama chat completion."""
+    chat_stream = ChatStream(request_start, retrieval_ms, on_complete)
+    try:
+        logging.info(f"Streaming from Ollama at {config.OLLAMA_HOST} with model {config.OLLAMA_MODEL}")
+        ollama_client = get_async_ollama_client()
+        stream = await ollama_client.chat(
+            messages=ollama_messages,
+            stream=True,
+            **get_chat_kwargs()
+        )
+        async for chunk in stream:
+            frame = chat_stream.feed(chunk)
+            if frame:
+                yield frame
+    except Exception as ollama_error:
+        yield chat_stream.error(ollama_error)
+        return
+
+    for frame in chat_stream.finish():
+        yield frame
+
+
+async def chat_api(request: Request):
+    """Async version of routes.chat_api (same request/response contract)."""
+    request_start = time.perf_counter()
+    if not are_models_ready():
+        logging.warning("Received /chat request before models were ready.")
+        return JSONResponse({'error': NOT_READY_ERROR}, status_code=503)
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    try:
+        user_message, selected_language, stream_response = parse_chat_request(payload)
+    except ChatRequestError as e:
+        return JSONResponse({'error': e.message}, status_code=e.status)
+
+    logging.info(f"Processing user message: '{user_message[:100]}...' in language: {selected_language}")
+
+    # 1. Retrieve Context using RAG
+    try:
+        query_context = QueryContext(user_message)
+        context_chunks = await retrieve_context_async(user_message, query_context)
+        # Dedupe, pick by MMR and fit the chunks into the prompt's token budget (CPU work, off the event loop)
+        context_chunks = await _run_in(
+            _get_cpu_executor(), assemble_context, context_chunks, query_context, selected_language
+        )
+        context_text = build_context_text(context_chunks)
+    except Exception:
+        logging.exception("Error retrieving context.")
+        return JSONResponse({'error': RETRIEVAL_ERROR}, status_code=500)
+    retrieval_ms = (time.perf_counter() - request_start) * 1000
+
+    if not has_sufficient_context(context_text):
+        logging.warning(f"Insufficient context found for query: '{user_message[:100]}...'")
+        return JSONResponse({'response': INSUFFICIENT_CONTEXT_RESPONSE})
+
+    # Reuse the answer to an equivalent question over the same chunks
+    # (runs on the DB executor: both cache tiers may do blocking I/O)
+    chunk_ids = [chunk["id"] for chunk in context_chunks]
+    cached_answer = await _run_in(
+        _get_db_executor(), get_cached_answer, query_context, selected_language, chunk_ids, context_text
+    )
+    if cached_answer:
+        if stream_response:
+            return StreamingResponse(
+                iter(ChatStream(request_start, retrieval_ms).cached(cached_answer)),
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
+            )
+        return JSONResponse({'response': cached_answer})
+
+    def store_answer(answer: str) -> None:
+        # Fire-and-forget: the SQLite write must not block the event loop
+        future = _get_db_executor().submit(cache_answer, query_context, selected_language, chunk_ids, context_text, answer)
+        future.add_done_callback(_log_cache_write_error)
+
+    # 2. Build the system prompt and messages for Ollama
+    ollama_messages = build_ollama_messages(user_message, selected_language, context_text)
+
+    if stream_response:
+        return StreamingResponse(
+            _stream_chat_response(ollama_messages, request_start, retrieval_ms, store_answer),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+
+    # 3. Call Ollama
+    try:
+        logging.info(f"Connecting to Ollama at {config.OLLAMA_HOST} with model {config.OLLAMA_MODEL}")
+        ollama_client = get_async_ollama_client()
+        response = await ollama_client.chat(
+            messages=ollama_messages,
+            **get_chat_kwargs()
+        )
+        logging.info("Received response from Ollama.")
+    except Exception as ollama_error:
+        logging.exception(f"Error communicating with Ollama: {ollama_error}")
+        return JSONResponse({'error': ollama_error_message(ollama_error)}, status_code=503)
+
+    # 4. Process and Return Response
+    response_text = extract_message_content(response)
+    if "Error processing Ollama response" in response_text or not response_text:
+        logging.error(f"Invalid or error response received/processed from Ollama. Raw: {response}")
+        return JSONResponse({'response': GENERATION_FAILED_RESPONSE})
+
+    store_answer(response_text)
+    logging.info(f"Final response to user: '{response_text[:100]}...'")
+    return JSONResponse({'response': response_text})
+
+
+async def health_check(request: Request):
+    """Health check served on the event loop, so it never waits behind chat requests."""
+    if are_models_ready():
+        return JSONResponse({"status": "OK", "message": "Models loaded and ready."})
+    return JSONResponse({"status": "UNHEALTHY", "message": "Models are initializing or failed to load."}, status_code=503)
+
+
+def _cors_headers(origin: Optional[str]) -> dict:
+    """CORS headers for the async /chat endpoint, matching the Flask-CORS setup."""
+    allowed = config.get_cors_origins()
+    if allowed == '*':
+        return {"Access-Control-Allow-Origin": "*"}
+    if origin and origin in allowed:
+        return {"Access-Control-Allow-Origin": origin, "Vary": "Origin"}
+    return {}
+
+
+async def _chat_api_with_cors(request: Request):
+    response = await chat_api(request)
+    response.headers.update(_cors_headers(request.headers.get("origin")))
+    return response
+
+
+def create_asgi_app(flask_app) -> Starlette:
+    """
+    Wraps the Flask app: POST /chat and /health are handled asynchronously,
+    everything else (UI, /metrics, CORS preflight) falls through to Flask.
+    Concurrent chat requests share a worker here, so INFERENCE_BATCHING=auto
+    turns micro-batching on.
+    """
+    enable_async_serving()
+    return Starlette(routes=[
+        Route("/chat", _chat_api_with_cors, methods=["POST"]),
+        Route("/health", health_check, methods=["GET"]),
+        Mount("/", app=WsgiToAsgi(flask_app)),
+    ])
@@ -0,0 +1,131 @@
+# app/batching.py
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item calls into batches for one model.
+
+    Callers block on submit(item) (or call the batcher directly); a worker
+    thread takes the first queued item, waits up to max_wait_ms for more (at
+    most max_batch_size in total), runs batch_fn on the whole batch and
+    hands each caller its own result. batch_fn receives a list of items and
+    must return a list of results in the same order.
+
+    The worker thread and queue are created lazily per process, so a batcher
+    built in a preloading gunicorn master works in the forked workers.
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.queue_wait_seconds = 0.0
+        self.batch_size_histogram: Dict[str, int] = {}
+
+    def _ensure_worker(self) -> queue.Queue:
+        pid = os.getpid()
+        if self._queue is None or self._pid != pid:
+            with self._start_lock:
+                if self._queue is None or self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._pid = pid
+                    with self._stats_lock:
+                        self._reset_stats() # Counters inherited from the parent are not ours
+                    threading.Thread(
+                        target=self._run, args=(self._queue,), name=f"batcher-{self.name}", daemon=True
+                    ).start()
+        return self._queue
+
+    def submit(self, item: Any) -> Future:
+        """Queues one item and returns a Future for its result."""
+        work_queue = self._ensure_worker()
+        future: Future = Future()
+        work_queue.put((item, future, time.perf_counter()))
+        depth = work_queue.qsize()
+        if depth > self.max_queue_depth:
+            with self._stats_lock:
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+        return future
+
+    def __call__(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Runs one item through the batcher and returns its result (re-raising batch errors)."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self, work_queue: queue.Queue) -> list:
+        batch = [work_queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, work_queue: queue.Queue) -> None:
+        while True:
+            batch = self._collect(work_queue)
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logging.exception(f"Batched {self.name} inference failed for {len(items)} items.")
+                with self._stats_lock:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self._record(batch, started)
+
+    def _record(self, batch: list, started: float) -> None:
+        size = len(batch)
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        label = str(bucket) if bucket <= 2 else f"{bucket // 2 + 1}-{bucket}" # 1, 2, 3-4, 5-8, ...
+        with self._stats_lock:
+            self.batches += 1
+            self.items += size
+            self.queue_wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+            self.batch_size_histogram[label] = self.batch_size_histogram.get(label, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth, batch-size histogram and throughput counters."""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "queue_depth": self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+                "avg_queue_wait_ms": round(self.queue_wait_seconds * 1000 / self.items, 3) if self.items else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_size_histogram.items(), key=lambda kv: int(kv[0].split("-")[-1]))),
+            }
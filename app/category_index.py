@@ -0,0 +1,73 @@
+# app/category_index.py
+import string
+import logging
+from typing import Optional
+
+import numpy as np
+
+_REMOVE_PUNCTUATION = str.maketrans('', '', string.punctuation)
+_SPLIT_ON_PUNCTUATION = str.maketrans({char: ' ' for char in string.punctuation})
+
+
+def _query_tokens(query: str) -> set[str]:
+    """
+    Tokenizes a query like keyword extraction does (punctuation removed), also
+    splitting on punctuation ("backup/restore") and adding singular forms of plurals.
+    """
+    query = query.lower()
+    tokens = set(query.translate(_REMOVE_PUNCTUATION).split())
+    tokens.update(query.translate(_SPLIT_ON_PUNCTUATION).split())
+    tokens.update(tok[:-1] for tok in list(tokens) if len(tok) > 3 and tok.endswith('s'))
+    return tokens
+
+
+class CategoryIndex:
+    """
+    Precompiled category routing data, built once at model initialization.
+
+    Category embeddings are stacked into one L2-normalized matrix so all
+    cosine scores come from a single matrix-vector product, and keywords are
+    compiled into a token -> category index so keyword scoring costs one
+    dictionary lookup per query token, independent of the number of
+    categories and keywords.
+    """
+
+    def __init__(self, categories: list[str], embeddings: dict[str, np.ndarray],
+                 keywords: dict[str, list[str]]):
+        self.categories = [category for category in categories if embeddings.get(category) is not None]
+        missing = set(categories) - set(self.categories)
+        if missing:
+            logging.warning(f"No embedding found for categories: {sorted(missing)}")
+
+        self.embedding_matrix: Optional[np.ndarray] = None
+        if self.categories:
+            matrix = np.stack([np.asarray(embeddings[c], dtype=np.float32) for c in self.categories])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.embedding_matrix = matrix / np.where(norms > 0, norms, 1.0)
+
+        self.keyword_index: dict[str, np.ndarray] = {}
+        self.keyword_counts = np.zeros(len(self.categories), dtype=np.float32)
+        postings: dict[str, list[int]] = {}
+        for position, category in enumerate(self.categories):
+            category_keywords = {keyword.lower() for keyword in keywords.get(category, []) if keyword}
+            self.keyword_counts[position] = len(category_keywords)
+            for keyword in category_keywords:
+                postings.setdefault(keyword, []).append(position)
+        self.keyword_index = {keyword: np.array(positions, dtype=np.intp) for keyword, positions in postings.items()}
+        logging.info(f"Category index built: {len(self.categories)} categories, {len(self.keyword_index)} distinct keywords.")
+
+    def cosine_scores(self, query_vec: Optional[np.ndarray]) -> np.ndarray:
+        """Cosine similarity of a normalized query embedding to every category."""
+        if self.embedding_matrix is None or query_vec is None or not np.all(np.isfinite(query_vec)):
+            return np.zeros(len(self.categories), dtype=np.float32)
+        scores = self.embedding_matrix @ np.asarray(query_vec, dtype=np.float32)
+        return np.clip(scores, -1.0, 1.0)
+
+    def keyword_scores(self, query: str) -> np.ndarray:
+        """Fraction of each category's keywords that occur as tokens in the query."""
+        matches = np.zeros(len(self.categories), dtype=np.float32)
+        for token in _query_tokens(query):
+            positions = self.keyword_index.get(token)
+            if positions is not None:
+                matches[positions] += 1.0
+        return np.divide(matches, self.keyword_counts, out=np.zeros_like(matches), where=self.keyword_counts > 0)
@@ -0,0 +1,213 @@
+# app/chat_service.py
+"""
+Framework-independent pieces of the /chat pipeline, shared by the Flask
+(WSGI) routes and the asyncio (ASGI) chat endpoint.
+"""
+import json
+import time
+import logging
+from typing import Any, Callable, Optional
+
+from .config import config
+from .prompt_manager import get_prompt_manager
+from .context_builder import CONTEXT_SEPARATOR
+from .answer_cache import answer_cache
+from .response_store import response_store, make_response_key
+from .utils import extract_stream_delta, get_response_field, ThinkTagStripper
+
+NOT_READY_ERROR = 'Service is initializing, please try again shortly.'
+RETRIEVAL_ERROR = 'Failed to retrieve context information.'
+INSUFFICIENT_CONTEXT_RESPONSE = "I couldn't find specific information related to your question in the available documents."
+GENERATION_FAILED_RESPONSE = "Sorry, I encountered an issue generating the response."
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no", # Disable Nginx proxy buffering for this response
+}
+
+
+class ChatRequestError(Exception):
+    """An invalid /chat request body; carries the user-facing message and HTTP status."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def parse_chat_request(payload: Any) -> tuple[str, str, bool]:
+    """
+    Validates a /chat request body.
+    Returns (user_message, language, stream) or raises ChatRequestError.
+    """
+    if not isinstance(payload, dict):
+        logging.error(f"Invalid request body received: {payload}")
+        raise ChatRequestError('Request body must be a JSON object.')
+
+    # Get message history and selected language from request
+    messages = payload.get('messages')
+    selected_language = payload.get('language', 'en')  # Default to English if not specified
+    stream_response = bool(payload.get('stream', False))
+
+    if not messages or not isinstance(messages, list):
+        logging.error(f"Invalid message format received: {messages}")
+        raise ChatRequestError('Messages must be a list.')
+
+    # Extract the last user message
+    user_message = ""
+    for msg in reversed(messages):
+        if isinstance(msg, dict) and msg.get("role") == "user":
+            user_message = (msg.get("content") or "").strip()
+            break
+
+    if not user_message:
+        logging.error("No user message found in the history or message is empty.")
+        raise ChatRequestError('User message cannot be empty.')
+
+    return user_message, selected_language, stream_response
+
+
+def build_context_text(context_chunks: list[dict]) -> str:
+    """Joins the assembled chunks (see context_builder) into the context block of the system prompt."""
+    return CONTEXT_SEPARATOR.join(chunk["content"] for chunk in context_chunks) if context_chunks else ""
+
+
+def has_sufficient_context(context_text: str) -> bool:
+    """Basic check that retrieval produced usable context."""
+    return bool(context_text) and len(context_text) >= 10
+
+
+def get_cached_answer(query_context, language: str, chunk_ids: list[int], context_text: str) -> Optional[str]:
+    """
+    Looks up a previously generated answer: first the exact-match store shared
+    by all workers, then the in-process semantic answer cache.
+    """
+    key = make_response_key(query_context.cache_key, language, config.OLLAMA_MODEL, context_text)
+    answer = response_store.get(key)
+    if answer:
+        return answer
+    return answer_cache.get(query_context.embedding, language, chunk_ids)
+
+
+def cache_answer(query_context, language: str, chunk_ids: list[int], context_text: str, answer: str) -> None:
+    """Stores a generated answer in both cache tiers."""
+    answer_cache.set(query_context.embedding, language, chunk_ids, answer)
+    key = make_response_key(query_context.cache_key, language, config.OLLAMA_MODEL, context_text)
+    response_store.set(key, answer)
+
+
+def build_ollama_messages(user_message: str, language: str, context_text: str) -> list[dict]:
+    """Builds the system + user messages sent to Ollama."""
+    prompt_manager = get_prompt_manager()
+    system_prompt = prompt_manager.get_system_prompt(
+        lang=language,
+        context=context_text
+    )
+    ollama_messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+    logging.debug(f"Messages being sent to Ollama: {ollama_messages}")
+    return ollama_messages
+
+
+def ollama_error_message(ollama_error: Exception) -> str:
+    """Maps an Ollama client exception to a user-facing error message."""
+    error_msg = "Could not connect to the language model service."
+    if "Connection refused" in str(ollama_error):
+         error_msg = "Language model service is not reachable."
+    elif "timed out" in str(ollama_error).lower():
+         error_msg = "Language model service timed out."
+    return error_msg
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Formats a single Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ChatStream:
+    """
+    Turns streamed Ollama chat chunks into SSE frames: "token" frames with
+    <think> blocks removed, then a final "done" frame carrying the full
+    response and timing metadata (or an "error" frame).
+    on_complete, if given, is called with the full response text after a
+    successful generation (e.g. to store it in the answer cache).
+    """
+
+    def __init__(self, request_start: float, retrieval_ms: float,
+                 on_complete: Optional[Callable[[str], None]] = None):
+        self.request_start = request_start
+        self.retrieval_ms = retrieval_ms
+        self.on_complete = on_complete
+        self.first_token_ms: Optional[float] = None
+        self._stripper = ThinkTagStripper()
+        self._final_chunk = None
+        self._parts: list[str] = []
+
+    def _token(self, text: str) -> str:
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.request_start) * 1000
+            logging.info(f"First token streamed after {self.first_token_ms:.0f} ms.")
+        self._parts.append(text)
+        return sse_event("token", {"content": text})
+
+    def feed(self, chunk: Any) -> Optional[str]:
+        """Consumes one Ollama chunk; returns a "token" frame or None."""
+        if get_response_field(chunk, 'done'):
+            self._final_chunk = chunk
+        text = self._stripper.feed(extract_stream_delta(chunk))
+        return self._token(text) if text else None
+
+    def error(self, ollama_error: Exception) -> str:
+        """Returns the "error" frame for a failed generation."""
+        logging.exception(f"Error streaming from Ollama: {ollama_error}")
+        return sse_event("error", {"error": ollama_error_message(ollama_error)})
+
+    def finish(self) -> list[str]:
+        """Flushes held-back text and returns the remaining frames, ending with "done"."""
+        frames = []
+        text = self._stripper.flush()
+        if text:
+            frames.append(self._token(text))
+
+        response_text = "".join(self._parts)
+        if response_text:
+            if self.on_complete is not None:
+                self.on_complete(response_text)
+        else:
+            logging.error("Empty response streamed from Ollama.")
+            frames.append(self._token(GENERATION_FAILED_RESPONSE))
+            response_text = GENERATION_FAILED_RESPONSE
+
+        timings = self._timings()
+        logging.info(f"Streamed response to user: '{response_text[:100]}...' Timings: {timings}")
+        frames.append(sse_event("done", {"response": response_text, "timings": timings}))
+        return frames
+
+    def cached(self, response_text: str) -> list[str]:
+        """Returns the frames replaying an answer from the answer cache."""
+        timings = self._timings()
+        timings["cached"] = True
+        return [
+            self._token(response_text),
+            sse_event("done", {"response": response_text, "timings": timings}),
+        ]
+
+    def _timings(self) -> dict:
+        # Ollama reports durations in nanoseconds on the final chunk
+        timings = {
+            "retrieval_ms": round(self.retrieval_ms, 1),
+            "first_token_ms": round(self.first_token_ms, 1) if self.first_token_ms is not None else None,
+            "total_ms": round((time.perf_counter() - self.request_start) * 1000, 1),
+        }
+        if self._final_chunk is not None:
+            for field in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration"):
+                value = get_response_field(self._final_chunk, field)
+                if value is not None:
+                    timings[field.replace("_duration", "_ms")] = round(value / 1e6, 1)
+            for field in ("prompt_eval_count", "eval_count"):
+                value = get_response_field(self._final_chunk, field)
+                if value is not None:
+                    timings[field] = value
+        return timings
@@ -31,16 +31,135 @@ class Config:
     DB_USER = os.getenv("DB_USER")
     DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+    # Database connection pool (one pool per worker process)
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+    DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")) # Seconds before a connection is recycled
+    DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")) # Idle seconds before re-checking a connection
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10")) # Seconds to wait for a free connection
+
+    # Vector index (shared by the loader, which builds it, and the app, which queries it)
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw") # 'hnsw' or 'ivfflat'
+    VECTOR_DISTANCE_METRIC = os.getenv("VECTOR_DISTANCE_METRIC", "inner_product") # 'inner_product', 'cosine' or 'l2'
+    IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0")) # 0 = derive from row count
+    IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "40"))
+    # Keep scanning the index until the category filter leaves enough rows (pgvector >= 0.8): 'relaxed_order', 'strict_order' (HNSW only) or 'off'
+    VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+    # Retrieval: 'hybrid' fuses full-text (content_tsv) and vector candidates with reciprocal-rank fusion, 'vector' is ANN only
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20")) # Candidates per list and category before fusion
+    HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+    HYBRID_RRF_K = float(os.getenv("HYBRID_RRF_K", "60")) # score = sum(weight / (k + rank)); larger k flattens rank differences
+
+    # Context assembly (app/context_builder.py): dedupe, MMR selection and a token budget for the retrieved chunks
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0")) # Max context tokens, 0 = what num_ctx leaves after prompt, question and answer
+    CONTEXT_ANSWER_TOKENS = int(os.getenv("CONTEXT_ANSWER_TOKENS", "512")) # Reserved for the answer when OLLAMA_NUM_PREDICT is 0
+    CONTEXT_DEFAULT_NUM_CTX = int(os.getenv("CONTEXT_DEFAULT_NUM_CTX", "2048")) # Assumed window when OLLAMA_NUM_CTX is 0
+    CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.0")) # Token estimate; lower is more conservative
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")) # 1 = relevance only, 0 = diversity only
+    CONTEXT_DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.95")) # Cosine at which chunks count as duplicates
+    CONTEXT_MIN_OVERLAP_WORDS = int(os.getenv("CONTEXT_MIN_OVERLAP_WORDS", "8")) # Shorter repeated word runs are not trimmed
+
     # Data Directory
     DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data")) # Path relative to project root
 
+    # Ingestion pipeline (load/pipeline.py)
+    LOAD_MODE = os.getenv("LOAD_MODE", "sync") # sync (only new/changed/deleted files), full (shadow reload + swap) or rollback
+    LOAD_REINDEX_THRESHOLD = float(os.getenv("LOAD_REINDEX_THRESHOLD", "0.2")) # Rebuild the ANN index above this changed-row fraction
+    LOAD_INDEX_MAINTENANCE_WORK_MEM = os.getenv("LOAD_INDEX_MAINTENANCE_WORK_MEM", "1GB") # maintenance_work_mem for index builds
+    LOAD_INDEX_PARALLEL_WORKERS = int(os.getenv("LOAD_INDEX_PARALLEL_WORKERS", "0")) # max_parallel_maintenance_workers, 0 = server default
+    LOAD_SWAP_LOCK_TIMEOUT_MS = int(os.getenv("LOAD_SWAP_LOCK_TIMEOUT_MS", "2000")) # Max wait for the table/index swap locks per attempt
+    LOAD_SWAP_RETRIES = int(os.getenv("LOAD_SWAP_RETRIES", "10"))
+    LOAD_CHUNKER = os.getenv("LOAD_CHUNKER", "tokens") # tokens (embedding-model tokens, boundary-aware) or words (150-word chunks)
+    LOAD_CHUNK_TOKENS = int(os.getenv("LOAD_CHUNK_TOKENS", "0")) # Max tokens per chunk, 0 = the model's full window
+    LOAD_CHUNK_OVERLAP_TOKENS = int(os.getenv("LOAD_CHUNK_OVERLAP_TOKENS", "32"))
+    LOAD_READER_WORKERS = int(os.getenv("LOAD_READER_WORKERS", "0")) # Read/chunk processes, 0 = cores - 1
+    LOAD_EMBED_BATCH_SIZE = int(os.getenv("LOAD_EMBED_BATCH_SIZE", "512")) # Chunks per cross-file encode call
+    LOAD_ENCODE_BATCH_SIZE = int(os.getenv("LOAD_ENCODE_BATCH_SIZE", "64")) # Model forward-pass batch size
+    LOAD_INSERT_BATCH_SIZE = int(os.getenv("LOAD_INSERT_BATCH_SIZE", "1000")) # Rows per insert transaction
+    LOAD_INSERT_METHOD = os.getenv("LOAD_INSERT_METHOD", "copy") # copy (binary COPY) or insert (INSERT ... VALUES)
+    LOAD_QUEUE_SIZE = int(os.getenv("LOAD_QUEUE_SIZE", "4")) # Files in flight per reader / pending insert batches
+    LOAD_SLOW_FILE_SECONDS = float(os.getenv("LOAD_SLOW_FILE_SECONDS", "30")) # Log files that take longer to read and chunk
+    # PDF extraction (load/pdf_extract.py): pages are extracted in child processes of each reader
+    LOAD_PDF_BACKEND = os.getenv("LOAD_PDF_BACKEND", "auto") # auto, pymupdf, pypdf or pypdf2
+    LOAD_PDF_PAGE_WORKERS = int(os.getenv("LOAD_PDF_PAGE_WORKERS", "2")) # Max extraction processes per PDF
+    LOAD_PDF_PAGES_PER_WORKER = int(os.getenv("LOAD_PDF_PAGES_PER_WORKER", "32")) # A PDF gets another process per this many pages
+    LOAD_PDF_PAGE_TIMEOUT = float(os.getenv("LOAD_PDF_PAGE_TIMEOUT", "30")) # Seconds a single page may take
+    LOAD_PDF_FILE_TIMEOUT = float(os.getenv("LOAD_PDF_FILE_TIMEOUT", "300")) # Seconds a whole PDF may take
+    LOAD_PDF_MEMORY_MB = int(os.getenv("LOAD_PDF_MEMORY_MB", "1024")) # Memory an extraction process may allocate, 0 = unlimited
+    # Content-addressed embedding cache (load/embedding_cache.py): chunks already embedded by this model are not re-embedded
+    LOAD_EMBEDDING_CACHE_ENABLED = os.getenv("LOAD_EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LOAD_EMBEDDING_CACHE_DIR = os.getenv("LOAD_EMBEDDING_CACHE_DIR", "/app/embedding_cache")
+
     # LLM / Ollama
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434") # Default to service name in Docker
+    OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120")) # Seconds
+    OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.1"))
+    # Per-request generation options; 0 = model default
+    OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))
+    OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "0"))
+    OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0"))
+    # How long Ollama keeps the model loaded: seconds (-1 = forever) or a duration such as "30m"
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+    OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes") # Load the model at app startup
+    # HTTP connection pool of the per-worker Ollama client
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+    OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "300")) # Seconds an idle connection is kept
 
     # ML Models
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
     CLASSIFIER_MODEL_NAME = os.getenv("CLASSIFIER_MODEL", "facebook/bart-large-mnli")
+    # CPU inference backend for both models: torch, onnx or onnx-int8 (see inference_backend.py)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "/root/.cache/huggingface/onnx") # Exported/quantized models
+    ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2") # arm64, avx2, avx512, avx512_vnni
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "1")) # >1 requires GUNICORN_PRELOAD=false
+
+    # Micro-batching of concurrent embedding / zero-shot calls (see batching.py).
+    # 'auto' batches only under the ASGI server, where requests share a worker; a sync
+    # Flask worker serves one request at a time and would only pay the wait.
+    INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "auto").lower() # 'auto', 'true' or 'false'
+    INFERENCE_BATCH_MAX_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", "16")) # Queries per batch
+    INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5")) # Max wait for more queries
+    INFERENCE_PIPELINE_BATCH_SIZE = int(os.getenv("INFERENCE_PIPELINE_BATCH_SIZE", "64")) # NLI pairs per forward pass
+    # Async serving (asgi.py): threads per worker for embedding/classification work
+    ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", "2"))
+
+    # Category router: 'hybrid' (cosine + keywords + zero-shot BART) or
+    # 'centroid' (one matmul against per-category embedding centroids from the data table)
+    CATEGORY_ROUTER = os.getenv("CATEGORY_ROUTER", "hybrid")
+    # In centroid mode, fall back to the hybrid zero-shot router when centroids are
+    # unavailable or the top-2 centroid scores are closer than the margin (0 = only when unavailable)
+    ROUTER_ZERO_SHOT_FALLBACK = os.getenv("ROUTER_ZERO_SHOT_FALLBACK", "true").lower() in ("1", "true", "yes")
+    ROUTER_FALLBACK_MARGIN = float(os.getenv("ROUTER_FALLBACK_MARGIN", "0.0"))
+    # Centroid router selection: raw cosines to the centroids are close together and mostly above
+    # the hybrid router's 0.1 cutoff, so it keeps categories within a narrower margin of the best one
+    ROUTER_CENTROID_MIN_SCORE = float(os.getenv("ROUTER_CENTROID_MIN_SCORE", "0.2"))
+    ROUTER_CENTROID_MARGIN = float(os.getenv("ROUTER_CENTROID_MARGIN", "0.02"))
+
+    # In-process caches of query embeddings and category router scores (per worker)
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024")) # 0 disables caching
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600")) # Seconds
+
+    # Semantic answer cache in front of Ollama (per worker, see answer_cache.py)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")) # Min cosine to reuse an answer
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600")) # Seconds
+    ANSWER_CACHE_MAX_MB = float(os.getenv("ANSWER_CACHE_MAX_MB", "32"))
+    ANSWER_CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("ANSWER_CACHE_VERSION_CHECK_INTERVAL", "30")) # Seconds, 0 disables
+
+    # Exact-match response cache shared by all workers (SQLite file, see response_store.py)
+    RESPONSE_STORE_ENABLED = os.getenv("RESPONSE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+    RESPONSE_STORE_PATH = os.getenv("RESPONSE_STORE_PATH", "/app/cache/responses.sqlite3")
+    RESPONSE_STORE_MAX_MB = float(os.getenv("RESPONSE_STORE_MAX_MB", "256"))
+    RESPONSE_STORE_TTL = float(os.getenv("RESPONSE_STORE_TTL", "604800")) # Seconds (7 days), 0 = no expiry
 
     # NLTK
     STOPWORDS_LNG = os.getenv("STOPWORDS_LNG", "english")
@@ -0,0 +1,242 @@
+# app/context_builder.py
+"""
+Token-budgeted context assembly between retrieval and the system prompt.
+
+Retrieval returns up to 5 chunks per selected category, and neighbouring
+chunks of a document overlap. On CPU Ollama, prompt prefill time grows with
+the prompt length, so assemble_context() sends only what adds information:
+
+  1. Near-duplicates are dropped: identical normalized text, a chunk
+     contained in another, or an embedding with cosine >=
+     CONTEXT_DUPLICATE_SIMILARITY to a more relevant chunk.
+  2. The rest are picked by maximal marginal relevance over the stored chunk
+     embeddings: CONTEXT_MMR_LAMBDA * relevance - (1 - lambda) * max cosine
+     to the chunks already picked.
+  3. Text a picked chunk repeats from an earlier pick (the chunk overlap) is
+     cut.
+  4. Chunks are added until the token budget is used up; ones that do not
+     fit are skipped in favour of smaller ones further down.
+
+The budget is CONTEXT_TOKEN_BUDGET, capped by what num_ctx leaves after the
+system prompt, the question and the answer. Tokens are estimated from the
+character count, since the LLM's tokenizer lives in Ollama.
+"""
+import re
+import math
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .config import config
+from .prompt_manager import get_prompt_manager
+
+CONTEXT_SEPARATOR = "\n---\n" # Between chunks in the context block (see chat_service.build_context_text)
+_WORD = re.compile(r"\S+")
+
+
+class _ContextStats:
+    """Per-worker counters for /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.chunks_in = 0
+        self.chunks_out = 0
+        self.duplicates = 0
+        self.overlaps_trimmed = 0
+        self.over_budget = 0
+        self.tokens = 0
+
+    def record(self, chunks_in: int, chunks_out: int, duplicates: int, overlaps_trimmed: int,
+               over_budget: int, tokens: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.chunks_in += chunks_in
+            self.chunks_out += chunks_out
+            self.duplicates += duplicates
+            self.overlaps_trimmed += overlaps_trimmed
+            self.over_budget += over_budget
+            self.tokens += tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "chunks_in": self.chunks_in,
+                "chunks_out": self.chunks_out,
+                "duplicates_removed": self.duplicates,
+                "overlaps_trimmed": self.overlaps_trimmed,
+                "dropped_over_budget": self.over_budget,
+                "avg_context_tokens": round(self.tokens / self.requests, 1) if self.requests else 0.0,
+            }
+
+
+_stats = _ContextStats()
+_prompt_tokens: Dict[str, int] = {} # Language -> estimated tokens of the system prompt without context
+
+
+def get_context_stats() -> Dict[str, Any]:
+    return _stats.stats()
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token estimate from the character count (CONTEXT_CHARS_PER_TOKEN)."""
+    return math.ceil(len(text) / max(0.5, config.CONTEXT_CHARS_PER_TOKEN)) if text else 0
+
+
+def context_token_budget(language: str, question: str) -> int:
+    """Tokens available for the context block of one request."""
+    if language not in _prompt_tokens:
+        _prompt_tokens[language] = estimate_tokens(get_prompt_manager().get_system_prompt(lang=language, context=""))
+    num_ctx = config.OLLAMA_NUM_CTX if config.OLLAMA_NUM_CTX > 0 else config.CONTEXT_DEFAULT_NUM_CTX
+    answer_tokens = config.OLLAMA_NUM_PREDICT if config.OLLAMA_NUM_PREDICT > 0 else config.CONTEXT_ANSWER_TOKENS
+    available = num_ctx - _prompt_tokens[language] - estimate_tokens(question) - answer_tokens
+    if config.CONTEXT_TOKEN_BUDGET > 0:
+        available = min(available, config.CONTEXT_TOKEN_BUDGET)
+    return max(0, available)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _relevance(chunks: List[dict], embeddings: Optional[np.ndarray], query_embedding: Optional[np.ndarray]) -> np.ndarray:
+    """Relevance in [0, 1] (relative to the best chunk): the fused hybrid score if present, else query cosine."""
+    if all("score" in chunk for chunk in chunks):
+        relevance = np.array([chunk["score"] for chunk in chunks], dtype=np.float32)
+    elif embeddings is not None and query_embedding is not None:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        relevance = embeddings @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    else:
+        relevance = np.linspace(1.0, 0.5, len(chunks), dtype=np.float32) # Retrieval order
+    top = float(relevance.max())
+    return relevance / top if top > 0 else relevance
+
+
+def _overlap_start(previous: str, words: List[re.Match], min_words: int) -> int:
+    """
+    Number of leading words of a chunk that repeat the end of `previous`
+    (at least min_words, and at least one), else 0.
+    """
+    min_words = max(1, min_words) # An empty run is no overlap
+    previous_words = previous.split()
+    if not words or len(previous_words) < min_words:
+        return 0
+    texts = [match.group() for match in words]
+    first = texts[0]
+    limit = min(len(previous_words), len(texts))
+    for start in range(len(previous_words) - limit, len(previous_words) - min_words + 1):
+        if previous_words[start] == first and previous_words[start:] == texts[:len(previous_words) - start]:
+            return len(previous_words) - start
+    return 0
+
+
+def _trim_overlap(content: str, picked: List[str], min_words: int) -> tuple[str, bool]:
+    """Cuts a leading or trailing run of words that repeats the end or start of a picked chunk."""
+    words = list(_WORD.finditer(content))
+    for previous in picked:
+        # The chunk continues a picked one: drop its repeated beginning
+        count = _overlap_start(previous, words, min_words)
+        if count:
+            return content[words[count].start():] if count < len(words) else "", True
+        # The chunk precedes a picked one: drop its repeated end
+        reversed_words = list(reversed(words))
+        previous_reversed = " ".join(reversed(previous.split()))
+        count = _overlap_start(previous_reversed, reversed_words, min_words)
+        if count:
+            return content[:words[-count - 1].end()] if count < len(words) else "", True
+    return content, False
+
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cuts text at the last word boundary within the token estimate."""
+    max_chars = int(tokens * max(0.5, config.CONTEXT_CHARS_PER_TOKEN))
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip()
+
+
+def assemble_context(chunks: List[dict], query_context, language: str) -> List[dict]:
+    """
+    Picks the chunks for the system prompt (see the module docstring).
+
+    Args:
+        chunks: Retrieved chunk dicts (rag_core.fetch_context_chunks);
+                'embedding' enables duplicate detection by cosine and MMR.
+        query_context: The request's QueryContext (question and embedding).
+        language: Prompt language, for the size of the system prompt.
+
+    Returns:
+        The picked chunks in MMR order (most relevant first), as copies
+        whose 'content' may be trimmed.
+    """
+    if not chunks:
+        return []
+    budget = context_token_budget(language, query_context.query)
+    if any(chunk.get("embedding") is None for chunk in chunks):
+        embeddings = None
+    else:
+        embeddings = np.stack([np.asarray(chunk["embedding"], dtype=np.float32) for chunk in chunks])
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    relevance = _relevance(chunks, embeddings, query_context.embedding)
+
+    # 1. Drop near-duplicates, keeping the more relevant chunk
+    order = [int(i) for i in np.argsort(-relevance, kind="stable")]
+    kept: List[int] = []
+    normalized = [_normalize(chunk["content"]) for chunk in chunks]
+    for i in order:
+        duplicate = any(
+            normalized[i] in normalized[j] or normalized[j] in normalized[i]
+            or (embeddings is not None and float(embeddings[i] @ embeddings[j]) >= config.CONTEXT_DUPLICATE_SIMILARITY)
+            for j in kept
+        )
+        if not duplicate:
+            kept.append(i)
+    duplicates = len(chunks) - len(kept)
+
+    # 2-4. MMR picks within the token budget
+    lam = min(1.0, max(0.0, config.CONTEXT_MMR_LAMBDA))
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    selected: List[int] = []
+    picked: List[dict] = []
+    used_tokens = 0
+    overlaps_trimmed = over_budget = 0
+    candidates = list(kept)
+    while candidates:
+        if selected and embeddings is not None:
+            redundancy = (embeddings[candidates] @ embeddings[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates), dtype=np.float32)
+        scores = lam * relevance[candidates] - (1 - lam) * redundancy
+        best = candidates.pop(int(np.argmax(scores)))
+
+        content, trimmed = _trim_overlap(chunks[best]["content"], [chunk["content"] for chunk in picked],
+                                         config.CONTEXT_MIN_OVERLAP_WORDS)
+        if len(content.strip()) < 10:
+            duplicates += 1 # Nothing left after removing the overlap
+            continue
+        tokens = estimate_tokens(content) + (separator_tokens if picked else 0)
+        if used_tokens + tokens > budget:
+            if picked:
+                over_budget += 1
+                continue
+            # Always keep the best chunk, cut to the budget
+            content = _truncate_to_tokens(content, budget)
+            tokens = estimate_tokens(content)
+            if not content:
+                over_budget += 1
+                continue
+        overlaps_trimmed += trimmed
+        used_tokens += tokens
+        selected.append(best)
+        picked.append({**chunks[best], "content": content})
+
+    _stats.record(len(chunks), len(picked), duplicates, overlaps_trimmed, over_budget, used_tokens)
+    logging.info(
+        f"Context: {len(picked)} of {len(chunks)} chunks, ~{used_tokens}/{budget} tokens "
+        f"({duplicates} duplicates, {overlaps_trimmed} overlaps trimmed, {over_budget} over budget)."
+    )
+    return picked
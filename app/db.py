@@ -0,0 +1,287 @@
+# app/db.py
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import config
+from .vector_index import session_options
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+class _ConnectionInfo:
+    """Bookkeeping for a single pooled connection."""
+    __slots__ = ("created_at", "last_used", "prepared")
+
+    def __init__(self):
+        now = time.monotonic()
+        self.created_at = now
+        self.last_used = now
+        self.prepared: set[str] = set()
+
+
+class ConnectionPool:
+    """
+    A thread-safe PostgreSQL connection pool.
+
+    Connections are handed out LIFO so hot connections are reused. Idle
+    connections are health-checked before reuse, connections older than
+    max_lifetime are recycled, and callers block (up to acquire_timeout)
+    when all max_size connections are in use. Server-side prepared
+    statements are tracked per connection.
+    """
+
+    def __init__(self, min_size: int, max_size: int, max_lifetime: float,
+                 health_check_interval: float, acquire_timeout: float, **connect_kwargs):
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size)
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle: list = []
+        self._info: Dict[int, _ConnectionInfo] = {}
+        self._statements: Dict[str, tuple[str, str]] = {}
+        self._closed = False
+
+        # Metrics
+        self._acquire_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+
+        for _ in range(self.min_size):
+            try:
+                self._idle.append(self._connect())
+            except psycopg2.Error as e:
+                logging.warning(f"Could not pre-open pooled DB connection: {e}")
+                break
+
+    def _connect(self):
+        """Opens a new database connection and registers it with the pool."""
+        logging.debug(f"Opening pooled DB connection: Host={self._connect_kwargs.get('host')}, DB={self._connect_kwargs.get('database')}")
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._lock:
+            self._info[id(conn)] = _ConnectionInfo()
+            self._created += 1
+        return conn
+
+    def _discard(self, conn) -> None:
+        """Closes a connection and forgets its bookkeeping."""
+        with self._lock:
+            self._info.pop(id(conn), None)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logging.debug(f"Error closing pooled DB connection: {e}")
+
+    def _is_expired(self, conn) -> bool:
+        info = self._info.get(id(conn))
+        return info is None or (self.max_lifetime > 0 and time.monotonic() - info.created_at > self.max_lifetime)
+
+    def _is_healthy(self, conn) -> bool:
+        """Checks a connection that has been idle longer than the health check interval."""
+        if conn.closed:
+            return False
+        info = self._info.get(id(conn))
+        if info is not None and time.monotonic() - info.last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning(f"Pooled DB connection failed health check: {e}")
+            return False
+
+    def getconn(self):
+        """Checks out a connection, blocking until one is available."""
+        if self._closed:
+            raise psycopg2.InterfaceError("Connection pool is closed.")
+
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"Timed out after {self.acquire_timeout}s waiting for a database connection.")
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self._acquire_count += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    conn = self._connect()
+                    break
+                if self._is_expired(conn):
+                    with self._lock:
+                        self._recycled += 1
+                    self._discard(conn)
+                    continue
+                if not self._is_healthy(conn):
+                    with self._lock:
+                        self._failed_health_checks += 1
+                    self._discard(conn)
+                    continue
+                break
+        except Exception:
+            self._slots.release()
+            raise
+        return conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """Returns a connection to the pool (or closes it if broken/expired)."""
+        try:
+            if not discard and not conn.closed:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            if discard or conn.closed or self._closed or self._is_expired(conn):
+                if not discard and not conn.closed and not self._closed:
+                    with self._lock:
+                        self._recycled += 1
+                self._discard(conn)
+            else:
+                with self._lock:
+                    info = self._info.get(id(conn))
+                    if info is not None:
+                        info.last_used = time.monotonic()
+                    self._idle.append(conn)
+        except psycopg2.Error as e:
+            logging.warning(f"Discarding DB connection that could not be reset: {e}")
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks out a connection and always returns it."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken or conn.closed)
+
+    def register_prepared_statement(self, name: str, param_types: Sequence[str], sql: str) -> None:
+        """Registers a statement to be PREPAREd lazily on each connection that executes it."""
+        self._statements[name] = (", ".join(param_types), sql)
+
+    def execute_prepared(self, cur, name: str, params: Sequence[Any], param_casts: Optional[Sequence[str]] = None) -> None:
+        """Executes a registered prepared statement, preparing it on this connection if needed."""
+        info = self._info.get(id(cur.connection))
+        if info is not None and name not in info.prepared:
+            param_types, sql = self._statements[name]
+            cur.execute(f"PREPARE {name} ({param_types}) AS {sql}")
+            info.prepared.add(name)
+        casts = param_casts or [""] * len(params)
+        placeholders = ", ".join(f"%s{cast}" for cast in casts)
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool size and wait-time metrics."""
+        with self._lock:
+            open_count = len(self._info)
+            idle_count = len(self._idle)
+            return {
+                "pid": os.getpid(),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "open": open_count,
+                "idle": idle_count,
+                "in_use": open_count - idle_count,
+                "acquired_total": self._acquire_count,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time_total * 1000 / self._acquire_count, 3) if self._acquire_count else 0.0,
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+            }
+
+    def closeall(self) -> None:
+        """Closes all idle connections and rejects further checkouts."""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+# --- Per-process pool management ---
+_pool: Optional[ConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the connection pool for the current process, creating it on first use.
+    A pool inherited across fork() is abandoned (not closed, since the parent
+    still owns its sockets) and a fresh one is created for the worker.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            if _pool is not None:
+                logging.info(f"Process {pid} forked from pool owner {_pool_pid}; creating a new DB pool.")
+            logging.info(f"Creating DB connection pool (min={config.DB_POOL_MIN_SIZE}, max={config.DB_POOL_MAX_SIZE}) in process {pid}")
+            _pool = ConnectionPool(
+                min_size=config.DB_POOL_MIN_SIZE,
+                max_size=config.DB_POOL_MAX_SIZE,
+                max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL,
+                acquire_timeout=config.DB_POOL_TIMEOUT,
+                host=config.DB_HOST,
+                database=config.DB_NAME,
+                user=config.DB_USER,
+                password=config.DB_PASSWORD,
+                connect_timeout=10, # Add a connection timeout
+                options=session_options() # ANN search parameters (probes / ef_search)
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Returns metrics for the current process's pool (empty if not yet created)."""
+    if _pool is None or _pool_pid != os.getpid():
+        return {}
+    return _pool.stats()
+
+
+def close_pool() -> None:
+    """Closes the current process's pool, if any."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
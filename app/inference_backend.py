@@ -0,0 +1,166 @@
+# app/inference_backend.py
+"""
+Selectable CPU inference backend for the embedding and zero-shot models.
+
+INFERENCE_BACKEND:
+  * "torch"     - fp32 PyTorch (default)
+  * "onnx"      - ONNX Runtime, fp32 graph
+  * "onnx-int8" - ONNX Runtime, dynamically int8-quantized graph
+                  (weights int8, activations quantized at run time)
+
+Exported/quantized artifacts are cached under ONNX_CACHE_DIR, one directory
+per model and variant, so the export runs once per model and host/volume.
+If optimum/onnxruntime are missing or the export fails, the torch models
+are loaded instead (unless strict=True, which the backend benchmark uses
+so it never compares torch with itself).
+
+ONNX Runtime creates its intra-op thread pool when a session is created. A
+session built in the preloading gunicorn master would hand the workers a
+pool whose threads do not exist after fork, so ONNX_INTRA_OP_THREADS
+defaults to 1 (no pool: inference runs on the calling thread). Raise it
+only with GUNICORN_PRELOAD=false.
+"""
+import os
+import re
+import logging
+from typing import Any, Optional
+
+from sentence_transformers import SentenceTransformer
+from transformers import pipeline
+
+from .config import config
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def get_backend() -> str:
+    backend = config.INFERENCE_BACKEND.lower()
+    if backend not in BACKENDS:
+        logging.warning(f"Unknown INFERENCE_BACKEND '{config.INFERENCE_BACKEND}', using 'torch'.")
+        return "torch"
+    return backend
+
+
+def _quantization_config() -> str:
+    name = config.ONNX_QUANTIZATION_CONFIG.lower()
+    if name not in QUANTIZATION_CONFIGS:
+        logging.warning(f"Unknown ONNX_QUANTIZATION_CONFIG '{name}', using 'avx2'.")
+        return "avx2"
+    return name
+
+
+def _artifact_dir(model_name: str, variant: str) -> str:
+    """Cache directory of one exported model variant, e.g. <cache>/facebook--bart-large-mnli/onnx-int8-avx2."""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name.strip("/"))
+    return os.path.join(config.ONNX_CACHE_DIR, safe_name, variant)
+
+
+def _existing_file(directory: str, candidates: tuple[str, ...]) -> Optional[str]:
+    """Returns the first candidate path (relative to directory) that exists."""
+    for candidate in candidates:
+        if os.path.exists(os.path.join(directory, candidate)):
+            return candidate
+    return None
+
+
+def _session_options():
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def _load_embedding_onnx(model_name: str, quantized: bool) -> SentenceTransformer:
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dir = _artifact_dir(model_name, "onnx")
+    model_kwargs = {"session_options": _session_options(), "provider": "CPUExecutionProvider"}
+    file_name = _existing_file(export_dir, ("onnx/model.onnx", "model.onnx"))
+    if file_name is None:
+        logging.info(f"Exporting embedding model {model_name} to ONNX in {export_dir}...")
+        SentenceTransformer(model_name, backend="onnx").save(export_dir)
+        file_name = _existing_file(export_dir, ("onnx/model.onnx", "model.onnx"))
+        if file_name is None:
+            raise FileNotFoundError(f"No ONNX graph was written to {export_dir}")
+
+    if quantized:
+        qconfig = _quantization_config()
+        quantized_name = f"onnx/model_qint8_{qconfig}.onnx"
+        if not os.path.exists(os.path.join(export_dir, quantized_name)):
+            logging.info(f"Quantizing embedding model {model_name} to int8 ({qconfig})...")
+            exported = SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+            export_dynamic_quantized_onnx_model(exported, qconfig, export_dir)
+        file_name = quantized_name
+
+    model_kwargs["file_name"] = file_name
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs=model_kwargs)
+
+
+def _load_classifier_onnx(model_name: str, quantized: bool):
+    from transformers import AutoTokenizer
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    export_dir = _artifact_dir(model_name, "onnx")
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        logging.info(f"Exporting classifier {model_name} to ONNX in {export_dir}...")
+        ORTModelForSequenceClassification.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    model_dir, file_name = export_dir, "model.onnx"
+    if quantized:
+        qconfig = _quantization_config()
+        model_dir, file_name = _artifact_dir(model_name, f"onnx-int8-{qconfig}"), "model_quantized.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            logging.info(f"Quantizing classifier {model_name} to int8 ({qconfig})...")
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantization = getattr(AutoQuantizationConfig, qconfig)(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=model_dir, quantization_config=quantization)
+            AutoTokenizer.from_pretrained(export_dir).save_pretrained(model_dir)
+
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_dir, file_name=file_name, session_options=_session_options(), provider="CPUExecutionProvider"
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+
+def load_embedding_model(model_name: str, backend: Optional[str] = None, strict: bool = False) -> SentenceTransformer:
+    """
+    Loads the sentence embedding model with the given (default: configured)
+    backend. If the ONNX backend fails, falls back to torch, or raises if strict.
+    """
+    backend = backend or get_backend()
+    if backend != "torch":
+        try:
+            model = _load_embedding_onnx(model_name, quantized=backend == "onnx-int8")
+            logging.info(f"Embedding model {model_name} loaded with the {backend} backend.")
+            return model
+        except Exception as e:
+            if strict:
+                raise
+            logging.exception(f"Could not load embedding model with the {backend} backend, falling back to torch: {e}")
+    return SentenceTransformer(model_name)
+
+
+def load_classifier(model_name: str, backend: Optional[str] = None, strict: bool = False) -> Any:
+    """
+    Loads the zero-shot classification pipeline with the given (default:
+    configured) backend. If the ONNX backend fails, falls back to torch, or
+    raises if strict.
+    """
+    backend = backend or get_backend()
+    if backend != "torch":
+        try:
+            classifier = _load_classifier_onnx(model_name, quantized=backend == "onnx-int8")
+            logging.info(f"Classifier {model_name} loaded with the {backend} backend.")
+            return classifier
+        except Exception as e:
+            if strict:
+                raise
+            logging.exception(f"Could not load classifier with the {backend} backend, falling back to torch: {e}")
+    # Device can be specified e.g., device=0 for GPU 0, or -1 for CPU (default)
+    return pipeline("zero-shot-classification", model=model_name)
@@ -0,0 +1,122 @@
+# app/llm_client.py
+"""
+Long-lived Ollama clients and request options.
+
+Each worker process keeps one sync client (and one async client per event
+loop) whose underlying HTTP connection pool is reused across requests.
+Every chat request passes the same options and keep_alive, so Ollama keeps
+the model resident with the context size it was warmed up with; a request
+with a different num_ctx would force a model reload.
+"""
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, Optional, Union
+
+import httpx
+import ollama
+
+from .config import config
+
+_client_lock = threading.Lock()
+_client: Optional[ollama.Client] = None
+_client_pid: Optional[int] = None
+_async_clients: dict = {} # (pid, id(loop)) -> AsyncClient
+_WARMUP_CONNECT_TIMEOUT = 3.0 # Seconds
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=config.OLLAMA_MAX_CONNECTIONS,
+        keepalive_expiry=config.OLLAMA_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_ollama_options() -> dict:
+    """Generation options sent with every request; unset (0) values use the model defaults."""
+    options: dict[str, Any] = {"temperature": config.OLLAMA_TEMPERATURE}
+    for option, value in (
+        ("num_ctx", config.OLLAMA_NUM_CTX),
+        ("num_predict", config.OLLAMA_NUM_PREDICT),
+        ("num_thread", config.OLLAMA_NUM_THREAD),
+    ):
+        if value:
+            options[option] = value
+    return options
+
+
+def get_keep_alive() -> Union[int, float, str]:
+    """OLLAMA_KEEP_ALIVE as Ollama expects it: seconds as a number (-1 = forever) or a duration like '30m'."""
+    value = config.OLLAMA_KEEP_ALIVE.strip()
+    try:
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    except ValueError:
+        return value
+
+
+def get_chat_kwargs() -> dict:
+    """Keyword arguments shared by every client.chat() call."""
+    return {
+        "model": config.OLLAMA_MODEL,
+        "options": get_ollama_options(),
+        "keep_alive": get_keep_alive(),
+    }
+
+
+def get_ollama_client() -> ollama.Client:
+    """Returns this process's pooled Ollama client (re-created after a fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = ollama.Client(host=config.OLLAMA_HOST, timeout=config.OLLAMA_TIMEOUT, limits=_http_limits())
+                _client_pid = pid
+                logging.info(f"Created Ollama client for {config.OLLAMA_HOST} (pid {pid}).")
+    return _client
+
+
+def get_async_ollama_client() -> ollama.AsyncClient:
+    """Returns the pooled async Ollama client of the running event loop."""
+    key = (os.getpid(), id(asyncio.get_running_loop()))
+    client = _async_clients.get(key)
+    if client is None:
+        client = ollama.AsyncClient(host=config.OLLAMA_HOST, timeout=config.OLLAMA_TIMEOUT, limits=_http_limits())
+        _async_clients.clear() # Drop clients of loops from a parent process or a closed loop
+        _async_clients[key] = client
+        logging.info(f"Created async Ollama client for {config.OLLAMA_HOST} (pid {key[0]}).")
+    return client
+
+
+def warm_up_model() -> bool:
+    """
+    Loads the model into Ollama's memory with the request options and keep_alive,
+    so the first chat after a deploy does not pay the model load.
+    Sends one /api/generate request on an HTTP client opened and closed here,
+    so no connection is inherited by forked workers. Connecting gives up after
+    _WARMUP_CONNECT_TIMEOUT seconds, so a down Ollama does not hold up startup.
+    """
+    if not config.OLLAMA_WARMUP:
+        return False
+    logging.info(f"Warming up Ollama model {config.OLLAMA_MODEL} (keep_alive={get_keep_alive()})...")
+    timeout = httpx.Timeout(config.OLLAMA_TIMEOUT, connect=_WARMUP_CONNECT_TIMEOUT)
+    try:
+        with httpx.Client(base_url=config.OLLAMA_HOST, timeout=timeout) as http_client:
+            # An empty prompt only loads the model; no tokens are generated
+            response = http_client.post("/api/generate", json={
+                "model": config.OLLAMA_MODEL,
+                "prompt": "",
+                "options": get_ollama_options(),
+                "keep_alive": get_keep_alive(),
+                "stream": False,
+            })
+            response.raise_for_status()
+            load_duration = response.json().get("load_duration") or 0
+        logging.info(f"Ollama model {config.OLLAMA_MODEL} is loaded (load took {load_duration / 1e9:.1f} s).")
+        return True
+    except Exception as e:
+        logging.warning(f"Ollama warm-up failed (the first request will load the model): {e}")
+        return False
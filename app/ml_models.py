@@ -1,5 +1,6 @@
 # app/ml_models.py
 import os
+import json
 import logging
 import string
 import threading
@@ -11,9 +12,13 @@ from typing import Optional, List, Dict, Tuple, Set
 import nltk
 from nltk.corpus import stopwords
 from sentence_transformers import SentenceTransformer
-from transformers import pipeline, logging as hf_logging
+from transformers import logging as hf_logging
 
 from .config import config # Import config from the app package
+from .db import get_pool
+from .category_index import CategoryIndex
+from .batching import MicroBatcher
+from .inference_backend import get_backend, load_embedding_model, load_classifier
 
 # Suppress verbose warnings from transformers if desired
 hf_logging.set_verbosity_warning()
@@ -33,6 +38,10 @@ categories: list[str] = []
 category_keywords: dict[str, list[str]] = {}
 category_examples: dict[str, str] = {}
 category_embeddings: dict[str, np.ndarray] = {}
+category_index: Optional[CategoryIndex] = None # Compiled embedding matrix + keyword index
+# Per-category centroids of the stored chunk embeddings (rows aligned with centroid_categories)
+centroid_categories: list[str] = []
+category_centroid_matrix: Optional[np.ndarray] = None
 # --- End Global State ---
 
 
@@ -118,9 +127,71 @@ def _load_categories_and_keywords():
         category_examples = {}
 
 
+def _uses_zero_shot_classifier() -> bool:
+    """True if the configured router needs the zero-shot classifier (directly or as fallback)."""
+    return config.CATEGORY_ROUTER.lower() != "centroid" or config.ROUTER_ZERO_SHOT_FALLBACK
+
+
+def _set_category_centroids(rows: list[tuple[str, str]]):
+    """Stores normalized centroids from (category, vector text) rows, keeping known categories only."""
+    global centroid_categories, category_centroid_matrix
+    rows = [(category, centroid) for category, centroid in rows if centroid and category in categories]
+    if not rows:
+        centroid_categories, category_centroid_matrix = [], None
+        return
+    matrix = np.array([json.loads(centroid) for _, centroid in rows], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1.0)
+    centroid_categories, category_centroid_matrix = [category for category, _ in rows], matrix
+
+
+def _load_category_profiles() -> bool:
+    """
+    Loads categories, keywords and centroids from the category_profile table
+    written by the loader. Returns False if no profiles are available.
+    """
+    global categories, category_keywords, category_examples
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT category, keywords, centroid::text FROM category_profile ORDER BY category;")
+            rows = cur.fetchall()
+    except Exception as e:
+        logging.warning(f"Category profiles unavailable: {e}")
+        return False
+
+    if not rows:
+        logging.warning("Category profile table is empty.")
+        return False
+
+    categories = [category for category, _, _ in rows]
+    category_keywords = {category: list(keywords or []) for category, keywords, _ in rows}
+    category_examples = {}
+    _set_category_centroids([(category, centroid) for category, _, centroid in rows])
+    logging.info(f"Loaded category profiles for {len(categories)} categories: {categories}")
+    return True
+
+
+def load_category_centroids():
+    """Computes normalized per-category centroids of the chunk embeddings from the data table."""
+    try:
+        with get_pool().connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT category, AVG(embedding)::text FROM data GROUP BY category ORDER BY category;")
+            rows = cur.fetchall()
+    except Exception as e:
+        logging.exception(f"Failed to load category centroids: {e}")
+        _set_category_centroids([])
+        return
+
+    _set_category_centroids(rows)
+    if category_centroid_matrix is None:
+        logging.warning("No category centroids found in the database (is the data table loaded?).")
+    else:
+        logging.info(f"Loaded {len(centroid_categories)} category centroids from the database.")
+
+
 def initialize_models():
     """Loads all ML models and necessary data. Sets the global ready flag."""
-    global models_loaded_flag, embedding_model, classifier, category_embeddings
+    global models_loaded_flag, embedding_model, classifier, category_embeddings, category_index
     # Use a lock to prevent multiple threads/workers trying to load simultaneously
     with model_loading_lock:
         if models_loaded_flag:
@@ -129,30 +200,37 @@ def initialize_models():
 
         logging.info("Starting model and data initialization...")
         try:
-            # 1. Load NLTK data
-            _load_nltk_data()
-
-            # 2. Load Categories and Keywords (needs stopwords)
-            _load_categories_and_keywords()
+            # 1-2. Load categories, keywords and centroids from the loader-built profile.
+            # Fall back to scanning DATA_DIR (needs NLTK stopwords) for databases loaded
+            # before category profiles existed.
+            profiles_loaded = _load_category_profiles()
+            if not profiles_loaded:
+                logging.info("Falling back to extracting categories and keywords from DATA_DIR...")
+                _load_nltk_data()
+                _load_categories_and_keywords()
 
             # 3. Load Embedding Model
-            logging.info(f"Loading embedding model: {config.EMBEDDING_MODEL_NAME}")
+            logging.info(f"Loading embedding model: {config.EMBEDDING_MODEL_NAME} (backend: {get_backend()})")
             # Consider adding trust_remote_code=True if required by the model
-            embedding_model = SentenceTransformer(config.EMBEDDING_MODEL_NAME)
+            embedding_model = load_embedding_model(config.EMBEDDING_MODEL_NAME)
             logging.info("Embedding model loaded.")
 
-            # 4. Load Classifier Model
-            logging.info(f"Loading classifier model: {config.CLASSIFIER_MODEL_NAME}")
-            # Device can be specified e.g., device=0 for GPU 0, or -1 for CPU (default)
-            classifier = pipeline(
-                "zero-shot-classification",
-                model=config.CLASSIFIER_MODEL_NAME
-                # device=0 # Uncomment for GPU
-            )
-            logging.info(f"Classifier model loaded. Device: {classifier.device}")
-
-            # 5. Calculate Category Embeddings (requires embedding_model and category_examples)
-            if embedding_model and category_examples:
+            # 4. Load Classifier Model (skipped if the centroid router runs without fallback)
+            if _uses_zero_shot_classifier():
+                logging.info(f"Loading classifier model: {config.CLASSIFIER_MODEL_NAME} (backend: {get_backend()})")
+                classifier = load_classifier(config.CLASSIFIER_MODEL_NAME)
+                logging.info(f"Classifier model loaded. Device: {classifier.device}")
+            else:
+                logging.info("Skipping classifier model: centroid router without zero-shot fallback.")
+
+            # 5. Category Embeddings: the profile centroids, or embeddings of
+            #    category_examples when no profile is available
+            if category_centroid_matrix is not None:
+                category_embeddings = {
+                    category: category_centroid_matrix[i] for i, category in enumerate(centroid_categories)
+                }
+                logging.info(f"Using {len(category_embeddings)} category centroids as category embeddings.")
+            elif embedding_model and category_examples:
                 logging.info("Calculating category embeddings...")
                 # Ensure category_examples is populated before this step
                 category_embeddings = {
@@ -164,6 +242,13 @@ def initialize_models():
             else:
                  logging.warning("Skipping category embeddings calculation (model or examples missing).")
 
+            # 5a. Compile the category embedding matrix and keyword index for routing
+            category_index = CategoryIndex(categories, category_embeddings, category_keywords)
+
+            # 5b. Compute category centroids for the centroid router if no profile provided them
+            if config.CATEGORY_ROUTER.lower() == "centroid" and category_centroid_matrix is None:
+                load_category_centroids()
+
 
             # 6. Set Ready Flag
             models_loaded_flag = True
@@ -200,6 +285,92 @@ def get_category_data() -> tuple[list[str], dict[str, np.ndarray], dict[str, lis
          return [], {}, {}
      return categories, category_embeddings, category_keywords
 
+def get_category_index() -> Optional[CategoryIndex]:
+    """Returns the compiled category index used for hybrid scoring."""
+    if not models_loaded_flag:
+        logging.warning("Attempted to get category index before models were loaded.")
+    return category_index
+
+def get_category_centroids() -> tuple[list[str], Optional[np.ndarray]]:
+    """Returns the category names and the matching normalized centroid matrix (or None)."""
+    return centroid_categories, category_centroid_matrix
+
+# --- Batched Inference ---
+
+def _encode_batch(texts: List[str]) -> List[np.ndarray]:
+    """Encodes several queries in one forward pass (normalized, read-only rows)."""
+    embeddings = embedding_model.encode(texts, normalize_embeddings=True, batch_size=len(texts))
+    rows = [np.array(row) for row in embeddings]
+    for row in rows:
+        row.flags.writeable = False # Shared via the query cache; must not be mutated
+    return rows
+
+
+def _classify_batch(items: List[Tuple[str, Tuple[str, ...]]]) -> List[dict]:
+    """Runs zero-shot classification for several (query, labels) items, one pipeline call per label set."""
+    results: List[Optional[dict]] = [None] * len(items)
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for position, (_, labels) in enumerate(items):
+        groups.setdefault(labels, []).append(position)
+    for labels, positions in groups.items():
+        texts = [items[position][0] for position in positions]
+        # Every (query, label) pair is one NLI forward pass; batch them instead of running one at a time
+        pair_batch_size = min(len(texts) * len(labels), config.INFERENCE_PIPELINE_BATCH_SIZE)
+        outputs = classifier(texts, list(labels), multi_label=True, batch_size=pair_batch_size)
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        for position, output in zip(positions, outputs):
+            results[position] = output
+    return results
+
+
+_embedding_batcher = MicroBatcher(
+    "embedding", _encode_batch, config.INFERENCE_BATCH_MAX_SIZE, config.INFERENCE_BATCH_WAIT_MS
+)
+_classifier_batcher = MicroBatcher(
+    "zero_shot", _classify_batch, config.INFERENCE_BATCH_MAX_SIZE, config.INFERENCE_BATCH_WAIT_MS
+)
+
+
+_async_serving = False # Set by the ASGI app; INFERENCE_BATCHING=auto batches only there
+
+
+def enable_async_serving() -> None:
+    """Marks this process as serving through the ASGI app (call before forking workers)."""
+    global _async_serving
+    _async_serving = True
+
+
+def inference_batching_enabled() -> bool:
+    """INFERENCE_BATCHING: 'true'/'false', or 'auto' = only when serving through the ASGI app."""
+    if config.INFERENCE_BATCHING == "auto":
+        return _async_serving
+    return config.INFERENCE_BATCHING in ("1", "true", "yes")
+
+
+def encode_query(text: str) -> np.ndarray:
+    """Normalized, read-only embedding of one query, batched with concurrent callers if enabled."""
+    if inference_batching_enabled():
+        return _embedding_batcher(text)
+    return _encode_batch([text])[0]
+
+
+def classify_zero_shot(text: str, labels: List[str]) -> dict:
+    """Multi-label zero-shot scores of one query, batched with concurrent callers if enabled."""
+    item = (text, tuple(labels))
+    if inference_batching_enabled():
+        return _classifier_batcher(item)
+    return _classify_batch([item])[0]
+
+
+def get_inference_stats() -> dict:
+    """Queue depth and batch-size histograms of the inference batchers for /metrics."""
+    return {
+        "enabled": inference_batching_enabled(),
+        "embedding": _embedding_batcher.stats(),
+        "zero_shot": _classifier_batcher.stats(),
+    }
+
 # --- End Model Management ---
 
 # Optional: Start initialization in a background thread when the module is imported.
@@ -2,72 +2,188 @@
 import logging
 import numpy as np
 import psycopg2
-from psycopg2.extras import execute_values # Ensure psycopg2 is in requirements
+import psycopg2.errors
+from typing import Optional
 
 # Import from other app modules
 from .ml_models import (
     get_embedding_model,
     get_classifier,
     get_category_data,
+    get_category_centroids,
+    get_category_index,
     are_models_ready,
+    encode_query,
+    classify_zero_shot,
 )
-from .utils import cosine_similarity, keyword_match_score
+from .utils import normalize_query
 from .config import config
+from .db import get_pool
+from .vector_index import build_retrieval_sql, build_hybrid_retrieval_sql
+from .cache import TTLCache
 
+# Server-side prepared statements returning the top-k chunks for every selected
+# category in one round-trip. The distance operator follows the configured
+# index opclass (see vector_index.py). The hybrid statement also runs the
+# full-text search and fuses both rankings in the same query.
+RETRIEVAL_STATEMENT_NAME = "rag_retrieve_category_chunks"
+RETRIEVAL_STATEMENT_SQL = build_retrieval_sql()
+HYBRID_RETRIEVAL_STATEMENT_NAME = "rag_retrieve_category_chunks_hybrid"
+HYBRID_RETRIEVAL_STATEMENT_SQL = build_hybrid_retrieval_sql()
 
-def select_categories(query: str) -> list[str]:
+# Cleared if the database has no content_tsv column yet (the loader adds it)
+_hybrid_retrieval_enabled = config.RETRIEVAL_MODE.lower() == "hybrid"
+
+# Per-worker caches keyed on normalized query text
+_query_embedding_cache = TTLCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL, name="query_embedding")
+_category_score_cache = TTLCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL, name="category_scores")
+
+
+class QueryContext:
+    """
+    Request-scoped state for one chat turn. The query embedding is computed
+    at most once (or taken from the cache) and shared by every pipeline stage.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.cache_key = normalize_query(query)
+        self._embedding: Optional[np.ndarray] = None
+
+    @property
+    def embedding(self) -> Optional[np.ndarray]:
+        """The normalized query embedding (read-only), or None if the model is unavailable."""
+        if self._embedding is None:
+            self._embedding = _query_embedding_cache.get(self.cache_key)
+            if self._embedding is None:
+                embedding_model = get_embedding_model()
+                if not embedding_model:
+                    return None
+                embedding = encode_query(self.query) # Read-only: shared via the cache
+                _query_embedding_cache.set(self.cache_key, embedding)
+                self._embedding = embedding
+        return self._embedding
+
+
+def get_cache_stats() -> dict:
+    """Returns hit/miss counters of the query caches for /metrics."""
+    return {
+        "query_embedding": _query_embedding_cache.stats(),
+        "category_scores": _category_score_cache.stats(),
+    }
+
+
+def clear_query_caches() -> None:
+    """Drops cached embeddings and router scores (e.g. after category data changes)."""
+    _query_embedding_cache.clear()
+    _category_score_cache.clear()
+
+
+def _score_categories_centroid(context: QueryContext) -> Optional[dict[str, float]]:
+    """
+    Scores every category by cosine similarity between the query embedding and
+    the centroid of that category's stored chunk embeddings (one matmul).
+    Returns None if centroids are unavailable.
     """
-    Selects relevant categories for a given query using a hybrid approach.
+    centroid_names, centroid_matrix = get_category_centroids()
+    query_vec = context.embedding
+    if centroid_matrix is None or not centroid_names or query_vec is None:
+        return None
+    similarities = centroid_matrix @ query_vec.astype(np.float32, copy=False)
+    return {name: float(score) for name, score in zip(centroid_names, similarities)}
+
+
+def _score_categories(context: QueryContext, categories: list[str], classifier) -> dict[str, float]:
+    """
+    Computes hybrid (cosine + keyword + zero-shot) scores for every category.
+    Cosine and keyword scores are computed for all categories at once from
+    the precompiled CategoryIndex.
+    """
+    query = context.query
+    category_index = get_category_index()
+    if category_index is None or not category_index.categories:
+        logging.warning("Category index is empty; no categories can be scored.")
+        return {}
+
+    # Zero-shot classification
+    logging.debug("Performing zero-shot classification...")
+    zero_shot_results = classify_zero_shot(query, categories)
+    zero_shot_score_map = {
+        label: score
+        for label, score in zip(zero_shot_results["labels"], zero_shot_results["scores"])
+    }
+    logging.debug(f"Zero-shot scores: {zero_shot_score_map}")
+
+    # Calculate hybrid scores (adjust weights as needed)
+    cosine_scores = category_index.cosine_scores(context.embedding)
+    keyword_scores = category_index.keyword_scores(query)
+    zero_scores = np.array(
+        [zero_shot_score_map.get(category_name, 0.0) for category_name in category_index.categories],
+        dtype=np.float32
+    )
+    final_scores = (
+        0.4 * cosine_scores +
+        0.3 * keyword_scores +
+        0.3 * zero_scores
+    )
+    return dict(zip(category_index.categories, final_scores.tolist()))
+
+
+def select_categories(query: str, context: Optional[QueryContext] = None,
+                      router: Optional[str] = None) -> list[str]:
+    """
+    Selects relevant categories for a given query.
+
+    The router is 'hybrid' (cosine + keyword + zero-shot scores) or 'centroid'
+    (cosine against per-category chunk-embedding centroids, optionally falling
+    back to 'hybrid'); it defaults to config.CATEGORY_ROUTER. Raw centroid
+    cosines sit close together, so the centroid router has its own cutoffs
+    (ROUTER_CENTROID_MIN_SCORE, ROUTER_CENTROID_MARGIN). Router scores are
+    cached per normalized query text.
     Returns a list of category names.
     """
     if not are_models_ready():
         logging.error("Cannot select categories: Models are not ready.")
         return []
 
+    router = (router or config.CATEGORY_ROUTER).lower()
     embedding_model = get_embedding_model()
     classifier = get_classifier()
-    categories, category_embeddings, category_keywords = get_category_data()
+    categories, _, _ = get_category_data()
 
-    if not embedding_model or not classifier or not categories:
+    if not embedding_model or not categories or (router != "centroid" and not classifier):
         logging.error("Cannot select categories: Missing models or category data.")
         return []
 
+    if context is None:
+        context = QueryContext(query)
+
     try:
         logging.debug(f"Selecting categories for query: '{query[:50]}...'")
-        query_vec = embedding_model.encode(query, normalize_embeddings=True)
-
-        # Zero-shot classification
-        logging.debug("Performing zero-shot classification...")
-        zero_shot_results = classifier(query, categories, multi_label=True)
-        zero_shot_score_map = {
-            label: score
-            for label, score in zip(zero_shot_results["labels"], zero_shot_results["scores"])
-        }
-        logging.debug(f"Zero-shot scores: {zero_shot_score_map}")
-
-        # Calculate hybrid scores
-        scores = {}
-        for category_name in categories:
-            cat_vec = category_embeddings.get(category_name)
-            keywords = category_keywords.get(category_name, [])
-
-            if cat_vec is None:
-                logging.warning(f"No embedding found for category: {category_name}")
-                continue
+        cache_key = (router, context.cache_key)
+        cached = _category_score_cache.get(cache_key)
+        scored_by, scores = cached if cached is not None else (router, None)
+        if scores is None:
+            if router == "centroid":
+                scores = _score_categories_centroid(context)
+                if scores is None:
+                    logging.warning("Centroid router unavailable (no centroids loaded).")
+                elif config.ROUTER_ZERO_SHOT_FALLBACK and config.ROUTER_FALLBACK_MARGIN > 0 and len(scores) > 1:
+                    top_two = sorted(scores.values(), reverse=True)[:2]
+                    if top_two[0] - top_two[1] < config.ROUTER_FALLBACK_MARGIN:
+                        logging.debug(f"Centroid scores too close ({top_two}); falling back to zero-shot router.")
+                        scores = None
+                if scores is None and not (config.ROUTER_ZERO_SHOT_FALLBACK and classifier):
+                    logging.error("Cannot select categories: centroid router failed and zero-shot fallback is disabled.")
+                    return []
+            if scores is None:
+                scores = _score_categories(context, categories, classifier)
+                scored_by = "hybrid"
+            _category_score_cache.set(cache_key, (scored_by, scores))
+        else:
+            logging.debug("Using cached category scores.")
 
-            cosine_score = cosine_similarity(query_vec, cat_vec)
-            keyword_score = keyword_match_score(query, keywords)
-            zero_score = zero_shot_score_map.get(category_name, 0.0)
-
-            # Adjust weights as needed
-            final_score = (
-                0.4 * cosine_score +
-                0.3 * keyword_score +
-                0.3 * zero_score
-            )
-            scores[category_name] = final_score
-
-        logging.debug(f"Hybrid scores: {scores}")
+        logging.debug(f"{scored_by.capitalize()} scores: {scores}")
 
         if not scores:
             logging.warning("No categories scored.")
@@ -75,8 +191,12 @@ def select_categories(query: str) -> list[str]:
 
         # Selection logic (adjust thresholds and logic as needed)
         max_score = max(scores.values())
-        score_threshold = 0.1  # Minimum score to be considered
-        proximity_threshold = 0.05 # How close to max_score to be included
+        if scored_by == "centroid":
+            score_threshold = config.ROUTER_CENTROID_MIN_SCORE
+            proximity_threshold = config.ROUTER_CENTROID_MARGIN
+        else:
+            score_threshold = 0.1  # Minimum score to be considered
+            proximity_threshold = 0.05 # How close to max_score to be included
 
         selected_categories = [
             cat for cat, score in scores.items()
@@ -101,10 +221,87 @@ def select_categories(query: str) -> list[str]:
         return []
 
 
-def retrieve_context(query: str) -> list[str]:
+def _parse_vector(value: Optional[str]) -> Optional[np.ndarray]:
+    """Parses pgvector's text form '[0.1,0.2,...]' into a float32 array."""
+    if value is None:
+        return None
+    return np.fromstring(value.strip("[]"), sep=",", dtype=np.float32)
+
+
+def fetch_context_chunks(selected_categories: list[str], query_embedding: np.ndarray,
+                         query: Optional[str] = None) -> list[dict]:
+    """
+    Fetches the top chunks for every selected category in one round-trip.
+    With RETRIEVAL_MODE=hybrid and the query text given, full-text matches
+    are fused with the vector candidates (see build_hybrid_retrieval_sql).
+    Raises psycopg2.Error on database failures.
+
+    Returns a list of dicts with keys 'id', 'category', 'content',
+    'distance' (lower is more similar) and 'embedding' (the stored float32
+    chunk embedding), ordered by selected category and then by distance;
+    hybrid results also have the fused 'score' (higher is better) and are
+    ordered by it instead.
+    """
+    global _hybrid_retrieval_enabled
+    fetch_limit_per_category = 5 # Max chunks per category
+    query_embedding_list = query_embedding.tolist() # For psycopg2
+    hybrid = _hybrid_retrieval_enabled and bool(query)
+
+    pool = get_pool()
+    if hybrid:
+        pool.register_prepared_statement(
+            HYBRID_RETRIEVAL_STATEMENT_NAME, ("text[]", "vector", "integer", "text"), HYBRID_RETRIEVAL_STATEMENT_SQL
+        )
+    else:
+        pool.register_prepared_statement(
+            RETRIEVAL_STATEMENT_NAME, ("text[]", "vector", "integer"), RETRIEVAL_STATEMENT_SQL
+        )
+    logging.debug(f"Querying DB for categories {selected_categories} ({'hybrid' if hybrid else 'vector'})...")
+    try:
+        with pool.connection() as conn, conn.cursor() as cur:
+            if hybrid:
+                pool.execute_prepared(
+                    cur,
+                    HYBRID_RETRIEVAL_STATEMENT_NAME,
+                    (list(selected_categories), query_embedding_list, fetch_limit_per_category, query),
+                    param_casts=("::text[]", "::vector", "", "")
+                )
+            else:
+                pool.execute_prepared(
+                    cur,
+                    RETRIEVAL_STATEMENT_NAME,
+                    (list(selected_categories), query_embedding_list, fetch_limit_per_category),
+                    param_casts=("::text[]", "::vector", "")
+                )
+            results = cur.fetchall()
+    except psycopg2.errors.UndefinedColumn as e:
+        if not hybrid:
+            raise
+        logging.warning(f"Hybrid retrieval unavailable ({e.pgerror.strip() if e.pgerror else e}); run the loader to add data.content_tsv. Using vector retrieval.")
+        _hybrid_retrieval_enabled = False
+        return fetch_context_chunks(selected_categories, query_embedding)
+
+    retrieved_chunks = []
+    for row in results:
+        category, chunk_id, content, distance, embedding = row[:5]
+        chunk = {
+            "id": chunk_id, "category": category, "content": content, "distance": float(distance),
+            "embedding": _parse_vector(embedding),
+        }
+        if hybrid:
+            chunk["score"] = float(row[5])
+        retrieved_chunks.append(chunk)
+    logging.info(f"Total retrieved chunks from DB: {len(retrieved_chunks)} across {len(selected_categories)} categories")
+    return retrieved_chunks
+
+
+def retrieve_context(query: str, context: Optional[QueryContext] = None) -> list[dict]:
     """
     Retrieves relevant text chunks from the database based on the query
-    after selecting categories.
+    after selecting categories. Pass a QueryContext to share the query
+    embedding with other stages of the request.
+
+    Returns the chunk dicts described in fetch_context_chunks().
     """
     if not are_models_ready():
         logging.error("Cannot retrieve context: Models are not ready.")
@@ -115,67 +312,19 @@ def retrieve_context(query: str) -> list[str]:
         logging.error("Cannot retrieve context: Embedding model not available.")
         return []
 
-    selected_categories = select_categories(query)
+    if context is None:
+        context = QueryContext(query)
+
+    selected_categories = select_categories(query, context)
     if not selected_categories:
         logging.warning(f"No categories selected for query '{query[:50]}...', cannot retrieve context.")
         return []
 
-    conn = None
-    cur = None
-    retrieved_chunks = []
-    fetch_limit_per_category = 5 # Max chunks per category
-
     try:
-        query_embedding = embedding_model.encode(query, normalize_embeddings=True)
-        query_embedding_list = query_embedding.tolist() # For psycopg2
-
-        logging.debug(f"Connecting to DB: Host={config.DB_HOST}, DB={config.DB_NAME}")
-        conn = psycopg2.connect(
-            host=config.DB_HOST,
-            database=config.DB_NAME,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD,
-            connect_timeout=10 # Add a connection timeout
-        )
-        cur = conn.cursor()
-        logging.debug("DB connection successful.")
-
-        for category in selected_categories:
-            logging.debug(f"Querying DB for category '{category}'...")
-            cur.execute(
-                """
-                SELECT content
-                FROM data
-                WHERE category = %s
-                ORDER BY embedding <#> %s::vector
-                LIMIT %s
-                """,
-                (category, query_embedding_list, fetch_limit_per_category)
-            )
-            results = cur.fetchall()
-            category_chunks = [row[0] for row in results]
-            retrieved_chunks.extend(category_chunks)
-            logging.debug(f"Retrieved {len(category_chunks)} chunks for category '{category}'.")
-
-        logging.info(f"Total retrieved chunks from DB: {len(retrieved_chunks)}")
-        return retrieved_chunks
-
+        return fetch_context_chunks(selected_categories, context.embedding, query)
     except psycopg2.Error as db_err:
         logging.exception(f"Database error during context retrieval: {db_err}")
         return [] # Return empty list on DB error
     except Exception as e:
         logging.exception(f"General error during context retrieval: {e}")
         return [] # Return empty list on other errors
-    finally:
-        # Ensure database connection is closed
-        if cur:
-            try:
-                cur.close()
-            except Exception as e:
-                 logging.error(f"Error closing cursor: {e}")
-        if conn:
-            try:
-                conn.close()
-                logging.debug("DB connection closed.")
-            except Exception as e:
-                 logging.error(f"Error closing connection: {e}")
\ No newline at end of file
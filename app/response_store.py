@@ -0,0 +1,199 @@
+# app/response_store.py
+"""
+Exact-match response cache shared by all worker processes on a host.
+
+Answers are stored in a local SQLite database (WAL mode, so readers never
+block the single writer and concurrent processes are safe) keyed on a hash
+of (normalized user message, language, Ollama model, hash of the context
+text). The file lives on a volume, so it survives worker recycling,
+restarts and deploys. Size is bounded by RESPONSE_STORE_MAX_MB: the least
+recently used rows are deleted once the stored text exceeds it.
+"""
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from .config import config
+
+# Access times are only rewritten when older than this, so hot entries do
+# not turn every read into a write.
+_TOUCH_INTERVAL_SECONDS = 60.0
+# The total stored size is re-checked every N inserts.
+_SIZE_CHECK_EVERY = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at_idx ON responses (accessed_at);
+"""
+
+
+def make_response_key(normalized_message: str, language: str, model: str, context_text: str) -> str:
+    """Hash of everything that determines the generated answer."""
+    context_hash = hashlib.sha256(context_text.encode("utf-8")).hexdigest()
+    payload = json.dumps([normalized_message, language, model, context_hash], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """
+    SQLite-backed exact response cache. Connections are opened lazily per
+    thread and per process (never shared across a fork); every method logs
+    and degrades to a cache miss on database errors.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float, busy_timeout: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and self.max_bytes > 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.executescript(_SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the stored response for key, or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response, created_at, accessed_at FROM responses WHERE key = ?;", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            response, created_at, accessed_at = row
+            if self.ttl > 0 and created_at + self.ttl <= now:
+                conn.execute("DELETE FROM responses WHERE key = ?;", (key,))
+                self._count("misses")
+                return None
+            if now - accessed_at > _TOUCH_INTERVAL_SECONDS:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?;", (now, key))
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Response store read failed: {e}")
+            self._count("errors")
+            return None
+        self._count("hits")
+        logging.info("Response store hit.")
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """Stores a response, evicting least recently used rows beyond the size cap."""
+        if not self.enabled or not response:
+            return
+        size = len(response.encode("utf-8")) + len(key)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?);",
+                (key, response, size, now, now)
+            )
+            with self._lock:
+                self._inserts += 1
+                check_size = self._inserts % _SIZE_CHECK_EVERY == 1
+            if check_size:
+                self._evict(conn)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Response store write failed: {e}")
+            self._count("errors")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drops expired rows, then the least recently used rows until under the size cap."""
+        if self.ttl > 0:
+            conn.execute("DELETE FROM responses WHERE created_at <= ?;", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses;").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the cap so eviction does not run on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            removed = 0
+            freed = 0
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at;").fetchall():
+                if freed >= excess:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?;", (key,))
+                freed += size
+                removed += 1
+            conn.execute("COMMIT;")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK;")
+            raise
+        with self._lock:
+            self.evictions += removed
+        logging.info(f"Response store evicted {removed} entries ({freed} bytes).")
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters of this worker and the shared store size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "path": self.path,
+                "max_stored_mib": round(self.max_bytes / (1024 * 1024), 3),
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        if self.enabled:
+            try:
+                count, total = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses;"
+                ).fetchone()
+                stats["size"] = count
+                stats["stored_mib"] = round(total / (1024 * 1024), 3)
+            except (sqlite3.Error, OSError) as e:
+                stats["error"] = str(e)
+        return stats
+
+
+response_store = ResponseStore(
+    path=config.RESPONSE_STORE_PATH if config.RESPONSE_STORE_ENABLED else "",
+    max_bytes=int(config.RESPONSE_STORE_MAX_MB * 1024 * 1024),
+    ttl=config.RESPONSE_STORE_TTL,
+)
@@ -1,14 +1,34 @@
 # app/routes.py
+import time
 import logging
-from flask import Blueprint, request, jsonify, render_template, current_app
-import ollama
+from flask import Blueprint, request, jsonify, render_template, current_app, Response, stream_with_context
 
 # Import from other app modules
-from .ml_models import are_models_ready
-from .rag_core import retrieve_context
-from .utils import extract_message_content
+from .ml_models import are_models_ready, get_inference_stats
+from .rag_core import retrieve_context, get_cache_stats, QueryContext
+from .context_builder import assemble_context, get_context_stats
+from .utils import extract_message_content, get_process_memory
 from .config import config
-from .prompt_manager import get_prompt_manager
+from .llm_client import get_ollama_client, get_chat_kwargs
+from .db import get_pool_stats
+from .answer_cache import answer_cache
+from .response_store import response_store
+from .chat_service import (
+    NOT_READY_ERROR,
+    RETRIEVAL_ERROR,
+    INSUFFICIENT_CONTEXT_RESPONSE,
+    GENERATION_FAILED_RESPONSE,
+    SSE_HEADERS,
+    ChatRequestError,
+    ChatStream,
+    parse_chat_request,
+    build_context_text,
+    has_sufficient_context,
+    build_ollama_messages,
+    ollama_error_message,
+    get_cached_answer,
+    cache_answer,
+)
 
 # Create a Blueprint for routes
 main_bp = Blueprint('main', __name__)
@@ -24,83 +44,103 @@ def chat_ui():
     """Serves the chat interface HTML."""
     return render_template("chat.html")
 
+def _stream_chat_response(ollama_messages: list, request_start: float, retrieval_ms: float, on_complete=None):
+    """Generator yielding SSE frames for a streamed Ollama chat completion."""
+    chat_stream = ChatStream(request_start, retrieval_ms, on_complete)
+    try:
+        logging.info(f"Streaming from Ollama at {config.OLLAMA_HOST} with model {config.OLLAMA_MODEL}")
+        ollama_client = get_ollama_client()
+        stream = ollama_client.chat(
+            messages=ollama_messages,
+            stream=True,
+            **get_chat_kwargs()
+        )
+        for chunk in stream:
+            frame = chat_stream.feed(chunk)
+            if frame:
+                yield frame
+    except Exception as ollama_error:
+        yield chat_stream.error(ollama_error)
+        return
+
+    yield from chat_stream.finish()
+
+
 @main_bp.route("/chat", methods=["POST"])
 def chat_api():
-    """Handles chat requests, performs RAG, and interacts with Ollama."""
+    """
+    Handles chat requests, performs RAG, and interacts with Ollama.
+    If the request body contains "stream": true, tokens are returned as
+    Server-Sent Events ("token" frames, then a final "done" or "error" frame).
+    """
+    request_start = time.perf_counter()
     if not are_models_ready():
         logging.warning("Received /chat request before models were ready.")
-        return jsonify({'error': 'Service is initializing, please try again shortly.'}), 503
+        return jsonify({'error': NOT_READY_ERROR}), 503
 
-    # Get message history and selected language from request
-    messages = request.json.get('messages')
-    selected_language = request.json.get('language', 'en')  # Default to English if not specified
-    
-    if not messages or not isinstance(messages, list):
-        logging.error(f"Invalid message format received: {messages}")
-        return jsonify({'error': 'Messages must be a list.'}), 400
-
-    # Extract the last user message
-    user_message = ""
-    for msg in reversed(messages):
-        if msg.get("role") == "user":
-            user_message = msg.get("content", "").strip()
-            break
-
-    if not user_message:
-        logging.error("No user message found in the history or message is empty.")
-        return jsonify({'error': 'User message cannot be empty.'}), 400
+    try:
+        user_message, selected_language, stream_response = parse_chat_request(request.get_json(silent=True))
+    except ChatRequestError as e:
+        return jsonify({'error': e.message}), e.status
 
     logging.info(f"Processing user message: '{user_message[:100]}...' in language: {selected_language}")
 
     # 1. Retrieve Context using RAG
     try:
-        context_chunks = retrieve_context(user_message)
-        context_text = "\n---\n".join(context_chunks) if context_chunks else "" # Use join for context
+        query_context = QueryContext(user_message)
+        context_chunks = retrieve_context(user_message, query_context)
+        # Dedupe, pick by MMR and fit the chunks into the prompt's token budget
+        context_chunks = assemble_context(context_chunks, query_context, selected_language)
+        context_text = build_context_text(context_chunks)
     except Exception as e:
          logging.exception("Error retrieving context.")
-         return jsonify({'error': 'Failed to retrieve context information.'}), 500
+         return jsonify({'error': RETRIEVAL_ERROR}), 500
+    retrieval_ms = (time.perf_counter() - request_start) * 1000
 
     # Check if context is sufficient
-    if not context_text or len(context_text) < 10: # Basic check
+    if not has_sufficient_context(context_text):
         logging.warning(f"Insufficient context found for query: '{user_message[:100]}...'")
-        return jsonify({'response': "I couldn't find specific information related to your question in the available documents."})
-
-    # 2. Get system prompt using PromptManager
-    prompt_manager = get_prompt_manager()
-    system_prompt = prompt_manager.get_system_prompt(
-        lang=selected_language,
-        context=context_text
-    )
-
-    # Prepare messages for Ollama
-    ollama_messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message}
-    ]
-    
-    logging.debug(f"Messages being sent to Ollama: {ollama_messages}")
+        return jsonify({'response': INSUFFICIENT_CONTEXT_RESPONSE})
+
+    # Reuse the answer to an equivalent question over the same chunks
+    chunk_ids = [chunk["id"] for chunk in context_chunks]
+    cached_answer = get_cached_answer(query_context, selected_language, chunk_ids, context_text)
+    if cached_answer:
+        if stream_response:
+            return Response(
+                ChatStream(request_start, retrieval_ms).cached(cached_answer),
+                mimetype="text/event-stream",
+                headers=SSE_HEADERS
+            )
+        return jsonify({'response': cached_answer})
+
+    def store_answer(answer: str) -> None:
+        cache_answer(query_context, selected_language, chunk_ids, context_text, answer)
+
+    # 2. Build the system prompt and messages for Ollama
+    ollama_messages = build_ollama_messages(user_message, selected_language, context_text)
+
+    if stream_response:
+        return Response(
+            stream_with_context(_stream_chat_response(ollama_messages, request_start, retrieval_ms, store_answer)),
+            mimetype="text/event-stream",
+            headers=SSE_HEADERS
+        )
     
     # 3. Call Ollama
     try:
         logging.info(f"Connecting to Ollama at {config.OLLAMA_HOST} with model {config.OLLAMA_MODEL}")
-        ollama_client = ollama.Client(host=config.OLLAMA_HOST, timeout=120.0)
+        ollama_client = get_ollama_client()
 
         response = ollama_client.chat(
-            model=config.OLLAMA_MODEL,
             messages=ollama_messages,
-            options={"temperature": 0.1}
+            **get_chat_kwargs()
         )
         logging.info("Received response from Ollama.")
 
     except Exception as ollama_error:
         logging.exception(f"Error communicating with Ollama: {ollama_error}")
-        error_msg = "Could not connect to the language model service."
-        if "Connection refused" in str(ollama_error):
-             error_msg = "Language model service is not reachable."
-        elif "timed out" in str(ollama_error).lower():
-             error_msg = "Language model service timed out."
-
-        return jsonify({'error': error_msg}), 503
+        return jsonify({'error': ollama_error_message(ollama_error)}), 503
 
     # 4. Process and Return Response
     response_text = extract_message_content(response)
@@ -108,8 +148,9 @@ def chat_api():
 
     if "Error processing Ollama response" in response_text or not response_text:
          logging.error(f"Invalid or error response received/processed from Ollama. Raw: {response}")
-         return jsonify({'response': "Sorry, I encountered an issue generating the response."})
+         return jsonify({'response': GENERATION_FAILED_RESPONSE})
 
+    store_answer(response_text)
     logging.info(f"Final response to user: '{response_text[:100]}...'")
     return jsonify({'response': response_text})
 
@@ -119,4 +160,17 @@ def health_check():
     if are_models_ready():
         return jsonify({"status": "OK", "message": "Models loaded and ready."}), 200
     else:
-        return jsonify({"status": "UNHEALTHY", "message": "Models are initializing or failed to load."}), 503
\ No newline at end of file
+        return jsonify({"status": "UNHEALTHY", "message": "Models are initializing or failed to load."}), 503
+
+@main_bp.route("/metrics")
+def metrics():
+    """Per-worker runtime metrics (not exposed through Nginx)."""
+    return jsonify({
+        "db_pool": get_pool_stats(),
+        "query_caches": get_cache_stats(),
+        "answer_cache": answer_cache.stats(),
+        "context_builder": get_context_stats(),
+        "response_store": response_store.stats(),
+        "inference_batching": get_inference_stats(),
+        "memory": get_process_memory(),
+    }), 200
@@ -1,43 +1,13 @@
 # app/utils.py
+import os
 import re
-import numpy as np
 import logging
-from typing import Any, Dict, Union, Optional
+from typing import Any, Dict, Union
 
 
-def cosine_similarity(vec_a: Optional[np.ndarray], vec_b: Optional[np.ndarray]) -> float:
-    """Calculates cosine similarity between two numpy vectors."""
-    if vec_a is None or vec_b is None:
-        logging.warning("Cosine similarity input vector is None.")
-        return 0.0
-    if vec_a.shape != vec_b.shape:
-         logging.warning(f"Cosine similarity input vectors have different shapes: {vec_a.shape} vs {vec_b.shape}")
-         return 0.0
-    if not np.all(np.isfinite(vec_a)) or not np.all(np.isfinite(vec_b)):
-        logging.warning("Cosine similarity input vector contains NaN or infinite values.")
-        return 0.0
-
-    # Assuming vectors are already normalized (as done by SentenceTransformer with normalize_embeddings=True)
-    dot_product = np.dot(vec_a, vec_b)
-
-    # Handle potential floating point inaccuracies close to 1 or -1
-    dot_product = np.clip(dot_product, -1.0, 1.0)
-
-    # Check for very small values to avoid precision issues if needed,
-    # but for normalized vectors, dot product is directly the cosine similarity.
-    if np.abs(dot_product) < 1e-9:
-        return 0.0
-
-    return float(dot_product)
-
-
-def keyword_match_score(query: str, keywords: list[str]) -> float:
-    """Calculates a simple keyword match score."""
-    if not keywords:
-        return 0.0
-    query_lower = query.lower()
-    score = sum(1 for keyword in keywords if keyword.lower() in query_lower)
-    return score / len(keywords)
+def normalize_query(query: str) -> str:
+    """Normalizes query text for use as a cache key (case-folded, whitespace collapsed)."""
+    return " ".join(query.split()).casefold()
 
 
 def extract_message_content(response: Union[Dict[str, Any], object]) -> str:
@@ -66,4 +36,139 @@ def extract_message_content(response: Union[Dict[str, Any], object]) -> str:
 
     except Exception as e:
         logging.exception(f"Error extracting message content: {e}")
-        return "Error processing Ollama response."
\ No newline at end of file
+        return "Error processing Ollama response."
+
+def get_process_memory() -> Dict[str, Any]:
+    """
+    Returns this process's memory usage in MiB from /proc/self/smaps_rollup (Linux).
+    'pss' divides shared pages between the processes sharing them, so summing
+    pss over gunicorn workers gives the real footprint; 'private' is what each
+    extra worker costs on top of the copy-on-write shared models.
+    """
+    fields = {"Rss": "rss_mib", "Pss": "pss_mib", "Shared_Clean": "shared_clean_mib",
+              "Shared_Dirty": "shared_dirty_mib", "Private_Clean": "private_clean_mib",
+              "Private_Dirty": "private_dirty_mib"}
+    memory: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    memory[fields[name]] = round(int(rest.split()[0]) / 1024, 1) # kB -> MiB
+    except OSError:
+        return memory
+    if "private_clean_mib" in memory and "private_dirty_mib" in memory:
+        memory["private_mib"] = round(memory["private_clean_mib"] + memory["private_dirty_mib"], 1)
+    return memory
+
+
+def get_response_field(response: Union[Dict[str, Any], object], field: str, default: Any = None) -> Any:
+    """Reads a field from an Ollama response that may be a dict or a response object."""
+    if isinstance(response, dict):
+        return response.get(field, default)
+    return getattr(response, field, default)
+
+
+def extract_stream_delta(chunk: Union[Dict[str, Any], object]) -> str:
+    """Extracts the incremental message content from a streamed Ollama chat chunk."""
+    message = get_response_field(chunk, 'message')
+    if message is None:
+        return ""
+    content = get_response_field(message, 'content', "") or ""
+    return content if isinstance(content, str) else str(content)
+
+
+class ThinkTagStripper:
+    """
+    Incrementally removes <think>...</think> blocks from streamed text.
+
+    Produces the same output as extract_message_content() would for the
+    concatenated stream: think blocks and the whitespace following them are
+    dropped, and leading/trailing whitespace is stripped. Tags split across
+    chunk boundaries are handled by holding back a possible partial tag.
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self._buffer = ""          # Unprocessed text (may end with a partial tag)
+        self._think_buffer = ""    # Text of the currently open think block
+        self._in_think = False
+        self._skip_whitespace = False
+        self._started = False      # True once non-whitespace output was emitted
+        self._pending_whitespace = ""
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        """Returns the length of the longest suffix of text that is a prefix of tag."""
+        text_lower = text[-(len(tag) - 1):].lower()
+        for length in range(min(len(text_lower), len(tag) - 1), 0, -1):
+            if tag.startswith(text_lower[-length:]):
+                return length
+        return 0
+
+    def _emit(self, text: str) -> str:
+        """Applies leading/trailing whitespace stripping to visible text."""
+        if not text:
+            return ""
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        stripped = text.rstrip()
+        if not stripped:
+            self._pending_whitespace += text
+            return ""
+        out = self._pending_whitespace + stripped
+        self._pending_whitespace = text[len(stripped):]
+        return out
+
+    def feed(self, delta: str) -> str:
+        """Consumes a streamed chunk and returns the text that is safe to display."""
+        self._buffer += delta
+        output = []
+        while self._buffer:
+            if self._in_think:
+                idx = self._buffer.lower().find(self.CLOSE_TAG)
+                if idx == -1:
+                    keep = self._partial_tag_length(self._buffer, self.CLOSE_TAG)
+                    self._think_buffer += self._buffer[:len(self._buffer) - keep]
+                    self._buffer = self._buffer[len(self._buffer) - keep:]
+                    break
+                self._buffer = self._buffer[idx + len(self.CLOSE_TAG):]
+                self._think_buffer = ""
+                self._in_think = False
+                self._skip_whitespace = True
+                continue
+
+            if self._skip_whitespace:
+                self._buffer = self._buffer.lstrip()
+                if not self._buffer:
+                    break
+                self._skip_whitespace = False
+
+            idx = self._buffer.lower().find(self.OPEN_TAG)
+            if idx == -1:
+                keep = self._partial_tag_length(self._buffer, self.OPEN_TAG)
+                output.append(self._emit(self._buffer[:len(self._buffer) - keep]))
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                break
+            output.append(self._emit(self._buffer[:idx]))
+            self._think_buffer = self._buffer[idx:idx + len(self.OPEN_TAG)]
+            self._buffer = self._buffer[idx + len(self.OPEN_TAG):]
+            self._in_think = True
+        return "".join(output)
+
+    def flush(self) -> str:
+        """Returns any held-back text at the end of the stream."""
+        remainder = self._buffer
+        if self._in_think:
+            # An unterminated think block is not removed by the non-streaming path either
+            remainder = self._think_buffer + remainder
+        self._buffer = ""
+        self._think_buffer = ""
+        self._in_think = False
+        if self._skip_whitespace:
+            remainder = remainder.lstrip()
+        return self._emit(remainder)
@@ -0,0 +1,210 @@
+# app/vector_index.py
+import math
+import logging
+from typing import Optional
+
+from .config import config
+
+# Distance metric -> (query operator, index operator class).
+# The retrieval query must use the operator that matches the index opclass,
+# otherwise PostgreSQL cannot use the ANN index and falls back to a sequential scan.
+DISTANCE_METRICS = {
+    "inner_product": ("<#>", "vector_ip_ops"),
+    "cosine": ("<=>", "vector_cosine_ops"),
+    "l2": ("<->", "vector_l2_ops"),
+}
+INDEX_TYPES = ("ivfflat", "hnsw")
+INDEX_NAME = "data_embedding_idx"
+
+# Full-text search. 'simple' only lowercases (no stemming, no stop words), so
+# identifiers, part numbers and names match exactly in any corpus language.
+# The loader creates data.content_tsv as a generated column with this config.
+TEXT_SEARCH_CONFIG = "simple"
+TEXT_INDEX_NAME = "data_content_tsv_idx"
+
+
+def get_index_type() -> str:
+    """Returns the configured ANN index type, defaulting to HNSW if invalid."""
+    index_type = config.VECTOR_INDEX_TYPE.lower()
+    if index_type not in INDEX_TYPES:
+        logging.warning(f"Unknown VECTOR_INDEX_TYPE '{config.VECTOR_INDEX_TYPE}', using 'hnsw'.")
+        return "hnsw"
+    return index_type
+
+
+def _get_metric() -> tuple[str, str]:
+    metric = config.VECTOR_DISTANCE_METRIC.lower()
+    if metric not in DISTANCE_METRICS:
+        logging.warning(f"Unknown VECTOR_DISTANCE_METRIC '{config.VECTOR_DISTANCE_METRIC}', using 'inner_product'.")
+        metric = "inner_product"
+    return DISTANCE_METRICS[metric]
+
+
+def get_distance_operator() -> str:
+    """Returns the pgvector distance operator matching the index opclass."""
+    return _get_metric()[0]
+
+
+def get_operator_class() -> str:
+    """Returns the pgvector operator class used to build the index."""
+    return _get_metric()[1]
+
+
+def ivfflat_lists_for_rows(row_count: int) -> int:
+    """
+    Chooses the number of IVFFlat lists: the configured value if set, otherwise
+    rows / 1000 up to 1M rows and sqrt(rows) beyond (pgvector's guidance).
+    """
+    if config.IVFFLAT_LISTS > 0:
+        return config.IVFFLAT_LISTS
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return max(1, int(math.sqrt(row_count)))
+
+
+def build_index_sql(row_count: int, table: str = "data", index_name: str = INDEX_NAME,
+                    concurrently: bool = False) -> str:
+    """Returns the CREATE INDEX statement for the configured index strategy."""
+    opclass = get_operator_class()
+    create = "CREATE INDEX CONCURRENTLY" if concurrently else "CREATE INDEX"
+    if get_index_type() == "ivfflat":
+        lists = ivfflat_lists_for_rows(row_count)
+        return f"{create} {index_name} ON {table} USING ivfflat (embedding {opclass}) WITH (lists = {lists});"
+    return (
+        f"{create} {index_name} ON {table} USING hnsw (embedding {opclass}) "
+        f"WITH (m = {config.HNSW_M}, ef_construction = {config.HNSW_EF_CONSTRUCTION});"
+    )
+
+
+def session_options() -> Optional[str]:
+    """
+    Returns libpq startup options that set the ANN search parameters
+    (ivfflat.probes / hnsw.ef_search and the iterative scan mode) for every
+    pooled connection, so queries need no extra SET round-trip.
+
+    The retrieval queries filter the index scan by category. Without an
+    iterative scan only the first ef_search (or probes' worth of) nearest
+    rows are considered, so a small category often returns fewer than the
+    requested chunks, or none; with it the scan continues until enough rows
+    pass the filter.
+    """
+    index_type = get_index_type()
+    if index_type == "ivfflat":
+        options = [f"-c ivfflat.probes={config.IVFFLAT_PROBES}"]
+    else:
+        options = [f"-c hnsw.ef_search={config.HNSW_EF_SEARCH}"]
+    iterative_scan = config.VECTOR_ITERATIVE_SCAN.lower()
+    if index_type == "ivfflat" and iterative_scan == "strict_order":
+        logging.warning("VECTOR_ITERATIVE_SCAN 'strict_order' is HNSW only, using 'relaxed_order' for IVFFlat.")
+        iterative_scan = "relaxed_order"
+    if iterative_scan not in ("off", "relaxed_order", "strict_order"):
+        logging.warning(f"Unknown VECTOR_ITERATIVE_SCAN '{config.VECTOR_ITERATIVE_SCAN}', using 'relaxed_order'.")
+        iterative_scan = "relaxed_order"
+    if iterative_scan != "off":
+        options.append(f"-c {index_type}.iterative_scan={iterative_scan}")
+    return " ".join(options)
+
+
+def build_retrieval_sql() -> str:
+    """
+    Returns the prepared-statement body that fetches the top-k chunks for every
+    selected category in one round-trip. Parameters: $1 text[] categories,
+    $2 vector query embedding, $3 integer limit per category. Lower distances
+    are more similar for all supported operators. The chunk embeddings are
+    returned too, for the context builder's redundancy checks. The outer
+    ORDER BY also restores the exact distance order that a relaxed_order
+    iterative scan may not keep.
+    """
+    operator = get_distance_operator()
+    return f"""
+    SELECT c.category, d.id, d.content, d.distance, d.embedding
+    FROM unnest($1) WITH ORDINALITY AS c(category, position)
+    CROSS JOIN LATERAL (
+        SELECT id, content, embedding {operator} $2 AS distance, embedding
+        FROM data
+        WHERE data.category = c.category
+        ORDER BY distance
+        LIMIT $3
+    ) AS d
+    ORDER BY c.position, d.distance
+"""
+
+
+def _fusion_setting(name: str, default: float, allow_zero: bool) -> float:
+    """Returns a numeric RRF setting, defaulting if it is not a finite non-negative (or positive) number."""
+    value = float(getattr(config, name))
+    if math.isfinite(value) and (value > 0 or (allow_zero and value == 0)):
+        return value
+    logging.warning(f"Invalid {name} '{value}', using {default}.")
+    return default
+
+
+def build_hybrid_retrieval_sql() -> str:
+    """
+    Returns the prepared-statement body of hybrid retrieval, with the same
+    parameters and columns as build_retrieval_sql() plus $4 text (the user
+    query) and a fused score column after the embedding. Per category, the HYBRID_CANDIDATES
+    nearest chunks (ANN index) and the HYBRID_CANDIDATES best full-text
+    matches (GIN index; any query term matches) are ranked separately and
+    fused with reciprocal-rank fusion:
+        score = HYBRID_VECTOR_WEIGHT / (HYBRID_RRF_K + vector rank)
+              + HYBRID_LEXICAL_WEIGHT / (HYBRID_RRF_K + text rank)
+    A chunk found by only one list gets only that term. Rows are ordered by
+    selected category and then by score (higher is better). The vector list
+    is a category-filtered ANN scan like build_retrieval_sql()'s and relies
+    on the iterative scan from session_options() to fill all its candidates;
+    its ranks come from the window, not the scan order.
+    """
+    operator = get_distance_operator()
+    candidates = max(1, config.HYBRID_CANDIDATES)
+    # Pasted into the SQL below, so they must be finite: inf/nan would not parse
+    vector_weight = _fusion_setting("HYBRID_VECTOR_WEIGHT", 1.0, allow_zero=True)
+    lexical_weight = _fusion_setting("HYBRID_LEXICAL_WEIGHT", 1.0, allow_zero=True)
+    rrf_k = _fusion_setting("HYBRID_RRF_K", 60.0, allow_zero=False)
+    return f"""
+    SELECT c.category, f.id, f.content, f.distance, f.embedding, f.score
+    FROM unnest($1) WITH ORDINALITY AS c(category, position)
+    CROSS JOIN (
+        -- OR of the query's lexemes, each quoted: identifiers should not need every other word to match.
+        -- NULL (no lexical hits) if the query has no lexemes.
+        SELECT (
+            SELECT string_agg('''' || replace(replace(lexeme, '\\', '\\\\'), '''', '''''') || '''', ' | ')
+            FROM unnest(to_tsvector('{TEXT_SEARCH_CONFIG}', $4))
+        )::tsquery AS query
+    ) AS q
+    CROSS JOIN LATERAL (
+        WITH vector_hits AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM (
+                SELECT id, embedding {operator} $2 AS distance
+                FROM data
+                WHERE data.category = c.category
+                ORDER BY distance
+                LIMIT {candidates}
+            ) AS v
+        ), lexical_hits AS (
+            SELECT id, row_number() OVER (ORDER BY text_rank DESC, id) AS rank
+            FROM (
+                SELECT id, ts_rank_cd(content_tsv, q.query) AS text_rank
+                FROM data
+                WHERE data.category = c.category AND content_tsv @@ q.query
+                ORDER BY text_rank DESC
+                LIMIT {candidates}
+            ) AS l
+        ), fused AS (
+            SELECT id, sum(score) AS score
+            FROM (
+                SELECT id, {vector_weight!r} / ({rrf_k!r} + rank) AS score FROM vector_hits
+                UNION ALL
+                SELECT id, {lexical_weight!r} / ({rrf_k!r} + rank) FROM lexical_hits
+            ) AS s
+            GROUP BY id
+        )
+        SELECT data.id, data.content, data.embedding {operator} $2 AS distance, data.embedding, fused.score
+        FROM fused
+        JOIN data ON data.id = fused.id
+        ORDER BY fused.score DESC, distance
+        LIMIT $3
+    ) AS f
+    ORDER BY c.position, f.score DESC, f.distance
+"""
@@ -0,0 +1,7 @@
+# asgi.py
+from app import create_app
+from app.asgi_app import create_asgi_app
+
+# Flask serves the UI and metrics; POST /chat and /health run on the event loop
+flask_app = create_app()
+app = create_asgi_app(flask_app)
@@ -0,0 +1,135 @@
+# benchmarks/backend_benchmark.py
+"""
+Checks an ONNX inference backend against the fp32 torch models.
+
+Pseudo-queries are sampled from stored chunks (first N words). For the
+embedding model it reports the cosine agreement between fp32 and backend
+embeddings; for the zero-shot classifier, top-label agreement and the mean
+absolute score difference. Both report single-query latency (p50/p95) and
+batched throughput. The backend is loaded without the torch fallback, so
+the run exits non-zero if it cannot be loaded with ONNX Runtime, and also if
+the mean embedding cosine falls below --min-cosine.
+
+Run inside the app container:
+    python -m benchmarks.backend_benchmark --backend onnx-int8 --samples 200
+"""
+import time
+import argparse
+import logging
+import statistics
+
+import numpy as np
+
+from app.config import config
+from app.db import get_pool
+from app.inference_backend import BACKENDS, load_embedding_model, load_classifier
+from benchmarks.router_benchmark import _sample_queries, _percentile
+
+
+def _category_labels() -> list[str]:
+    """The router's candidate labels: every category in the data table."""
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT category FROM data ORDER BY category;")
+        return [row[0] for row in cur.fetchall() if row[0]]
+
+
+def _time_single(fn, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _report_latency(name: str, latencies: list[float], batch_seconds: float, batch_items: int) -> None:
+    print(
+        f"{name:<22} {statistics.mean(latencies):>9.2f} {_percentile(latencies, 50):>9.2f} "
+        f"{_percentile(latencies, 95):>9.2f} {batch_items / batch_seconds:>11.1f}"
+    )
+
+
+def _load_candidate(loader, model_name: str, backend: str):
+    """Loads a model with the ONNX backend, exiting instead of falling back to torch."""
+    try:
+        return loader(model_name, backend=backend, strict=True)
+    except Exception as e:
+        raise SystemExit(f"Could not load {model_name} with the {backend} backend: {e}")
+
+
+def _benchmark_embeddings(queries: list[str], backend: str, batch_size: int) -> float:
+    reference_model = load_embedding_model(config.EMBEDDING_MODEL_NAME, backend="torch")
+    candidate_model = _load_candidate(load_embedding_model, config.EMBEDDING_MODEL_NAME, backend)
+
+    reference = reference_model.encode(queries, normalize_embeddings=True, batch_size=batch_size)
+    candidate = candidate_model.encode(queries, normalize_embeddings=True, batch_size=batch_size)
+    cosines = np.sum(reference * candidate, axis=1)
+
+    print(f"\nEmbedding model {config.EMBEDDING_MODEL_NAME}")
+    print(f"Cosine(fp32, {backend}): mean {cosines.mean():.5f}, min {cosines.min():.5f}, p5 {np.percentile(cosines, 5):.5f}")
+    print(f"{'backend':<22} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'batch q/s':>11}")
+    for name, model in (("torch fp32", reference_model), (backend, candidate_model)):
+        model.encode(queries[:4], normalize_embeddings=True) # Warm-up
+        latencies = _time_single(lambda q: model.encode(q, normalize_embeddings=True), queries)
+        start = time.perf_counter()
+        model.encode(queries, normalize_embeddings=True, batch_size=batch_size)
+        _report_latency(name, latencies, time.perf_counter() - start, len(queries))
+    return float(cosines.mean())
+
+
+def _benchmark_classifier(queries: list[str], labels: list[str], backend: str) -> None:
+    reference_model = load_classifier(config.CLASSIFIER_MODEL_NAME, backend="torch")
+    candidate_model = _load_candidate(load_classifier, config.CLASSIFIER_MODEL_NAME, backend)
+
+    def scores(classifier, query: str) -> dict[str, float]:
+        result = classifier(query, labels, multi_label=True, batch_size=len(labels))
+        return dict(zip(result["labels"], result["scores"]))
+
+    reference = [scores(reference_model, query) for query in queries]
+    candidate = [scores(candidate_model, query) for query in queries]
+    top_agreement = statistics.mean(
+        max(ref, key=ref.get) == max(cand, key=cand.get) for ref, cand in zip(reference, candidate)
+    )
+    score_diff = statistics.mean(abs(ref[label] - cand[label]) for ref, cand in zip(reference, candidate) for label in labels)
+
+    print(f"\nZero-shot classifier {config.CLASSIFIER_MODEL_NAME} ({len(labels)} labels)")
+    print(f"Top label agreement {top_agreement:.1%}, mean |score difference| {score_diff:.4f}")
+    print(f"{'backend':<22} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'batch q/s':>11}")
+    for name, classifier in (("torch fp32", reference_model), (backend, candidate_model)):
+        latencies = _time_single(lambda q: scores(classifier, q), queries)
+        start = time.perf_counter()
+        classifier(queries, labels, multi_label=True, batch_size=min(64, len(queries) * len(labels)))
+        _report_latency(name, latencies, time.perf_counter() - start, len(queries))
+
+
+def run(backend: str, sample_count: int, query_words: int, batch_size: int,
+        min_cosine: float, skip_classifier: bool) -> None:
+    queries = [query for query, _ in _sample_queries(sample_count, query_words)]
+    if not queries:
+        raise SystemExit("No chunks found in the data table.")
+    print(f"Queries: {len(queries)} (first {query_words} words of random chunks), backend: {backend}")
+
+    mean_cosine = _benchmark_embeddings(queries, backend, batch_size)
+
+    if not skip_classifier:
+        labels = _category_labels()
+        if labels:
+            _benchmark_classifier(queries, labels, backend)
+        else:
+            print("\nNo categories loaded; skipping the classifier check.")
+
+    if mean_cosine < min_cosine:
+        raise SystemExit(f"Mean embedding cosine {mean_cosine:.5f} is below --min-cosine {min_cosine}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an ONNX inference backend with the fp32 torch models.")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="onnx-int8")
+    parser.add_argument("--samples", type=int, default=100, help="Number of chunks to sample as queries.")
+    parser.add_argument("--query-words", type=int, default=12, help="Words per pseudo-query.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size for the throughput run.")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Fail if the mean fp32 cosine is lower.")
+    parser.add_argument("--skip-classifier", action="store_true", help="Only check the embedding model.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args.backend, args.samples, args.query_words, args.batch_size, args.min_cosine, args.skip_classifier)
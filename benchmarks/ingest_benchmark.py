@@ -0,0 +1,96 @@
+# benchmarks/ingest_benchmark.py
+"""
+Compares the loader's two insert paths on synthetic rows.
+
+Random unit-norm float32 embeddings and lorem-style chunk texts are written
+to a scratch table with the same columns as `data`, once with
+INSERT ... VALUES (execute_values) and once with binary COPY, in batches of
+--batch-size rows. Reports rows/s for each method and the COPY speedup.
+The scratch table is dropped afterwards; `data` is not touched.
+
+Run inside the load-data container:
+    python -m benchmarks.ingest_benchmark --rows 20000 --batch-size 1000
+"""
+import time
+import argparse
+import logging
+
+import numpy as np
+
+from app.db import get_pool
+from load.database import batch_insert_to_database, copy_insert_to_database
+
+SCRATCH_TABLE = "ingest_benchmark"
+WORDS = ("retrieval", "vector", "index", "chunk", "category", "document", "query", "answer", "model", "context")
+
+
+def _make_rows(count: int, dim: int, words_per_chunk: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((count, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    word_ids = rng.integers(0, len(WORDS), size=(count, words_per_chunk))
+    return [
+        (" ".join(WORDS[i] for i in ids), embeddings[row], f"category_{row % 8}", f"/bench/file_{row // 20}.txt")
+        for row, ids in enumerate(word_ids)
+    ]
+
+
+def _recreate_table(dim: int) -> None:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE};")
+        cur.execute(
+            f"CREATE UNLOGGED TABLE {SCRATCH_TABLE} "
+            f"(id SERIAL PRIMARY KEY, content TEXT, category TEXT, embedding vector({dim}), source_path TEXT);"
+        )
+        conn.commit()
+
+
+def _drop_table() -> None:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {SCRATCH_TABLE};")
+        conn.commit()
+
+
+def _count_rows() -> int:
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {SCRATCH_TABLE};")
+        return cur.fetchone()[0]
+
+
+def _time_method(insert_fn, rows: list, batch_size: int, dim: int) -> float:
+    _recreate_table(dim)
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        if not insert_fn(rows[offset:offset + batch_size], table=SCRATCH_TABLE):
+            raise SystemExit(f"{insert_fn.__name__} failed; see the log above.")
+    seconds = time.perf_counter() - start
+    if _count_rows() != len(rows):
+        raise SystemExit(f"{insert_fn.__name__} wrote {_count_rows()} rows, expected {len(rows)}.")
+    return seconds
+
+
+def run(row_count: int, batch_size: int, dim: int, words_per_chunk: int, seed: int) -> None:
+    rows = _make_rows(row_count, dim, words_per_chunk, seed)
+    print(f"Rows: {row_count} ({dim}-dim float32, {words_per_chunk} words each), batches of {batch_size}")
+    print(f"{'method':<10} {'seconds':>9} {'rows/s':>10}")
+    try:
+        results = {}
+        for name, insert_fn in (("insert", batch_insert_to_database), ("copy", copy_insert_to_database)):
+            seconds = _time_method(insert_fn, rows, batch_size, dim)
+            results[name] = seconds
+            print(f"{name:<10} {seconds:>9.2f} {row_count / seconds:>10.0f}")
+        print(f"\nCOPY speedup: {results['insert'] / results['copy']:.1f}x")
+    finally:
+        _drop_table()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare INSERT ... VALUES and binary COPY for chunk rows.")
+    parser.add_argument("--rows", type=int, default=20000, help="Number of synthetic rows.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per insert/COPY transaction.")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension.")
+    parser.add_argument("--words", type=int, default=150, help="Words per synthetic chunk.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args.rows, args.batch_size, args.dim, args.words, args.seed)
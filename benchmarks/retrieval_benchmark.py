@@ -0,0 +1,162 @@
+# benchmarks/retrieval_benchmark.py
+"""
+Compares vector-only and hybrid (full-text + vector, RRF-fused) retrieval.
+
+Queries are sampled from stored chunks, so the chunk itself is the expected
+hit. Two query kinds are used: the first N words of the chunk (a paraphrase
+stand-in) and a few of its most identifier-like words (tokens with digits or
+capitals, else the longest ones), which is where vector search alone tends
+to miss. Both prepared statements are run against the chunk's category, in
+alternating order, with the embedding computed up front; only the database
+round-trip is timed.
+
+Reports mean/p50/p95 latency per mode, the latency hybrid adds, and how
+often the source chunk is in the top 5 for each mode and query kind. Also
+reports how many vector candidates (of HYBRID_CANDIDATES) the filtered ANN
+scan returns per category, and which categories get fewer than they hold,
+so recall lost to the category filter shows up. Exits with status 1 if the
+added p95 latency exceeds --max-added-ms.
+
+Run inside the app container (after the loader has added data.content_tsv):
+    python -m benchmarks.retrieval_benchmark --samples 200
+"""
+import re
+import time
+import argparse
+import logging
+import statistics
+
+from app import ml_models
+from app.config import config
+from app.db import get_pool
+from app.rag_core import (
+    QueryContext,
+    RETRIEVAL_STATEMENT_NAME,
+    RETRIEVAL_STATEMENT_SQL,
+    HYBRID_RETRIEVAL_STATEMENT_NAME,
+    HYBRID_RETRIEVAL_STATEMENT_SQL,
+)
+
+MODES = ("vector", "hybrid")
+QUERY_KINDS = ("prefix", "terms")
+TOP_K = 5
+
+
+def _sample_chunks(sample_count: int) -> list[tuple[int, str, str]]:
+    """Returns (id, content, category) of random stored chunks."""
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, content, category FROM data WHERE content <> '' ORDER BY random() LIMIT %s;", (sample_count,))
+        return cur.fetchall()
+
+
+def _term_query(content: str, term_count: int) -> str:
+    """The chunk's most identifier-like words: with digits or capitals first, then the longest."""
+    words = list(dict.fromkeys(re.findall(r"\w[\w.\-/]*\w|\w", content)))
+    identifiers = [w for w in words if any(ch.isdigit() for ch in w) or sum(ch.isupper() for ch in w) > 1]
+    rest = sorted((w for w in words if w not in identifiers), key=len, reverse=True)
+    return " ".join((identifiers + rest)[:term_count])
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _retrieve(cur, mode: str, category: str, embedding: list, query: str) -> list[int]:
+    pool = get_pool()
+    if mode == "hybrid":
+        pool.execute_prepared(cur, HYBRID_RETRIEVAL_STATEMENT_NAME, ([category], embedding, TOP_K, query),
+                              param_casts=("::text[]", "::vector", "", ""))
+    else:
+        pool.execute_prepared(cur, RETRIEVAL_STATEMENT_NAME, ([category], embedding, TOP_K),
+                              param_casts=("::text[]", "::vector", ""))
+    return [row[1] for row in cur.fetchall()]
+
+
+def _count_vector_candidates(cur, category: str, embedding: list, limit: int) -> int:
+    """Rows the filtered ANN scan returns for a category, as for hybrid's vector candidates."""
+    get_pool().execute_prepared(cur, RETRIEVAL_STATEMENT_NAME, ([category], embedding, limit),
+                                param_casts=("::text[]", "::vector", ""))
+    return len(cur.fetchall())
+
+
+def _report_candidates(candidates: dict[str, list[int]], sizes: dict[str, int], limit: int) -> None:
+    counts = [count for values in candidates.values() for count in values]
+    print(f"Vector candidates per query (limit {limit}): min {min(counts)}, mean {statistics.mean(counts):.1f} "
+          f"over {len(candidates)} categories")
+    short = []
+    for category, values in candidates.items():
+        expected = min(limit, sizes.get(category, 0))
+        if min(values) < expected:
+            short.append((min(values) / expected, category, min(values), expected))
+    if not short:
+        print("Every category returned all the candidates it holds.")
+        return
+    print(f"Categories returning fewer candidates than they hold: {len(short)}")
+    for _, category, returned, expected in sorted(short)[:10]:
+        print(f"  {category}: {returned}/{expected}")
+
+
+def run(sample_count: int, query_words: int, term_count: int, max_added_ms: float) -> None:
+    ml_models.initialize_models()
+    if ml_models.get_embedding_model() is None:
+        raise SystemExit("The embedding model failed to load.")
+    chunks = _sample_chunks(sample_count)
+    if not chunks:
+        raise SystemExit("No chunks found in the data table.")
+
+    pool = get_pool()
+    pool.register_prepared_statement(RETRIEVAL_STATEMENT_NAME, ("text[]", "vector", "integer"), RETRIEVAL_STATEMENT_SQL)
+    pool.register_prepared_statement(
+        HYBRID_RETRIEVAL_STATEMENT_NAME, ("text[]", "vector", "integer", "text"), HYBRID_RETRIEVAL_STATEMENT_SQL
+    )
+
+    latencies = {mode: [] for mode in MODES}
+    hits = {(mode, kind): 0 for mode in MODES for kind in QUERY_KINDS}
+    candidate_limit = max(1, config.HYBRID_CANDIDATES)
+    candidates: dict[str, list[int]] = {}
+    rounds = 0
+    with pool.connection() as conn, conn.cursor() as cur:
+        for chunk_id, content, category in chunks:
+            queries = {"prefix": " ".join(content.split()[:query_words]), "terms": _term_query(content, term_count)}
+            for kind, query in queries.items():
+                embedding = QueryContext(query).embedding.tolist()
+                modes = MODES if rounds % 2 == 0 else MODES[::-1] # Alternate the order to even out cache effects
+                rounds += 1
+                for mode in modes:
+                    start = time.perf_counter()
+                    ids = _retrieve(cur, mode, category, embedding, query)
+                    latencies[mode].append((time.perf_counter() - start) * 1000)
+                    hits[(mode, kind)] += chunk_id in ids
+                candidates.setdefault(category, []).append(
+                    _count_vector_candidates(cur, category, embedding, candidate_limit)
+                )
+        cur.execute("SELECT category, count(*) FROM data WHERE category = ANY(%s) GROUP BY category;", (list(candidates),))
+        sizes = dict(cur.fetchall())
+        conn.rollback()
+
+    print(f"Queries: {len(chunks)} chunks x {len(QUERY_KINDS)} kinds (first {query_words} words; {term_count} identifier-like words)")
+    print(f"{'mode':<8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} " + " ".join(f"{'hit@5 ' + kind:>13}" for kind in QUERY_KINDS))
+    for mode in MODES:
+        rates = " ".join(f"{hits[(mode, kind)] / len(chunks):>13.1%}" for kind in QUERY_KINDS)
+        print(
+            f"{mode:<8} {statistics.mean(latencies[mode]):>9.2f} {_percentile(latencies[mode], 50):>9.2f} "
+            f"{_percentile(latencies[mode], 95):>9.2f} {rates}"
+        )
+    added_mean = statistics.mean(latencies["hybrid"]) - statistics.mean(latencies["vector"])
+    added_p95 = _percentile(latencies["hybrid"], 95) - _percentile(latencies["vector"], 95)
+    print(f"Added by hybrid: {added_mean:.2f} ms mean, {added_p95:.2f} ms p95 (limit {max_added_ms:g} ms)")
+    _report_candidates(candidates, sizes, candidate_limit)
+    if added_p95 > max_added_ms:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vector-only vs hybrid (full-text + vector) retrieval.")
+    parser.add_argument("--samples", type=int, default=200, help="Number of chunks to sample as queries.")
+    parser.add_argument("--query-words", type=int, default=12, help="Words per prefix query.")
+    parser.add_argument("--terms", type=int, default=3, help="Words per identifier-like query.")
+    parser.add_argument("--max-added-ms", type=float, default=10.0, help="Fail if hybrid adds more p95 latency than this.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args.samples, args.query_words, args.terms, args.max_added_ms)
@@ -0,0 +1,85 @@
+# benchmarks/router_benchmark.py
+"""
+Compares the 'hybrid' (zero-shot) and 'centroid' category routers.
+
+Pseudo-queries are sampled from stored chunks (first N words), so the chunk's
+own category serves as ground truth. Reports per-query routing latency for
+each router, agreement between the selected category sets, and how often
+each router selects the source category.
+
+Run inside the app container:
+    python -m benchmarks.router_benchmark --samples 200
+"""
+import time
+import argparse
+import logging
+import statistics
+
+from app import ml_models
+from app.db import get_pool
+from app.rag_core import QueryContext, select_categories, clear_query_caches
+
+ROUTERS = ("hybrid", "centroid")
+
+
+def _sample_queries(sample_count: int, query_words: int) -> list[tuple[str, str]]:
+    """Returns (pseudo_query, source_category) pairs sampled from the data table."""
+    with get_pool().connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT content, category FROM data ORDER BY random() LIMIT %s;", (sample_count,))
+        rows = cur.fetchall()
+    return [(" ".join(content.split()[:query_words]), category) for content, category in rows if content]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(sample_count: int, query_words: int) -> None:
+    ml_models.initialize_models()
+    if not ml_models.are_models_ready() or ml_models.get_classifier() is None:
+        raise SystemExit("Models failed to load (the hybrid router needs the zero-shot classifier).")
+    if ml_models.get_category_centroids()[1] is None:
+        ml_models.load_category_centroids()
+    if ml_models.get_category_centroids()[1] is None:
+        raise SystemExit("No category centroids available; load the data table first.")
+
+    queries = _sample_queries(sample_count, query_words)
+    if not queries:
+        raise SystemExit("No chunks found in the data table.")
+
+    latencies = {router: [] for router in ROUTERS}
+    selections = {router: [] for router in ROUTERS}
+    for query, _ in queries:
+        context = QueryContext(query)
+        _ = context.embedding # Embed once up front; only routing is timed
+        for router in ROUTERS:
+            clear_query_caches() # Bypass cached router scores
+            start = time.perf_counter()
+            selected = select_categories(query, context, router=router)
+            latencies[router].append((time.perf_counter() - start) * 1000)
+            selections[router].append(set(selected))
+
+    print(f"Queries: {len(queries)} (first {query_words} words of random chunks)")
+    print(f"{'router':<10} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'source hit':>11}")
+    for router in ROUTERS:
+        hits = sum(category in selected for (_, category), selected in zip(queries, selections[router]))
+        print(
+            f"{router:<10} {statistics.mean(latencies[router]):>9.2f} {_percentile(latencies[router], 50):>9.2f} "
+            f"{_percentile(latencies[router], 95):>9.2f} {hits / len(queries):>10.1%}"
+        )
+
+    exact = sum(a == b for a, b in zip(selections["hybrid"], selections["centroid"]))
+    jaccard = [len(a & b) / len(a | b) if (a | b) else 1.0 for a, b in zip(selections["hybrid"], selections["centroid"])]
+    print(f"Agreement: identical selections {exact / len(queries):.1%}, mean Jaccard {statistics.mean(jaccard):.3f}")
+    speedup = statistics.mean(latencies["hybrid"]) / max(statistics.mean(latencies["centroid"]), 1e-9)
+    print(f"Centroid router speedup: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hybrid vs centroid category routing.")
+    parser.add_argument("--samples", type=int, default=100, help="Number of chunks to sample as queries.")
+    parser.add_argument("--query-words", type=int, default=12, help="Words per pseudo-query.")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    run(args.samples, args.query_words)
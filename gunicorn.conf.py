@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+# Gunicorn settings for the RAG app (loaded automatically from the working directory).
+#
+# Models are loaded ONCE in the master process (preload_app) and shared with the
+# forked workers copy-on-write. To keep the shared pages shared:
+#   * torch is limited to one thread in the master, so no OpenMP thread pool
+#     exists at fork time; each worker then sets its own intra-op thread count.
+#   * gc.freeze() moves every object created during preload into the permanent
+#     generation, so the cyclic GC never writes to (and thereby copies) them.
+#   * the master's DB pool is closed before forking; workers open their own.
+import gc
+import os
+import logging
+import multiprocessing
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# Async workers for asgi:app (slow Ollama calls only hold a coroutine).
+# Use GUNICORN_WORKER_CLASS=sync to serve the plain Flask app (wsgi:app) instead.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+# Adjust the timeout based on Ollama's response time (e.g., 120 seconds)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+# 0 = one worker per two cores
+workers = int(os.getenv("GUNICORN_WORKERS", "0")) or max(1, cpu_count // 2)
+# Intra-op torch threads per worker; 0 = split the cores evenly between workers
+torch_threads_per_worker = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, cpu_count // workers)
+
+# Avoid the HuggingFace tokenizers fork warning/deadlock; workers tokenize single queries
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+if preload_app:
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def when_ready(server):
+    """Runs in the master after the app was preloaded, before workers are forked."""
+    if not preload_app:
+        return
+    try:
+        from app.db import close_pool
+        close_pool() # Workers must not share the master's sockets
+    except Exception as e:
+        server.log.warning(f"Could not close the master DB pool: {e}")
+    gc.collect()
+    gc.freeze()
+    server.log.info(
+        f"Preloaded models frozen for copy-on-write sharing; starting {workers} workers "
+        f"with {torch_threads_per_worker} torch threads each."
+    )
+
+
+def post_fork(server, worker):
+    """Runs in each worker right after fork."""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads_per_worker)
+    except ImportError:
+        pass
+    except RuntimeError as e:
+        logging.warning(f"Could not set torch threads in worker {worker.pid}: {e}")
+    server.log.info(f"Worker {worker.pid} using {torch_threads_per_worker} torch threads.")
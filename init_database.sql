@@ -4,12 +4,41 @@ CREATE TABLE data (
     id SERIAL PRIMARY KEY,
     content TEXT,
     category TEXT,
-    embedding vector(768)  -- 768-dimensional embedding (MPNet-compatible)
+    embedding vector(768),  -- 768-dimensional embedding (MPNet-compatible)
+    source_path TEXT,       -- File the chunk came from (see source_file)
+    -- Full-text search vector for hybrid retrieval; 'simple' keeps identifiers and names as-is
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
 );
 
--- Optional: Create ivfflat index for vector search (faster queries after ANALYZE)
-CREATE INDEX data_embedding_idx ON data USING ivfflat (embedding vector_cosine_ops);
+CREATE INDEX data_source_path_idx ON data (source_path);
+CREATE INDEX data_content_tsv_idx ON data USING gin (content_tsv);
+
+-- Manifest of ingested files, used by the loader's incremental sync (LOAD_MODE=sync)
+CREATE TABLE source_file (
+    path TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    mtime DOUBLE PRECISION NOT NULL,
+    content_hash TEXT NOT NULL,                 -- SHA-256 of the file contents
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    term_counts JSONB NOT NULL DEFAULT '{}',    -- Per-file term counts for the category keywords
+    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Per-category profile written by the loader and read by the app at startup
+CREATE TABLE category_profile (
+    category TEXT PRIMARY KEY,
+    keywords TEXT[] NOT NULL DEFAULT '{}',   -- Discriminative TF-IDF keywords
+    file_count INTEGER NOT NULL DEFAULT 0,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    centroid vector(768),                    -- Mean chunk embedding
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- The ANN index (data_embedding_idx) is built by the loader after the data is
+-- inserted (load/database.update_database_index), using VECTOR_INDEX_TYPE and
+-- VECTOR_DISTANCE_METRIC so the index opclass always matches the query operator.
+-- Building an IVFFlat index here on an empty table would train it on no data.
 
 -- Analyze for performance
 ANALYZE data;
-
@@ -1,13 +1,20 @@
 # load/database.py
+import io
+import json
+import time
+import struct
 import logging
 import psycopg2
-from psycopg2.extras import execute_values
-from typing import List, Optional, Tuple
+import psycopg2.errors
+from psycopg2.extras import Json, execute_values
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 
 # Import config from the main app package
 try:
     from app.config import config
+    from app.db import get_pool, get_pool_stats, close_pool
+    from app import vector_index
 except ImportError:
     # Fallback
     import os
@@ -17,24 +24,35 @@ except ImportError:
         DB_USER = os.getenv("DB_USER")
         DB_PASSWORD = os.getenv("DB_PASSWORD")
     config = TempConfig()
+    get_pool = None # No shared pool available; fall back to direct connections
+    vector_index = None # No shared index strategy; fall back to a default IVFFlat inner-product index
     logging.warning("Could not import app.config, using fallback for DB credentials.")
 
 # Configure basic logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Full-text search column for hybrid retrieval, computed by PostgreSQL on every insert/COPY
+TEXT_SEARCH_CONFIG = vector_index.TEXT_SEARCH_CONFIG if vector_index is not None else "simple"
+CONTENT_TSV_COLUMN_SQL = (
+    f"content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(content, ''))) STORED"
+)
+
 
 def _get_db_connection():
-    """Establishes and returns a database connection."""
+    """Checks out a database connection from the shared pool (or opens one directly)."""
     conn = None
     try:
-        logging.debug(f"Connecting to DB: Host={config.DB_HOST}, DB={config.DB_NAME}")
-        conn = psycopg2.connect(
-            host=config.DB_HOST,
-            database=config.DB_NAME,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD,
-            connect_timeout=10 # Add a connection timeout
-        )
+        if get_pool is not None:
+            conn = get_pool().getconn()
+        else:
+            logging.debug(f"Connecting to DB: Host={config.DB_HOST}, DB={config.DB_NAME}")
+            conn = psycopg2.connect(
+                host=config.DB_HOST,
+                database=config.DB_NAME,
+                user=config.DB_USER,
+                password=config.DB_PASSWORD,
+                connect_timeout=10 # Add a connection timeout
+            )
         logging.debug("DB connection successful.")
         return conn
     except psycopg2.OperationalError as e:
@@ -45,8 +63,16 @@ def _get_db_connection():
         return None
 
 
+def _release_db_connection(conn) -> None:
+    """Returns a connection to the shared pool (or closes it if unpooled)."""
+    if get_pool is not None:
+        get_pool().putconn(conn)
+    else:
+        conn.close()
+
+
 def reset_database():
-    """Truncates the data table and resets its identity sequence."""
+    """Truncates the data table (resetting its identity sequence) and the source file manifest."""
     conn = _get_db_connection()
     if not conn:
         logging.error("Cannot reset database: No connection.")
@@ -60,8 +86,9 @@ def reset_database():
             # logging.debug("Ensuring embedding column type is vector(768)...")
             # cur.execute("ALTER TABLE data ALTER COLUMN embedding TYPE vector(768);")
             cur.execute("TRUNCATE TABLE data RESTART IDENTITY;")
+            cur.execute("TRUNCATE TABLE source_file;")
             conn.commit()
-            logging.info("Database table 'data' has been reset successfully.")
+            logging.info("Database tables 'data' and 'source_file' have been reset successfully.")
             return True
     except Exception as e:
         logging.exception(f"Database reset failed: {e}")
@@ -69,17 +96,293 @@ def reset_database():
         return False
     finally:
         if conn:
-            conn.close()
-            logging.debug("DB connection closed after reset.")
+            _release_db_connection(conn)
+            logging.debug("DB connection released after reset.")
+
+
+def ensure_sync_schema() -> bool:
+    """
+    Creates the source file manifest and the data.source_path column used by
+    the incremental sync, and the full-text column data.content_tsv with its
+    GIN index used by hybrid retrieval. All are also in init_database.sql;
+    this covers databases initialized earlier (adding content_tsv rewrites
+    the table once).
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot prepare the sync schema: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE data ADD COLUMN IF NOT EXISTS source_path TEXT;")
+            cur.execute("CREATE INDEX IF NOT EXISTS data_source_path_idx ON data (source_path);")
+            cur.execute(
+                "SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+                "AND table_name = 'data' AND column_name = 'content_tsv';"
+            )
+            if cur.fetchone() is None:
+                logging.info("Adding the full-text search column data.content_tsv (computed for every stored chunk)...")
+                cur.execute(f"ALTER TABLE data ADD COLUMN {CONTENT_TSV_COLUMN_SQL};")
+            cur.execute("CREATE INDEX IF NOT EXISTS data_content_tsv_idx ON data USING gin (content_tsv);")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS source_file (
+                    path TEXT PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    size BIGINT NOT NULL,
+                    mtime DOUBLE PRECISION NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    term_counts JSONB NOT NULL DEFAULT '{}',
+                    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+            """)
+            conn.commit()
+            return True
+    except Exception as e:
+        logging.exception(f"Preparing the sync schema failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def load_manifest(table: str = "source_file") -> Optional[Dict[str, dict]]:
+    """Returns the source file manifest as {path: {category, size, mtime, content_hash}}, or None on error."""
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot load the source file manifest: No database connection.")
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT path, category, size, mtime, content_hash FROM {table};")
+            return {
+                path: {"category": category, "size": size, "mtime": mtime, "content_hash": content_hash}
+                for path, category, size, mtime, content_hash in cur.fetchall()
+            }
+    except Exception as e:
+        logging.exception(f"Loading the source file manifest failed: {e}")
+        conn.rollback()
+        return None
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def delete_source_files(paths: List[str], forget: List[str],
+                        data_table: str = "data", manifest_table: str = "source_file") -> Optional[int]:
+    """
+    Deletes the chunks of the given source files, plus chunks without a
+    source path (loaded before the manifest existed), and removes the
+    `forget` paths from the manifest, in one transaction.
+
+    Returns:
+        The number of deleted chunks, or None on error.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot delete chunks: No database connection.")
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {data_table} WHERE source_path = ANY(%s) OR source_path IS NULL;", (list(paths),))
+            deleted = cur.rowcount
+            if forget:
+                cur.execute(f"DELETE FROM {manifest_table} WHERE path = ANY(%s);", (list(forget),))
+        conn.commit()
+        logging.info(f"Deleted {deleted} chunks of {len(paths)} changed/removed files.")
+        return deleted
+    except Exception as e:
+        logging.exception(f"Deleting chunks failed: {e}")
+        conn.rollback()
+        return None
+    finally:
+        if conn:
+            _release_db_connection(conn)
 
 
-def batch_insert_to_database(data_to_insert: List[Tuple[str, np.ndarray, str]]):
+def save_manifest(entries: List[dict], table: str = "source_file") -> bool:
     """
-    Inserts a batch of content, embeddings, and categories into the database.
+    Upserts manifest entries (dicts with path, category, size, mtime,
+    content_hash, chunk_count and term_counts) for synced files.
+    """
+    if not entries:
+        return True
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot save the source file manifest: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            values = (
+                (entry["path"], entry["category"], entry["size"], entry["mtime"], entry["content_hash"],
+                 entry["chunk_count"], Json(entry["term_counts"]))
+                for entry in entries
+            )
+            execute_values(
+                cur,
+                f"""
+                INSERT INTO {table} (path, category, size, mtime, content_hash, chunk_count, term_counts)
+                VALUES %s
+                ON CONFLICT (path) DO UPDATE SET
+                    category = EXCLUDED.category, size = EXCLUDED.size, mtime = EXCLUDED.mtime,
+                    content_hash = EXCLUDED.content_hash, chunk_count = EXCLUDED.chunk_count,
+                    term_counts = EXCLUDED.term_counts, synced_at = now()
+                """,
+                values,
+                page_size=100,
+            )
+        conn.commit()
+        logging.info(f"Saved {len(entries)} source file manifest entries.")
+        return True
+    except Exception as e:
+        logging.exception(f"Saving the source file manifest failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def touch_manifest(entries: List[dict], table: str = "source_file") -> bool:
+    """Updates size/mtime of files whose stat changed but whose content hash did not."""
+    if not entries:
+        return True
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot update the source file manifest: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                f"UPDATE {table} SET size = v.size, mtime = v.mtime "
+                f"FROM (VALUES %s) AS v (path, size, mtime) WHERE {table}.path = v.path",
+                [(entry["path"], entry["size"], entry["mtime"]) for entry in entries],
+                template="(%s, %s::bigint, %s::double precision)",
+            )
+        conn.commit()
+        return True
+    except Exception as e:
+        logging.exception(f"Updating the source file manifest failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def load_stored_category_stats() -> Optional[List[dict]]:
+    """
+    Aggregates what the category profiles need from the stored corpus, so
+    they can be rebuilt after an incremental sync without re-reading files:
+    per category the chunk count and mean embedding (from data) and the
+    file count and summed term counts (from the manifest).
+
+    Returns:
+        Dicts with category, chunk_count, centroid (np.ndarray or None),
+        file_count and term_counts, or None on error.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot load category statistics: No database connection.")
+        return None
+    try:
+        stats: Dict[str, dict] = {}
+
+        def entry(category: str) -> dict:
+            return stats.setdefault(category, {
+                "category": category, "chunk_count": 0, "centroid": None, "file_count": 0, "term_counts": {},
+            })
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT category, count(*), avg(embedding)::text FROM data GROUP BY category;")
+            for category, chunk_count, centroid in cur.fetchall():
+                entry(category)["chunk_count"] = chunk_count
+                if centroid:
+                    entry(category)["centroid"] = np.array(json.loads(centroid), dtype=np.float32)
+            cur.execute("SELECT category, count(*) FROM source_file WHERE chunk_count > 0 GROUP BY category;")
+            for category, file_count in cur.fetchall():
+                entry(category)["file_count"] = file_count
+            cur.execute("""
+                SELECT category, term, sum(count::bigint)
+                FROM source_file, jsonb_each_text(term_counts) AS t (term, count)
+                WHERE chunk_count > 0
+                GROUP BY category, term;
+            """)
+            for category, term, count in cur.fetchall():
+                entry(category)["term_counts"][term] = int(count)
+        conn.rollback()
+        return [stats[category] for category in sorted(stats) if category]
+    except Exception as e:
+        logging.exception(f"Loading category statistics failed: {e}")
+        conn.rollback()
+        return None
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def get_index_status() -> Optional[Tuple[int, bool]]:
+    """Returns (row count of data, whether the ANN index exists), or None on error."""
+    index_name = vector_index.INDEX_NAME if vector_index is not None else "data_embedding_idx"
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot check the index: No database connection.")
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*), to_regclass(%s) IS NOT NULL FROM data;", (index_name,))
+            row_count, has_index = cur.fetchone()
+        conn.rollback()
+        return row_count, has_index
+    except Exception as e:
+        logging.exception(f"Checking the index failed: {e}")
+        conn.rollback()
+        return None
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def analyze_database() -> bool:
+    """Refreshes planner statistics of the data table (after small incremental changes)."""
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot analyze: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE data;")
+        conn.commit()
+        return True
+    except Exception as e:
+        logging.exception(f"ANALYZE failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def _vector_literal(embedding) -> str:
+    """Formats an embedding as a pgvector text literal, e.g. '[0.1,0.2]'."""
+    return "[" + ",".join(map(str, np.asarray(embedding, dtype=np.float32).tolist())) + "]"
+
+
+Row = Tuple[str, np.ndarray, str, str] # (content, embedding, category, source_path)
+
+
+def batch_insert_to_database(data_to_insert: List[Row], table: str = "data"):
+    """
+    Inserts a batch of content, embeddings, categories and source file paths into the database.
+
+    Rows are converted lazily, one execute_values page at a time, so no
+    second full copy of the batch (as Python float lists) is built.
 
     Args:
         data_to_insert: A list of tuples, where each tuple is
-                        (content: str, embedding: np.ndarray, category: str).
+                        (content: str, embedding: np.ndarray, category: str, source_path: str).
     """
     if not data_to_insert:
         logging.warning("No data provided for batch insert.")
@@ -90,21 +393,17 @@ def batch_insert_to_database(data_to_insert: List[Tuple[str, np.ndarray, str]]):
         logging.error("Cannot insert data: No database connection.")
         return False
 
-    inserted_count = 0
     try:
         with conn.cursor() as cur:
-            insert_query = "INSERT INTO data (content, embedding, category) VALUES %s"
-            # Convert numpy arrays to lists for psycopg2
-            values = [
-                (content, embedding.tolist(), category)
-                for content, embedding, category in data_to_insert
-            ]
-            logging.info(f"Attempting to insert {len(values)} records...")
-            execute_values(cur, insert_query, values, page_size=100) # Use page_size for large batches
-            inserted_count = cur.rowcount # Might not be accurate for execute_values depending on version/setup
-            if inserted_count <= 0: inserted_count=len(values) # Assume all inserted if no error
+            insert_query = f"INSERT INTO {table} (content, embedding, category, source_path) VALUES %s"
+            values = (
+                (content, _vector_literal(embedding), category, source_path)
+                for content, embedding, category, source_path in data_to_insert
+            )
+            logging.info(f"Attempting to insert {len(data_to_insert)} records...")
+            execute_values(cur, insert_query, values, template="(%s, %s::vector, %s, %s)", page_size=100)
             conn.commit()
-            logging.info(f"Successfully inserted {inserted_count} records into the database.")
+            logging.info(f"Successfully inserted {len(data_to_insert)} records into the database.")
             return True
     except Exception as e:
         logging.exception(f"Database batch insert failed: {e}")
@@ -112,33 +411,480 @@ def batch_insert_to_database(data_to_insert: List[Tuple[str, np.ndarray, str]]):
         return False
     finally:
         if conn:
-            conn.close()
-            logging.debug("DB connection closed after batch insert.")
+            _release_db_connection(conn)
+            logging.debug("DB connection released after batch insert.")
+
+
+# PostgreSQL binary COPY framing (see the COPY docs, "Binary Format")
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0) # Signature, flags, header extension
+_COPY_TRAILER = struct.pack("!h", -1)
+_INT16 = struct.Struct("!h")
+_INT32 = struct.Struct("!i")
+
+
+def _copy_text_field(buffer: io.BytesIO, value: Optional[str]) -> None:
+    if value is None:
+        buffer.write(_INT32.pack(-1)) # NULL
+        return
+    encoded = value.encode("utf-8")
+    buffer.write(_INT32.pack(len(encoded)))
+    buffer.write(encoded)
+
+
+def _copy_binary_payload(data_to_insert: List[Row]) -> io.BytesIO:
+    """
+    Encodes rows as a binary COPY stream for (content, embedding, category, source_path).
+    Embeddings are written in pgvector's binary format (int16 dim, int16
+    unused, dim big-endian float4) straight from one contiguous array, so
+    no per-element Python floats are created.
+    """
+    matrix = np.ascontiguousarray(np.stack([row[1] for row in data_to_insert]), dtype=">f4")
+    dim = matrix.shape[1]
+    vector_header = _INT32.pack(4 + 4 * dim) + struct.pack("!hh", dim, 0)
+    vectors = memoryview(matrix).cast("B")
+    row_bytes = 4 * dim
+
+    buffer = io.BytesIO()
+    buffer.write(_COPY_SIGNATURE)
+    field_count = _INT16.pack(4)
+    for i, (content, _, category, source_path) in enumerate(data_to_insert):
+        buffer.write(field_count)
+        _copy_text_field(buffer, content)
+        buffer.write(vector_header)
+        buffer.write(vectors[i * row_bytes:(i + 1) * row_bytes])
+        _copy_text_field(buffer, category)
+        _copy_text_field(buffer, source_path)
+    buffer.write(_COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_insert_to_database(data_to_insert: List[Row], table: str = "data") -> bool:
+    """
+    Bulk-loads (content, embedding, category, source_path) rows with a binary COPY.
+    Same contract as batch_insert_to_database, several times faster.
+    """
+    if not data_to_insert:
+        logging.warning("No data provided for COPY insert.")
+        return False
+
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot insert data: No database connection.")
+        return False
+
+    try:
+        payload = _copy_binary_payload(data_to_insert)
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table} (content, embedding, category, source_path) FROM STDIN WITH (FORMAT binary)", payload)
+        conn.commit()
+        logging.info(f"Copied {len(data_to_insert)} records into '{table}' ({payload.getbuffer().nbytes / 1024 / 1024:.1f} MiB).")
+        return True
+    except Exception as e:
+        logging.exception(f"Database COPY insert failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        _release_db_connection(conn)
+
+
+def insert_rows(data_to_insert: List[Row], table: str = "data") -> bool:
+    """Inserts rows with the configured LOAD_INSERT_METHOD ('copy' or 'insert')."""
+    if getattr(config, "LOAD_INSERT_METHOD", "copy").lower() == "insert":
+        return batch_insert_to_database(data_to_insert, table)
+    return copy_insert_to_database(data_to_insert, table)
 
 
-def update_database_index():
-    """Drops and recreates the IVFFlat index on the embedding column."""
+GENERATION_TABLES = ("data", "source_file") # Swapped together on a full reload
+SHADOW_SUFFIX = "_shadow"
+PREVIOUS_SUFFIX = "_previous"
+
+
+def _set_index_build_options(cur) -> None:
+    """Session settings for ANN index builds: more memory (HNSW builds are much faster when the graph fits) and parallel workers."""
+    cur.execute("SET maintenance_work_mem = %s;", (getattr(config, "LOAD_INDEX_MAINTENANCE_WORK_MEM", "1GB"),))
+    parallel_workers = getattr(config, "LOAD_INDEX_PARALLEL_WORKERS", 0)
+    if parallel_workers > 0:
+        cur.execute("SET max_parallel_maintenance_workers = %s;", (parallel_workers,))
+
+
+def _reset_index_build_options(cur) -> None:
+    cur.execute("RESET maintenance_work_mem;")
+    cur.execute("RESET max_parallel_maintenance_workers;")
+
+
+def _run_with_lock_retry(conn, statements_fn, what: str) -> None:
+    """
+    Runs statements_fn(cur) in one transaction with a short lock_timeout,
+    retrying while it cannot get its locks, so a DDL statement never queues
+    chat queries behind it for longer than the timeout.
+    """
+    lock_timeout_ms = getattr(config, "LOAD_SWAP_LOCK_TIMEOUT_MS", 2000)
+    attempts = max(1, getattr(config, "LOAD_SWAP_RETRIES", 10))
+    for attempt in range(1, attempts + 1):
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)};")
+                statements_fn(cur)
+            conn.commit()
+            return
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == attempts:
+                raise
+            logging.warning(f"{what}: table is busy (attempt {attempt}/{attempts}), retrying...")
+            time.sleep(min(5.0, 0.2 * attempt))
+
+
+def update_database_index(table: str = "data", concurrently: bool = True) -> bool:
+    """
+    Builds a fresh ANN index on the embedding column of `table` with the
+    configured strategy and swaps it in for the current one.
+
+    With concurrently=True (the live table) the new index is built with
+    CREATE INDEX CONCURRENTLY next to the old one, which keeps serving
+    queries, and the two are swapped by renaming in one short transaction;
+    the old index is then dropped concurrently. Shadow tables that no query
+    reads are indexed with a plain (faster) CREATE INDEX.
+    """
+    index_name = vector_index.INDEX_NAME if vector_index is not None and table == "data" else f"{table}_embedding_idx"
+    new_index, old_index = f"{index_name}_new", f"{index_name}_old"
     conn = _get_db_connection()
     if not conn:
         logging.error("Cannot update index: No database connection.")
         return False
+    try:
+        conn.autocommit = True # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {table};")
+            row_count = cur.fetchone()[0]
+            if vector_index is not None:
+                create_index_sql = vector_index.build_index_sql(row_count, table, new_index, concurrently)
+            else:
+                create = "CREATE INDEX CONCURRENTLY" if concurrently else "CREATE INDEX"
+                create_index_sql = f"{create} {new_index} ON {table} USING ivfflat (embedding vector_ip_ops);"
+            logging.info(f"Building ANN index for {row_count} rows of '{table}': {create_index_sql}")
+            _set_index_build_options(cur)
+            cur.execute(f"DROP INDEX IF EXISTS {new_index};") # Left over (possibly invalid) from an interrupted build
+            build_start = time.perf_counter()
+            cur.execute(create_index_sql)
+            logging.info(f"Index built in {time.perf_counter() - build_start:.1f} s. Swapping it in...")
+        conn.autocommit = False
+
+        def swap(cur) -> None:
+            cur.execute(f"ALTER INDEX IF EXISTS {index_name} RENAME TO {old_index};")
+            cur.execute(f"ALTER INDEX {new_index} RENAME TO {index_name};")
+        _run_with_lock_retry(conn, swap, "Index swap")
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {old_index};")
+            cur.execute(f"ANALYZE {table};") # Important for query planner performance
+            _reset_index_build_options(cur)
+        logging.info(f"Database index '{index_name}' updated and table '{table}' analyzed successfully.")
+        return True
+    except Exception as e:
+        logging.exception(f"Database index update failed: {e}")
+        if not conn.autocommit:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.autocommit = False
+            _release_db_connection(conn)
+            logging.debug("DB connection released after index update.")
+
+
+def build_text_search_index(table: str) -> bool:
+    """
+    Builds the GIN index on content_tsv of a freshly loaded shadow table in
+    one pass (faster than maintaining it row by row during the load). The
+    live table's index is kept up to date by PostgreSQL on insert.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot build the full-text index: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            _set_index_build_options(cur)
+            build_start = time.perf_counter()
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_content_tsv_idx ON {table} USING gin (content_tsv);")
+            _reset_index_build_options(cur)
+        conn.commit()
+        logging.info(f"Full-text index on '{table}' built in {time.perf_counter() - build_start:.1f} s.")
+        return True
+    except Exception as e:
+        logging.exception(f"Building the full-text index on '{table}' failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def prepare_shadow_tables() -> bool:
+    """
+    (Re)creates empty shadow copies of the data and manifest tables for a
+    full reload. data_shadow shares data's id sequence, so ids keep growing
+    across generations.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot create shadow tables: No database connection.")
+        return False
     try:
         with conn.cursor() as cur:
-            logging.info("Updating database index (dropping and recreating IVFFlat)...")
-            cur.execute("DROP INDEX IF EXISTS data_embedding_idx;")
-            # Adjust parameters (e.g., lists) based on your data size and pgvector version
-            # Example: CREATE INDEX ON data USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-            cur.execute("CREATE INDEX data_embedding_idx ON data USING ivfflat (embedding vector_cosine_ops);")
-            logging.info("Index created. Analyzing table...")
-            cur.execute("ANALYZE data;") # Important for query planner performance
+            cur.execute(f"DROP TABLE IF EXISTS data{SHADOW_SUFFIX}, source_file{SHADOW_SUFFIX};")
+            cur.execute(f"CREATE TABLE data{SHADOW_SUFFIX} (LIKE data INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED);")
+            cur.execute(f"ALTER TABLE data{SHADOW_SUFFIX} ADD PRIMARY KEY (id);")
+            cur.execute(f"CREATE INDEX data{SHADOW_SUFFIX}_source_path_idx ON data{SHADOW_SUFFIX} (source_path);")
+            cur.execute(f"CREATE TABLE source_file{SHADOW_SUFFIX} (LIKE source_file INCLUDING ALL);")
+        conn.commit()
+        logging.info("Created empty shadow tables for the full reload.")
+        return True
+    except Exception as e:
+        logging.exception(f"Creating shadow tables failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def _rename_table(cur, old_name: str, new_name: str) -> None:
+    """Renames a table and its indexes named '<old_name>_...' to '<new_name>_...'."""
+    cur.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s;", (old_name,)
+    )
+    index_names = [row[0] for row in cur.fetchall()]
+    cur.execute(f"ALTER TABLE {old_name} RENAME TO {new_name};")
+    for index_name in index_names:
+        if index_name.startswith(f"{old_name}_"):
+            cur.execute(f"ALTER INDEX {index_name} RENAME TO {new_name}_{index_name[len(old_name) + 1:]};")
+
+
+def _table_exists(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+    return cur.fetchone()[0]
+
+
+def _swap_generation(incoming_suffix: str, drop_previous: bool) -> bool:
+    """
+    Atomically makes the '<table><incoming_suffix>' tables live and keeps
+    the current ones as '<table>_previous'. Renames only need a brief
+    exclusive lock; queries already running finish on the old tables and
+    the app's prepared statements are re-planned against the new ones.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot swap tables: No database connection.")
+        return False
+
+    def swap(cur) -> None:
+        for base in GENERATION_TABLES:
+            if not _table_exists(cur, f"{base}{incoming_suffix}"):
+                raise RuntimeError(f"Table '{base}{incoming_suffix}' does not exist")
+        cur.execute("SELECT pg_get_serial_sequence('data', 'id');")
+        sequence = cur.fetchone()[0]
+        if drop_previous:
+            cur.execute(f"DROP TABLE IF EXISTS data{PREVIOUS_SUFFIX}, source_file{PREVIOUS_SUFFIX};")
+        for base in GENERATION_TABLES:
+            _rename_table(cur, base, f"{base}_swap")
+            _rename_table(cur, f"{base}{incoming_suffix}", base)
+            _rename_table(cur, f"{base}_swap", f"{base}{PREVIOUS_SUFFIX}")
+        if sequence:
+            # Keep the shared sequence alive when the previous generation is dropped
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY data.id;")
+
+    try:
+        _run_with_lock_retry(conn, swap, "Table swap")
+        return True
+    except Exception as e:
+        logging.exception(f"Swapping in the '{incoming_suffix}' tables failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+
+
+def swap_in_shadow_tables() -> bool:
+    """Makes the loaded shadow tables live; the replaced generation is kept as data_previous/source_file_previous."""
+    if _swap_generation(SHADOW_SUFFIX, drop_previous=True):
+        logging.info("Swapped in the new corpus generation (previous one kept for rollback).")
+        return True
+    return False
+
+
+def rollback_to_previous() -> bool:
+    """Swaps the previous corpus generation back in (the current one becomes the previous one)."""
+    if _swap_generation(PREVIOUS_SUFFIX, drop_previous=False):
+        logging.info("Rolled back to the previous corpus generation.")
+        return True
+    return False
+
+
+def save_category_profiles(profiles: List[dict]) -> bool:
+    """
+    Replaces the contents of the category_profile table, which the app loads at
+    startup instead of rescanning DATA_DIR.
+
+    Args:
+        profiles: Dicts with keys category, keywords, file_count, chunk_count
+                  and centroid (np.ndarray or None), as built by
+                  load.profile.CategoryProfileBuilder.
+    """
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot save category profiles: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            # The table is also created by init_database.sql; this covers databases initialized earlier
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS category_profile (
+                    category TEXT PRIMARY KEY,
+                    keywords TEXT[] NOT NULL DEFAULT '{}',
+                    file_count INTEGER NOT NULL DEFAULT 0,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    centroid vector(768),
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                );
+            """)
+            cur.execute("DELETE FROM category_profile;")
+            values = [
+                (
+                    profile["category"],
+                    profile["keywords"],
+                    profile["file_count"],
+                    profile["chunk_count"],
+                    profile["centroid"].tolist() if profile["centroid"] is not None else None,
+                )
+                for profile in profiles
+            ]
+            if values:
+                execute_values(
+                    cur,
+                    "INSERT INTO category_profile (category, keywords, file_count, chunk_count, centroid) VALUES %s",
+                    values,
+                    template="(%s, %s, %s, %s, %s::vector)"
+                )
             conn.commit()
-            logging.info("Database index updated and table analyzed successfully.")
+            logging.info(f"Saved {len(values)} category profiles.")
             return True
     except Exception as e:
-        logging.exception(f"Database index update failed: {e}")
+        logging.exception(f"Saving category profiles failed: {e}")
         conn.rollback()
         return False
     finally:
         if conn:
-            conn.close()
-            logging.debug("DB connection closed after index update.")
\ No newline at end of file
+            _release_db_connection(conn)
+            logging.debug("DB connection released after saving category profiles.")
+
+
+def _plan_uses_index(plan: dict, index_name: str) -> bool:
+    """Recursively checks an EXPLAIN (FORMAT JSON) plan node for a scan on index_name."""
+    if plan.get("Index Name") == index_name:
+        return True
+    return any(_plan_uses_index(child, index_name) for child in plan.get("Plans", []))
+
+
+def _find_short_categories(cur, retrieval_sql: str, embedding_text: str, limit: int,
+                           sample_size: int = 10) -> List[Tuple[str, int, int]]:
+    """
+    Runs the retrieval query (with %s placeholders) for the smallest categories
+    and returns (category, rows returned, rows expected) for those that return
+    fewer than min(limit, category size) rows.
+    """
+    cur.execute(
+        "SELECT category, count(*) FROM data WHERE embedding IS NOT NULL "
+        "GROUP BY category ORDER BY count(*), category LIMIT %s;",
+        (sample_size,),
+    )
+    short_categories = []
+    for category, row_count in cur.fetchall():
+        cur.execute(retrieval_sql, ([category], embedding_text, limit))
+        returned = len(cur.fetchall())
+        expected = min(limit, row_count)
+        if returned < expected:
+            short_categories.append((category, returned, expected))
+    return short_categories
+
+
+def check_index_usage() -> bool:
+    """
+    Runs EXPLAIN on the app's retrieval query with a sample embedding and warns
+    if the planner does not use the ANN index (e.g. operator/opclass mismatch).
+    Also runs the query for the smallest categories and warns if any returns
+    fewer rows than it has (filtered ANN scans losing recall).
+    Returns True if the index is used.
+    """
+    if vector_index is None:
+        logging.warning("Skipping index self-check: app.vector_index is not available.")
+        return False
+    conn = _get_db_connection()
+    if not conn:
+        logging.error("Cannot check index usage: No database connection.")
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT category, embedding::text FROM data WHERE embedding IS NOT NULL LIMIT 1;")
+            sample = cur.fetchone()
+            if not sample:
+                logging.warning("Skipping index self-check: table 'data' is empty.")
+                return False
+            category, embedding_text = sample
+            # Inline the prepared-statement parameters so the plan reflects a real query
+            explain_sql = (
+                vector_index.build_retrieval_sql()
+                .replace("$1", "%s::text[]")
+                .replace("$2", "%s::vector")
+                .replace("$3", "%s")
+            )
+            cur.execute(f"EXPLAIN (FORMAT JSON) {explain_sql}", ([category], embedding_text, 5))
+            plan = cur.fetchone()[0][0]["Plan"]
+            short_categories = _find_short_categories(cur, explain_sql, embedding_text, 5)
+        conn.rollback()
+
+        if short_categories:
+            listed = ", ".join(f"'{name}' ({returned}/{expected})" for name, returned, expected in short_categories)
+            logging.warning(
+                f"Index self-check: the retrieval query returned fewer rows than available for {len(short_categories)} "
+                f"sampled categories: {listed}. The ANN scan stops before the category filter finds enough rows; "
+                f"set VECTOR_ITERATIVE_SCAN=relaxed_order (pgvector >= 0.8) or raise HNSW_EF_SEARCH / IVFFLAT_PROBES."
+            )
+
+        if _plan_uses_index(plan, vector_index.INDEX_NAME):
+            logging.info(
+                f"Index self-check passed: retrieval query uses '{vector_index.INDEX_NAME}' "
+                f"({vector_index.get_index_type()}, operator {vector_index.get_distance_operator()})."
+            )
+            return True
+        logging.warning(
+            f"Index self-check: retrieval query does NOT use '{vector_index.INDEX_NAME}'. "
+            f"Check that the query operator ({vector_index.get_distance_operator()}) matches the index opclass "
+            f"({vector_index.get_operator_class()}). On very small tables the planner may prefer a sequential scan."
+        )
+        return False
+    except Exception as e:
+        logging.exception(f"Index self-check failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            _release_db_connection(conn)
+            logging.debug("DB connection released after index self-check.")
+
+
+def close_database_connections():
+    """Logs connection pool metrics and closes pooled connections."""
+    if get_pool is None:
+        return
+    try:
+        stats = get_pool_stats()
+        if stats:
+            logging.info(f"DB pool stats: {stats}")
+        close_pool()
+    except Exception as e:
+        logging.error(f"Error closing database connection pool: {e}")
@@ -4,6 +4,8 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from typing import List, Optional
 
+from .embedding_cache import EmbeddingCache, text_key
+
 # Import config from the main app package assuming load/ is at the same level as app/
 # Adjust the import path if your structure is different.
 # This requires adding the project root to PYTHONPATH or using relative imports carefully.
@@ -19,6 +21,8 @@ except ImportError:
     import os
     class TempConfig:
         EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+        LOAD_EMBEDDING_CACHE_ENABLED = os.getenv("LOAD_EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        LOAD_EMBEDDING_CACHE_DIR = os.getenv("LOAD_EMBEDDING_CACHE_DIR", "/app/embedding_cache")
     config = TempConfig()
     logging.warning("Could not import app.config, using fallback for EMBEDDING_MODEL_NAME.")
 
@@ -28,6 +32,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 # Global variable to hold the loaded model
 _embedding_model: Optional[SentenceTransformer] = None
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_failed = False
 
 def load_embedding_model() -> Optional[SentenceTransformer]:
     """Loads the SentenceTransformer model specified in config."""
@@ -43,8 +49,79 @@ def load_embedding_model() -> Optional[SentenceTransformer]:
             _embedding_model = None # Ensure it's None on failure
     return _embedding_model
 
-def generate_embeddings(text_chunks: List[str], batch_size: int = 32) -> Optional[List[np.ndarray]]:
-    """Generates embeddings for a list of text chunks."""
+def get_embedding_cache(model: SentenceTransformer) -> Optional[EmbeddingCache]:
+    """Opens the on-disk embedding cache of the configured model (None if disabled or unusable)."""
+    global _embedding_cache, _embedding_cache_failed
+    if not config.LOAD_EMBEDDING_CACHE_ENABLED or _embedding_cache_failed:
+        return None
+    if _embedding_cache is None:
+        try:
+            _embedding_cache = EmbeddingCache(
+                config.LOAD_EMBEDDING_CACHE_DIR, config.EMBEDDING_MODEL_NAME, model.get_sentence_embedding_dimension()
+            )
+        except Exception as e:
+            logging.exception(f"Embedding cache unavailable, embedding every chunk: {e}")
+            _embedding_cache_failed = True
+    return _embedding_cache
+
+
+def close_embedding_cache() -> Optional[dict]:
+    """Closes the embedding cache and returns its hit/miss counters (None if it was not used)."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        return None
+    stats = _embedding_cache.stats()
+    _embedding_cache.close()
+    _embedding_cache = None
+    return stats
+
+
+def _encode(model: SentenceTransformer, text_chunks: List[str], batch_size: int, show_progress_bar: bool) -> np.ndarray:
+    return model.encode(
+        text_chunks,
+        batch_size=batch_size,
+        show_progress_bar=show_progress_bar, # Show progress bar in console logs
+        normalize_embeddings=True, # Normalize for cosine similarity
+        convert_to_numpy=True,
+    ).astype(np.float32, copy=False)
+
+
+def _encode_with_cache(model: SentenceTransformer, cache: EmbeddingCache, text_chunks: List[str],
+                       batch_size: int, show_progress_bar: bool) -> np.ndarray:
+    """Serves cached chunks from the cache and only sends the misses (deduplicated) to the model."""
+    global _embedding_cache_failed
+    keys = [text_key(chunk) for chunk in text_chunks]
+    rows, found = cache.lookup(keys)
+    embeddings = np.empty((len(text_chunks), cache.dim), dtype=np.float32)
+    if found.any():
+        embeddings[found] = cache.vectors(rows[found])
+
+    missing = np.flatnonzero(~found)
+    unique_chunks = []
+    if len(missing):
+        first_index = {} # key -> row in unique_chunks
+        for i in missing:
+            if keys[i] not in first_index:
+                first_index[keys[i]] = len(unique_chunks)
+                unique_chunks.append(text_chunks[i])
+        encoded = _encode(model, unique_chunks, batch_size, show_progress_bar)
+        embeddings[missing] = encoded[[first_index[keys[i]] for i in missing]]
+        try:
+            cache.add(list(first_index), encoded)
+        except Exception as e:
+            logging.exception(f"Writing to the embedding cache failed, disabling it: {e}")
+            _embedding_cache_failed = True
+    logging.info(f"Embedding cache: {int(found.sum())} of {len(text_chunks)} chunks cached, {len(unique_chunks)} embedded.")
+    return embeddings
+
+
+def generate_embeddings(text_chunks: List[str], batch_size: int = 32,
+                        show_progress_bar: bool = True) -> Optional[List[np.ndarray]]:
+    """
+    Generates embeddings for a list of text chunks. With
+    LOAD_EMBEDDING_CACHE_ENABLED, chunks embedded by an earlier run (same
+    model, same normalized text) are read from the on-disk cache instead.
+    """
     model = load_embedding_model()
     if model is None:
         logging.error("Cannot generate embeddings because the model failed to load.")
@@ -56,12 +133,11 @@ def generate_embeddings(text_chunks: List[str], batch_size: int = 32) -> Optiona
     try:
         logging.info(f"Generating embeddings for {len(text_chunks)} chunks (batch size: {batch_size})...")
         # Using encode method which handles batching and progress bar internally if needed
-        embeddings = model.encode(
-            text_chunks,
-            batch_size=batch_size,
-            show_progress_bar=True, # Show progress bar in console logs
-            normalize_embeddings=True # Normalize for cosine similarity
-        )
+        cache = get_embedding_cache(model)
+        if cache is not None:
+            embeddings = _encode_with_cache(model, cache, text_chunks, batch_size, show_progress_bar)
+        else:
+            embeddings = _encode(model, text_chunks, batch_size, show_progress_bar)
         logging.info("Embeddings generated successfully.")
         # Ensure the output is a list of numpy arrays
         return [emb for emb in embeddings]
@@ -0,0 +1,173 @@
+# load/embedding_cache.py
+"""
+Content-addressed on-disk cache of chunk embeddings for the loader.
+
+Keys are 16-byte BLAKE2b digests of the normalized chunk text (Unicode NFC,
+whitespace collapsed); each model gets its own directory, so the effective
+key is (model name, text hash). A directory holds:
+
+  vectors.f32  - row-major float32 matrix, one row per entry (append-only)
+  keys.bin     - the 16-byte key of each row, in the same order
+  meta.json    - model name, dimension and whether vectors are normalized
+
+vectors.f32 is memory-mapped read-only, so a batch lookup is a binary search
+of the sorted key array plus one gather from the mapping; no per-element
+Python objects are created. Keys of entries added during a run are kept in a
+small dict and merged into the sorted index every MERGE_THRESHOLD entries.
+Vectors are appended before their keys, so a crash mid-append leaves at most
+orphan vector rows, which are dropped on the next open.
+
+One loader writes the cache at a time (the load-data service runs once).
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+KEY_BYTES = 16
+KEY_DTYPE = f"S{KEY_BYTES}"
+MERGE_THRESHOLD = 65536
+
+# Configure basic logging for this module
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def normalize_text(text: str) -> str:
+    """The form of a chunk that is hashed: NFC, with runs of whitespace collapsed to one space."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Memory-mapped float32 embedding store keyed on the normalized chunk text hash."""
+
+    def __init__(self, directory: str, model_name: str, dim: int, normalized: bool = True):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name.strip("/"))
+        self.path = os.path.join(directory, safe_name)
+        self.model_name = model_name
+        self.dim = dim
+        self.normalized = normalized
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.bin")
+        self._check_meta()
+
+        self.count = self._recover()
+        keys = np.fromfile(self._keys_path, dtype=KEY_DTYPE, count=self.count) if self.count else np.empty(0, KEY_DTYPE)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._recent: Dict[bytes, int] = {} # Entries added since the last merge
+        self._vectors: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._vectors_file = open(self._vectors_path, "ab")
+        self._keys_file = open(self._keys_path, "ab")
+        logging.info(f"Embedding cache {self.path}: {self.count} entries ({self.dim}-dim).")
+
+    def _check_meta(self) -> None:
+        """Starts a fresh cache if the stored one was written with a different dimension or normalization."""
+        meta_path = os.path.join(self.path, "meta.json")
+        meta = {"model_name": self.model_name, "dim": self.dim, "normalized": self.normalized}
+        try:
+            with open(meta_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        if stored != meta:
+            if stored is not None:
+                logging.warning(f"Embedding cache {self.path} was written with {stored}; starting a new cache.")
+            for path in (self._vectors_path, self._keys_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def _recover(self) -> int:
+        """Returns the number of complete entries, truncating rows a crash left without a key (or vice versa)."""
+        row_bytes = 4 * self.dim
+        key_rows = os.path.getsize(self._keys_path) // KEY_BYTES if os.path.exists(self._keys_path) else 0
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        count = min(key_rows, vector_rows)
+        for path, size in ((self._keys_path, count * KEY_BYTES), (self._vectors_path, count * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                logging.warning(f"Truncating incomplete embedding cache file {path}.")
+                os.truncate(path, size)
+        return count
+
+    def _mapped_vectors(self) -> np.memmap:
+        if self._vectors is None or self._mapped_rows != self.count:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            self._mapped_rows = self.count
+        return self._vectors
+
+    def lookup(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batch lookup. Returns (rows, found): the cache row of each key (-1 if
+        missing) and a boolean mask of the keys that were found.
+        """
+        query = np.array(keys, dtype=KEY_DTYPE)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted_keys):
+            positions = np.searchsorted(self._sorted_keys, query).clip(max=len(self._sorted_keys) - 1)
+            matched = self._sorted_keys[positions] == query
+            rows[matched] = self._order[positions[matched]]
+        if self._recent:
+            for i in np.flatnonzero(rows < 0):
+                rows[i] = self._recent.get(keys[i], -1)
+        found = rows >= 0
+        hits = int(found.sum())
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return rows, found
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Gathers the given cache rows into a new float32 array."""
+        return self._mapped_vectors()[rows]
+
+    def add(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """Appends entries (keys not already cached, see lookup)."""
+        if not keys:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._vectors_file.write(memoryview(vectors).cast("B"))
+        self._vectors_file.flush()
+        self._keys_file.write(np.array(keys, dtype=KEY_DTYPE).tobytes())
+        self._keys_file.flush()
+        for key in keys:
+            self._recent[key] = self.count
+            self.count += 1
+        if len(self._recent) >= MERGE_THRESHOLD:
+            self._merge_recent()
+
+    def _merge_recent(self) -> None:
+        recent_keys = np.array(list(self._recent.keys()), dtype=KEY_DTYPE)
+        recent_rows = np.fromiter(self._recent.values(), dtype=np.int64, count=len(self._recent))
+        keys = np.concatenate([self._sorted_keys, recent_keys])
+        rows = np.concatenate([self._order, recent_rows])
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys, self._order = keys[order], rows[order]
+        self._recent.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size_mib": round(self.count * (4 * self.dim + KEY_BYTES) / 1024 / 1024, 1),
+        }
+
+    def close(self) -> None:
+        self._vectors_file.close()
+        self._keys_file.close()
+        self._vectors = None
@@ -1,15 +1,35 @@
 # load/main.py
 import os
 import logging
-from tqdm import tqdm # Ensure tqdm is in requirements.txt
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
 
 # Import functions from other load modules
-from .readers import read_file
-from .processing import split_text_chunks
-from .embedding import generate_embeddings, load_embedding_model
-from .database import reset_database, batch_insert_to_database, update_database_index
+from .embedding import generate_embeddings, load_embedding_model, close_embedding_cache
+from .pipeline import run_pipeline, peak_rss_mib, CHUNK_SIZE, CHUNK_OVERLAP
+from .processing import create_token_chunker
+from .profile import CategoryProfileBuilder
+from .sync import SyncPlan, plan_sync
+from .database import (
+    ensure_sync_schema,
+    prepare_shadow_tables,
+    build_text_search_index,
+    swap_in_shadow_tables,
+    rollback_to_previous,
+    SHADOW_SUFFIX,
+    load_manifest,
+    delete_source_files,
+    save_manifest,
+    touch_manifest,
+    load_stored_category_stats,
+    insert_rows,
+    get_index_status,
+    analyze_database,
+    update_database_index,
+    check_index_usage,
+    save_category_profiles,
+    close_database_connections,
+)
 
 # Import config from the main app package
 try:
@@ -19,6 +39,11 @@ except ImportError:
     import os
     class TempConfig:
         DATA_DIR = os.getenv("DATA_DIR", "../data") # Adjust relative path if needed
+        LOAD_MODE = os.getenv("LOAD_MODE", "sync")
+        LOAD_REINDEX_THRESHOLD = float(os.getenv("LOAD_REINDEX_THRESHOLD", "0.2"))
+        LOAD_CHUNKER = os.getenv("LOAD_CHUNKER", "tokens")
+        LOAD_CHUNK_TOKENS = int(os.getenv("LOAD_CHUNK_TOKENS", "0"))
+        LOAD_CHUNK_OVERLAP_TOKENS = int(os.getenv("LOAD_CHUNK_OVERLAP_TOKENS", "32"))
     config = TempConfig()
     logging.warning("Could not import app.config, using fallback for DATA_DIR.")
 
@@ -27,110 +52,272 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-def process_directory(directory_path: str) -> List[Tuple[str, np.ndarray, str]]:
+def process_files(files: List[Tuple[str, str]], on_file=None, table: str = "data",
+                  count_terms=None) -> Optional[dict]:
     """
-    Walks through the directory, reads files, chunks text, generates embeddings.
+    Reads, chunks and embeds the given (file_path, category) pairs and
+    inserts the chunks into the database, as a staged pipeline (see
+    load/pipeline.py): files are parsed in a process pool, chunks are
+    embedded in large cross-file batches and rows are inserted by a
+    concurrent writer.
 
     Args:
-        directory_path: The path to the root data directory.
+        files: The files to ingest, e.g. SyncPlan.to_process.
+        on_file: Passed to run_pipeline; called with each file's term counts and chunks.
+        table: The table the chunks are inserted into.
+        count_terms: Passed to run_pipeline; counts a document's terms in the readers.
 
     Returns:
-        A list of tuples: (chunk_text, chunk_embedding, category_name)
+        The pipeline counters (files, chunks, inserted rows, failures), or
+        None if processing could not start.
+    """
+    # Pre-load embedding model so a broken model fails fast
+    model = load_embedding_model()
+    if model is None:
+        logging.error("Stopping processing as embedding model failed to load.")
+        return None
+
+    chunker = None
+    if config.LOAD_CHUNKER.lower() == "tokens":
+        # Built before the reader processes are forked, which inherit the tokenizer
+        chunker = create_token_chunker(model, config.LOAD_CHUNK_TOKENS, config.LOAD_CHUNK_OVERLAP_TOKENS)
+    if chunker is not None:
+        logging.info(f"Chunking by model tokens: at most {chunker.max_tokens} per chunk, {chunker.overlap_tokens} overlap.")
+    else:
+        logging.info(f"Chunking by words: {CHUNK_SIZE} per chunk, {CHUNK_OVERLAP} overlap.")
+
+    logging.info(f"Starting file processing of {len(files)} files.")
+
+    def encode(chunks: List[str], batch_size: int) -> Optional[List[np.ndarray]]:
+        return generate_embeddings(chunks, batch_size=batch_size, show_progress_bar=False)
+
+    def insert_batch(rows) -> bool:
+        return insert_rows(rows, table)
+
+    return run_pipeline(files, encode, insert_batch, on_file, chunker.chunk_pages if chunker else None, count_terms)
+
+
+def sync_directory(directory_path: str, data_table: str = "data",
+                   manifest_table: str = "source_file") -> Optional[dict]:
     """
-    all_data_to_insert = []
-    processed_files = 0
-    failed_files = 0
+    Brings the database in line with directory_path using the source file
+    manifest (see load/sync.py): only new and changed files are chunked and
+    embedded, chunks of changed and deleted files are removed, and manifest
+    entries are written after the file's chunks are stored. A failed run
+    leaves the manifest untouched for the affected files, so the next run
+    retries them.
+
+    Args:
+        directory_path: The path to the root data directory.
+        data_table, manifest_table: The tables to sync; a full reload syncs
+                                    into empty shadow tables.
 
+    Returns:
+        The sync counters (new/changed/deleted files, deleted chunks and the
+        pipeline counters), or None if syncing could not start or failed.
+    """
     if not directory_path or not os.path.isdir(directory_path):
         logging.error(f"Invalid or non-existent data directory provided: {directory_path}")
-        return []
+        return None
+    manifest = load_manifest(manifest_table)
+    if manifest is None:
+        return None
+    plan: SyncPlan = plan_sync(directory_path, manifest)
+    logging.info(f"Sync plan for {directory_path} -> '{data_table}': {plan.summary()}.")
 
-    # Pre-load embedding model to avoid loading it repeatedly inside the loop
-    if load_embedding_model() is None:
-        logging.error("Stopping processing as embedding model failed to load.")
-        return []
+    stats = {
+        "new_files": len(plan.to_process) - len(plan.changed),
+        "changed_files": len(plan.changed),
+        "deleted_files": len(plan.deleted),
+        "deleted_chunks": 0,
+        "inserted": 0,
+        "failed_insert_batches": 0,
+    }
+    if not touch_manifest(plan.touched, manifest_table):
+        return None
+    if not plan.has_changes:
+        return stats
+    if plan.to_process and load_embedding_model() is None: # Fail before deleting anything
+        logging.error("Stopping sync as embedding model failed to load.")
+        return None
 
-    logging.info(f"Starting file processing in directory: {directory_path}")
+    # Also clears chunks that a failed earlier run inserted for files that never reached the manifest
+    deleted_chunks = delete_source_files(
+        [path for path, _ in plan.to_process] + plan.deleted, plan.deleted, data_table, manifest_table
+    )
+    if deleted_chunks is None:
+        return None
+    stats["deleted_chunks"] = deleted_chunks
+    if not plan.to_process:
+        return stats
 
-    # Use os.walk to traverse the directory structure
-    for root, _, files in os.walk(directory_path):
-        category = os.path.basename(root) # Use subdirectory name as category
-        logging.debug(f"Processing directory: {root} (Category: {category})")
+    term_counter = CategoryProfileBuilder()
+    entries = []
 
-        if category == os.path.basename(directory_path): # Skip the root data directory itself
-             continue
+    def on_file(file_path: str, category: str, term_counts: Optional[dict], chunks: List[str], content_hash: str) -> None:
+        if term_counts is None:
+            return # Read failure: not recorded, so the file is retried on the next run
+        # A file that was read but gave no chunks is recorded with chunk_count 0, so it is not re-read until it changes
+        size, mtime = plan.file_stats[file_path]
+        entries.append({
+            "path": file_path,
+            "category": category,
+            "size": size,
+            "mtime": mtime,
+            "content_hash": content_hash,
+            "chunk_count": len(chunks),
+            "term_counts": term_counts,
+        })
 
-        files_in_category = [f for f in files if f.lower().endswith(('.pdf', '.docx', '.txt'))]
-        if not files_in_category:
-            logging.debug(f"No supported files found in {root}")
-            continue
+    ingestion_stats = process_files(plan.to_process, on_file, data_table, term_counter.count_terms)
+    if ingestion_stats is None:
+        return None
+    stats.update(ingestion_stats)
 
-        # Process files with a progress bar for the category
-        logging.info(f"Found {len(files_in_category)} supported files in category '{category}'.")
-        for file_name in tqdm(files_in_category, desc=f"Processing {category}", unit="file"):
-            file_path = os.path.join(root, file_name)
+    # Only files whose chunks were all inserted reach the manifest; the rows of the others are
+    # cleared and the files re-processed on the next run
+    inserted_by_path = stats.pop("inserted_by_path")
+    complete = [entry for entry in entries if inserted_by_path.get(entry["path"], 0) == entry["chunk_count"]]
+    if complete and not save_manifest(complete, manifest_table):
+        return None
+    if len(complete) != len(entries):
+        expected_rows = sum(entry["chunk_count"] for entry in entries)
+        logging.error(
+            f"Inserted {stats['inserted']} of {expected_rows} chunks "
+            f"({stats['failed_embedding_chunks']} failed to embed, {stats['failed_insert_batches']} insert batches failed). "
+            f"{len(entries) - len(complete)} of {len(entries)} files are not recorded in the manifest; "
+            "the next run retries them."
+        )
+        return None
+    return stats
 
-            # 1. Read File Content
-            content = read_file(file_path)
-            if content is None:
-                failed_files += 1
-                continue # Skip if reading failed or file is unsupported
 
-            # 2. Split into Chunks
-            chunks = split_text_chunks(content, chunk_size=150, chunk_overlap=20) # Adjusted chunk size/overlap
-            if not chunks:
-                logging.warning(f"No valid chunks generated for file: {file_path}")
-                failed_files += 1
-                continue
+def rebuild_category_profiles() -> bool:
+    """Rebuilds the category profiles from the stored chunks and the manifest (no files are re-read)."""
+    category_stats = load_stored_category_stats()
+    if category_stats is None:
+        return False
+    builder = CategoryProfileBuilder()
+    for category in category_stats:
+        builder.add_category_stats(
+            category["category"], category["term_counts"], category["file_count"],
+            category["chunk_count"], category["centroid"],
+        )
+    return save_category_profiles(builder.build())
 
-            # 3. Generate Embeddings for Chunks
-            # Consider batching embeddings per file or across multiple files for efficiency
-            embeddings = generate_embeddings(chunks)
-            if embeddings is None or len(embeddings) != len(chunks):
-                logging.error(f"Embedding generation failed or returned incorrect number for file: {file_path}")
-                failed_files += 1
-                continue
 
-            # 4. Prepare data for insertion
-            for chunk, embedding in zip(chunks, embeddings):
-                all_data_to_insert.append((chunk, embedding, category))
+def refresh_index(changed_rows: int) -> bool:
+    """
+    Rebuilds the ANN index when it is missing or when the changed rows
+    (inserted + deleted) reach LOAD_REINDEX_THRESHOLD of the table (IVFFlat
+    lists are trained on the data they were built from, and deletions leave
+    dead tuples in both index types). Smaller syncs keep the index, which
+    pgvector maintains on insert, and only ANALYZE. Rebuilds run
+    concurrently, so the current index keeps serving queries.
+    """
+    status = get_index_status()
+    if status is None:
+        return False
+    row_count, has_index = status
+    change_ratio = changed_rows / max(1, row_count)
+    if has_index and change_ratio < config.LOAD_REINDEX_THRESHOLD:
+        logging.info(
+            f"Keeping the ANN index: {changed_rows} changed rows are {change_ratio:.1%} of {row_count} "
+            f"(rebuild threshold {config.LOAD_REINDEX_THRESHOLD:.0%})."
+        )
+        return analyze_database()
 
-            processed_files += 1
+    if not update_database_index():
+        return False
+    logging.info("Database index updated successfully.")
+    # Verify the retrieval query is actually served by the index
+    check_index_usage()
+    return True
 
-    logging.info(f"File processing completed. Processed: {processed_files}, Failed/Skipped: {failed_files}")
-    logging.info(f"Total chunks prepared for insertion: {len(all_data_to_insert)}")
-    return all_data_to_insert
+
+def full_reload(directory_path: str) -> Optional[dict]:
+    """
+    Loads directory_path into empty shadow tables, builds their full-text
+    and ANN indexes, analyzes them, and swaps them in atomically. The live tables keep serving chat
+    traffic until the swap; the replaced generation is kept as
+    data_previous/source_file_previous (LOAD_MODE=rollback restores it).
+    """
+    if not prepare_shadow_tables():
+        return None
+    sync_stats = sync_directory(directory_path, f"data{SHADOW_SUFFIX}", f"source_file{SHADOW_SUFFIX}")
+    if sync_stats is None:
+        return None
+    if not sync_stats["inserted"]:
+        logging.error("The full reload produced no chunks; keeping the live corpus.")
+        return None
+    if not build_text_search_index(f"data{SHADOW_SUFFIX}"):
+        logging.error("Building the full-text index on the shadow table failed; the live corpus is unchanged.")
+        return None
+    if not update_database_index(f"data{SHADOW_SUFFIX}", concurrently=False):
+        logging.error("Building the index on the shadow table failed; the live corpus is unchanged.")
+        return None
+    if not swap_in_shadow_tables():
+        return None
+    return sync_stats
 
 
 # Main execution block
 if __name__ == "__main__":
     logging.info("--- Starting Data Loading Process ---")
+    load_mode = config.LOAD_MODE.lower()
+    if not ensure_sync_schema():
+        logging.error("Preparing the database schema failed. Aborting.")
+        exit(1)
 
-    # 1. Reset Database (optional, be careful!)
-    # logging.warning("RESETTING DATABASE is enabled!") # Uncomment to actually reset
-    if not reset_database():
-         logging.error("Database reset failed. Aborting.")
-         exit(1) # Exit if reset fails
-    # logging.info("Skipping database reset.") # Comment out reset call if not needed
-
+    if load_mode == "rollback":
+        # Swap the previous corpus generation back in (migrating it if it predates the current
+        # schema) and rebuild its profiles
+        if not rollback_to_previous() or not ensure_sync_schema() or not rebuild_category_profiles():
+            logging.error("Rollback failed.")
+            close_database_connections()
+            exit(1)
+        check_index_usage()
+        close_database_connections()
+        logging.info("--- Data Loading Process Finished ---")
+        exit(0)
 
-    # 2. Process files and generate data
-    data_to_insert = process_directory(config.DATA_DIR)
-
-    # 3. Insert data into database
-    if data_to_insert:
-        if not batch_insert_to_database(data_to_insert):
-            logging.error("Batch data insertion failed. Aborting.")
-            exit(1) # Exit if insert fails
+    # 1. Bring the database in line with DATA_DIR. The default (sync) only
+    # re-embeds new and changed files in place; LOAD_MODE=full reloads
+    # everything into shadow tables and swaps them in.
+    if load_mode == "full":
+        logging.info("LOAD_MODE=full: reloading the whole corpus into shadow tables.")
+        sync_stats = full_reload(config.DATA_DIR)
     else:
-        logging.warning("No data was generated from the files to insert into the database.")
+        sync_stats = sync_directory(config.DATA_DIR)
+    if sync_stats is None:
+        logging.error("Loading failed. Aborting.")
+        close_database_connections()
+        exit(1)
 
-    # 4. Update database index
-    if not update_database_index():
-         logging.error("Database index update failed.")
-         # Don't necessarily exit here, insertion might still be useful without index
+    changed_rows = sync_stats["inserted"] + sync_stats["deleted_chunks"]
+    if load_mode == "full":
+        # 2. Rebuild category profiles for the new generation; its index was built before the swap
+        if not rebuild_category_profiles():
+            logging.error("Saving category profiles failed; the app will fall back to scanning DATA_DIR.")
+        check_index_usage()
+    elif changed_rows:
+        # 2. Rebuild category profiles (keywords, counts, centroids) for app startup
+        if not rebuild_category_profiles():
+            logging.error("Saving category profiles failed; the app will fall back to scanning DATA_DIR.")
+
+        # 3. Refresh the ANN index if the change volume warrants it
+        if not refresh_index(changed_rows):
+            logging.error("Database index update failed.")
+            # Don't necessarily exit here, the data is still useful without index
     else:
-         logging.info("Database index updated successfully.")
+        logging.info("No changes in DATA_DIR; the database is up to date.")
 
+    close_database_connections()
+    cache_stats = close_embedding_cache()
+    if cache_stats is not None:
+        logging.info(f"Embedding cache: {cache_stats}")
 
-    logging.info("--- Data Loading Process Finished ---")
\ No newline at end of file
+    peak = peak_rss_mib()
+    logging.info(f"Sync: {sync_stats}")
+    logging.info(f"Peak RSS: loader {peak['loader_mib']} MiB, largest reader process {peak['largest_reader_mib']} MiB")
+    logging.info("--- Data Loading Process Finished ---")
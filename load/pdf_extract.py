@@ -0,0 +1,271 @@
+# load/pdf_extract.py
+"""
+Fault-isolated, page-parallel PDF text extraction.
+
+Every PDF is extracted in short-lived child processes, forked from the
+reader process. Child 0 opens the file and reports the page count. Large
+files then get more children (one per LOAD_PDF_PAGES_PER_WORKER pages, at
+most LOAD_PDF_PAGE_WORKERS). Child j extracts pages j, j + k, j + 2k, ...,
+so pages arrive roughly in order and are yielded as soon as they are next.
+
+Limits, so one pathological file cannot stall or take down the load:
+  * LOAD_PDF_PAGE_TIMEOUT - a child that sends nothing for this long is killed
+  * LOAD_PDF_FILE_TIMEOUT - all children are killed when the file takes longer
+  * LOAD_PDF_MEMORY_MB    - address space a child may add (RLIMIT_AS)
+Pages lost to a limit or an extraction error are skipped and counted; the
+rest of the file is still used.
+
+Backends (LOAD_PDF_BACKEND): pymupdf (fastest), pypdf, pypdf2. "auto" uses
+the first one that is installed.
+"""
+import os
+import time
+import logging
+import resource
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from app.config import config
+except ImportError:
+    # Fallback
+    class TempConfig:
+        LOAD_PDF_BACKEND = os.getenv("LOAD_PDF_BACKEND", "auto")
+        LOAD_PDF_PAGE_WORKERS = int(os.getenv("LOAD_PDF_PAGE_WORKERS", "2"))
+        LOAD_PDF_PAGES_PER_WORKER = int(os.getenv("LOAD_PDF_PAGES_PER_WORKER", "32"))
+        LOAD_PDF_PAGE_TIMEOUT = float(os.getenv("LOAD_PDF_PAGE_TIMEOUT", "30"))
+        LOAD_PDF_FILE_TIMEOUT = float(os.getenv("LOAD_PDF_FILE_TIMEOUT", "300"))
+        LOAD_PDF_MEMORY_MB = int(os.getenv("LOAD_PDF_MEMORY_MB", "1024"))
+    config = TempConfig()
+    logging.warning("Could not import app.config, using fallback for the PDF extraction settings.")
+
+# Configure basic logging for this module
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PageReader = Tuple[int, Callable[[int], str]] # (page count, page index -> text)
+
+
+def _open_pymupdf(file_path: str) -> PageReader:
+    import pymupdf
+    doc = pymupdf.open(file_path)
+    return doc.page_count, lambda i: doc[i].get_text()
+
+
+def _open_pypdf(file_path: str) -> PageReader:
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    return len(reader.pages), lambda i: reader.pages[i].extract_text() or ""
+
+
+def _open_pypdf2(file_path: str) -> PageReader:
+    from PyPDF2 import PdfReader
+    reader = PdfReader(file_path)
+    return len(reader.pages), lambda i: reader.pages[i].extract_text() or ""
+
+
+# Backend name -> (module that must be importable, opener), fastest first
+PDF_BACKENDS: Dict[str, Tuple[str, Callable[[str], PageReader]]] = {
+    "pymupdf": ("pymupdf", _open_pymupdf),
+    "pypdf": ("pypdf", _open_pypdf),
+    "pypdf2": ("PyPDF2", _open_pypdf2),
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, (module, _) in PDF_BACKENDS.items() if importlib.util.find_spec(module) is not None]
+
+
+def get_pdf_backend() -> Optional[str]:
+    """The configured PDF backend if installed, else the fastest installed one (None if there is none)."""
+    available = available_backends()
+    name = config.LOAD_PDF_BACKEND.lower()
+    if name in available:
+        return name
+    if name != "auto":
+        logging.warning(f"PDF backend '{config.LOAD_PDF_BACKEND}' is not installed; using {available[0] if available else 'none'}.")
+    return available[0] if available else None
+
+
+def page_workers(page_count: int) -> int:
+    """Number of child processes for a PDF with page_count pages."""
+    per_worker = max(1, config.LOAD_PDF_PAGES_PER_WORKER)
+    return max(1, min(config.LOAD_PDF_PAGE_WORKERS, -(-page_count // per_worker)))
+
+
+def _limit_memory(extra_mb: int) -> None:
+    """Caps this process's address space at its current size plus extra_mb (the reader's mappings are inherited)."""
+    if extra_mb <= 0:
+        return
+    with open("/proc/self/statm") as f:
+        current = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    limit = current + extra_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _extract_pages(conn, backend: str, file_path: str, worker: int, workers: Optional[int], memory_mb: int) -> None:
+    """
+    Child process: extracts pages worker, worker + workers, ... and sends
+    ("page", i, text) or ("error", i, message) for each, then ("done",).
+    Worker 0 is started with workers=None; it first sends ("count", n) and
+    derives workers from the page count. ("failed", message) means the
+    file could not be opened.
+    """
+    try:
+        _limit_memory(memory_mb)
+        page_count, page_text = PDF_BACKENDS[backend][1](file_path)
+        if workers is None:
+            conn.send(("count", page_count))
+            workers = page_workers(page_count)
+        for i in range(worker, page_count, workers):
+            try:
+                text = (page_text(i) or "").strip()
+            except MemoryError:
+                conn.send(("error", i, f"exceeded LOAD_PDF_MEMORY_MB={memory_mb}"))
+            except Exception as e:
+                conn.send(("error", i, f"{type(e).__name__}: {e}"))
+            else:
+                conn.send(("page", i, text))
+        conn.send(("done",))
+    except BaseException as e:
+        try:
+            conn.send(("failed", f"{type(e).__name__}: {e}"))
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+class _Child:
+    __slots__ = ("process", "worker", "next_page", "last_message")
+
+    def __init__(self, process, worker: int):
+        self.process = process
+        self.worker = worker
+        self.next_page = worker # Children send their pages in order
+        self.last_message = time.monotonic()
+
+
+class PdfExtraction:
+    """
+    Iterates over the text of a PDF's pages (empty pages are skipped).
+    After iteration, pages, failed_pages, seconds and workers describe the run.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.backend = get_pdf_backend()
+        self.page_count: Optional[int] = None
+        self.pages = 0
+        self.failed_pages = 0
+        self.workers = 0
+        self.seconds = 0.0
+        self.error: Optional[str] = None
+
+    def __iter__(self) -> Iterator[str]:
+        if self.backend is None:
+            self.error = "no PDF backend installed (pymupdf, pypdf or PyPDF2)"
+            logging.error(f"Cannot read '{self.file_path}': {self.error}")
+            return
+        started = time.monotonic()
+        context = multiprocessing.get_context("fork")
+        children: Dict[object, _Child] = {}
+        received: Dict[int, Optional[str]] = {} # Page -> text (None = failed), until it is yielded
+        next_page = 0
+        stride = 1
+
+        def spawn(worker: int, workers: Optional[int]) -> None:
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_extract_pages,
+                args=(child_conn, self.backend, self.file_path, worker, workers, config.LOAD_PDF_MEMORY_MB),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            children[parent_conn] = _Child(process, worker)
+            self.workers += 1
+
+        def drop(conn, reason: Optional[str] = None) -> None:
+            """Stops a child; its pages that never arrived are failed."""
+            child = children.pop(conn)
+            if child.process.is_alive():
+                child.process.kill()
+            child.process.join()
+            conn.close()
+            if self.page_count is None: # Child 0 died before reporting the page count
+                self.page_count = 0
+                self.error = self.error or reason or "extraction process died"
+                return
+            lost = range(child.next_page, self.page_count, stride)
+            if reason and len(lost):
+                logging.warning(f"'{self.file_path}': {reason}; skipping {len(lost)} pages from page {child.next_page + 1}.")
+            for page in lost:
+                received[page] = None
+                self.failed_pages += 1
+
+        spawn(0, None)
+        try:
+            while True:
+                while next_page in received:
+                    text = received.pop(next_page)
+                    next_page += 1
+                    if text:
+                        yield text
+                if (self.page_count is not None and next_page >= self.page_count) or not children:
+                    break
+
+                now = time.monotonic()
+                if now - started > config.LOAD_PDF_FILE_TIMEOUT:
+                    for conn in list(children):
+                        drop(conn, f"exceeded LOAD_PDF_FILE_TIMEOUT={config.LOAD_PDF_FILE_TIMEOUT:g}s")
+                    continue
+                for conn, child in list(children.items()):
+                    if now - child.last_message > config.LOAD_PDF_PAGE_TIMEOUT:
+                        drop(conn, f"page {child.next_page + 1} exceeded LOAD_PDF_PAGE_TIMEOUT={config.LOAD_PDF_PAGE_TIMEOUT:g}s")
+                if not children:
+                    continue
+
+                deadline = min(
+                    [child.last_message + config.LOAD_PDF_PAGE_TIMEOUT for child in children.values()]
+                    + [started + config.LOAD_PDF_FILE_TIMEOUT]
+                )
+                for conn in wait(list(children), timeout=max(0.0, deadline - time.monotonic())):
+                    child = children[conn]
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        drop(conn, "extraction process died (memory limit or crash)")
+                        continue
+                    child.last_message = time.monotonic()
+                    kind = message[0]
+                    if kind == "count":
+                        self.page_count = message[1]
+                        stride = page_workers(self.page_count)
+                        for worker in range(1, stride):
+                            spawn(worker, stride)
+                    elif kind == "page":
+                        received[message[1]] = message[2]
+                        self.pages += 1
+                        child.next_page = message[1] + stride
+                    elif kind == "error":
+                        logging.warning(f"'{self.file_path}': page {message[1] + 1} failed: {message[2]}")
+                        received[message[1]] = None
+                        self.failed_pages += 1
+                        child.next_page = message[1] + stride
+                    elif kind == "done":
+                        drop(conn)
+                    elif kind == "failed":
+                        self.error = message[1]
+                        logging.error(f"Error reading PDF file '{self.file_path}': {message[1]}")
+                        for other in list(children):
+                            drop(other)
+        finally:
+            for conn in list(children):
+                drop(conn) # Also when the consumer stops early
+            self.seconds = time.monotonic() - started
+            logging.info(
+                f"Extracted {self.pages}/{self.page_count or 0} pages of '{os.path.basename(self.file_path)}' "
+                f"in {self.seconds:.2f}s ({self.backend}, {self.workers} processes, {self.failed_pages} pages failed)."
+            )
@@ -0,0 +1,338 @@
+# load/pipeline.py
+"""
+Staged ingestion pipeline.
+
+  discover files -> [process pool] read + chunk -> [main thread] embed in large
+  cross-file batches -> [bounded queue] -> [writer thread] insert into the DB
+
+Reading/parsing (PDF extraction in particular) runs in LOAD_READER_WORKERS
+processes with at most LOAD_QUEUE_SIZE files in flight per worker. A reader
+streams a document's pages into the chunker (see load.pdf_extract for the
+per-page PDF workers and their limits) and returns only the chunks and term
+counts, never the full text. Chunks of
+finished files are accumulated until LOAD_EMBED_BATCH_SIZE chunks are ready
+and then encoded in a single model call, while the pool keeps parsing the
+next files. Embedded rows are handed to a writer thread through a queue of
+at most LOAD_QUEUE_SIZE batches, so inserting overlaps with embedding and
+memory stays bounded.
+"""
+import os
+import time
+import heapq
+import hashlib
+import queue
+import resource
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from .readers import read_file_pages
+from .processing import split_text_chunks
+
+try:
+    from app.config import config
+except ImportError:
+    # Fallback
+    class TempConfig:
+        LOAD_READER_WORKERS = int(os.getenv("LOAD_READER_WORKERS", "0"))
+        LOAD_EMBED_BATCH_SIZE = int(os.getenv("LOAD_EMBED_BATCH_SIZE", "512"))
+        LOAD_ENCODE_BATCH_SIZE = int(os.getenv("LOAD_ENCODE_BATCH_SIZE", "64"))
+        LOAD_INSERT_BATCH_SIZE = int(os.getenv("LOAD_INSERT_BATCH_SIZE", "1000"))
+        LOAD_QUEUE_SIZE = int(os.getenv("LOAD_QUEUE_SIZE", "4"))
+        LOAD_INSERT_METHOD = os.getenv("LOAD_INSERT_METHOD", "copy")
+        LOAD_SLOW_FILE_SECONDS = float(os.getenv("LOAD_SLOW_FILE_SECONDS", "30"))
+    config = TempConfig()
+    logging.warning("Could not import app.config, using fallback for the ingestion pipeline settings.")
+
+# Configure basic logging for this module
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+CHUNK_SIZE = 150 # Words per chunk (word chunker fallback)
+CHUNK_OVERLAP = 20
+SLOWEST_FILES = 10 # Number of slowest files reported at the end of a run
+
+Row = Tuple[str, np.ndarray, str, str] # (chunk_text, embedding, category, source_path)
+Chunker = Callable[[Iterable[str]], List[str]] # Document sections (e.g. PDF pages) -> chunks
+TermCounter = Callable[[str], Dict[str, int]]
+FileCallback = Callable[[str, str, Optional[Dict[str, int]], List[str], str], None]
+
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of the file contents, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover_files(directory_path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (file_path, category) for every supported file in a category subdirectory."""
+    for root, _, files in os.walk(directory_path):
+        category = os.path.basename(root) # Use subdirectory name as category
+        if os.path.normpath(root) == os.path.normpath(directory_path): # Skip the root data directory itself
+            continue
+        for file_name in sorted(files):
+            if file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+                yield os.path.join(root, file_name), category
+
+
+def peak_rss_mib() -> Dict[str, float]:
+    """Peak resident memory of this process and of the largest finished child (the reader processes)."""
+    # ru_maxrss is in KiB on Linux
+    return {
+        "loader_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "largest_reader_mib": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def split_words(pages: Iterable[str]) -> List[str]:
+    """The word-count chunker, used when no token-aware chunker is configured."""
+    return split_text_chunks("\n".join(pages), chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+# Set in each reader process by _init_reader
+_chunk_pages: Chunker = split_words
+_count_terms: Optional[TermCounter] = None
+
+
+def _init_reader(chunker: Chunker, count_terms: Optional[TermCounter]) -> None:
+    global _chunk_pages, _count_terms
+    _chunk_pages = chunker
+    _count_terms = count_terms
+
+
+def parse_file(file_path: str) -> Tuple[bool, List[str], str, Optional[Dict[str, int]], float]:
+    """
+    Reads, hashes and chunks one file (runs in a pool worker).
+    Returns (read ok, chunks, content hash, term counts, seconds); term
+    counts are None unless run_pipeline was given count_terms.
+    """
+    start = time.perf_counter()
+    try:
+        digest = file_digest(file_path)
+        pages = read_file_pages(file_path)
+        if pages is None:
+            return False, [], digest, None, time.perf_counter() - start
+        term_counts = Counter() if _count_terms is not None else None
+        read_ok = True
+
+        def counted_pages() -> Iterator[str]:
+            nonlocal read_ok
+            for page in pages:
+                if term_counts is not None:
+                    term_counts.update(_count_terms(page))
+                yield page
+            read_ok = getattr(pages, "error", None) is None # A PDF that could not be opened
+
+        chunks = _chunk_pages(counted_pages())
+        return read_ok, chunks, digest, term_counts, time.perf_counter() - start
+    except Exception as e:
+        logging.exception(f"Unexpected error parsing '{file_path}': {e}")
+        return False, [], "", None, time.perf_counter() - start
+
+
+def _reader_worker_count() -> int:
+    workers = config.LOAD_READER_WORKERS
+    if workers <= 0:
+        workers = max(1, (os.cpu_count() or 2) - 1) # Leave a core for the embedding stage
+    return workers
+
+
+class _DatabaseWriter:
+    """Inserts embedded rows on a background thread, fed through a bounded queue."""
+
+    def __init__(self, insert_batch: Callable[[List[Row]], bool], max_pending_batches: int):
+        self._insert_batch = insert_batch
+        self._queue: "queue.Queue[Optional[List[Row]]]" = queue.Queue(maxsize=max(1, max_pending_batches))
+        self.inserted = 0
+        self.inserted_by_path: Counter = Counter() # source_path -> rows inserted
+        self.failed_batches = 0
+        self.seconds = 0.0 # Time spent inside insert_batch
+        self._thread: Optional[threading.Thread] = None # Started on the first batch
+
+    def _run(self) -> None:
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                return
+            start = time.perf_counter()
+            ok = self._insert_batch(rows)
+            self.seconds += time.perf_counter() - start
+            if ok:
+                self.inserted += len(rows)
+                self.inserted_by_path.update(row[3] for row in rows)
+            else:
+                self.failed_batches += 1
+
+    def put(self, rows: List[Row]) -> None:
+        """Queues rows for insertion; blocks while the queue is full (backpressure on embedding)."""
+        if not rows:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ingest-db-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(rows)
+
+    def close(self) -> None:
+        """Waits until every queued batch is written."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+
+def run_pipeline(files: Iterable[Tuple[str, str]],
+                 encode: Callable[[List[str], int], Optional[List[np.ndarray]]],
+                 insert_batch: Callable[[List[Row]], bool],
+                 on_file: Optional[FileCallback] = None,
+                 chunker: Optional[Chunker] = None,
+                 count_terms: Optional[TermCounter] = None) -> Dict[str, object]:
+    """
+    Runs the staged pipeline over (file_path, category) pairs, e.g. discover_files(DATA_DIR).
+
+    Args:
+        encode: Embeds a list of chunks with the given model batch size.
+        insert_batch: Writes a list of rows to the database, returns success.
+        on_file: If given, called on this thread as on_file(file_path, category,
+                 term_counts, chunks, content_hash) for every file that was
+                 read, before its chunks are embedded; term_counts is None
+                 on failure (or without count_terms, an empty dict).
+        chunker: Splits a document, given as an iterable of sections, into
+                 chunks in the reader processes (default: split_words).
+                 Handed over by fork, so it may hold a tokenizer.
+        count_terms: If given, term counts of each document are computed in
+                 the reader processes, page by page, for on_file.
+
+    Returns:
+        Counters: files, processed_files, failed_files, chunks (embedded),
+        failed_embedding_chunks, inserted, failed_insert_batches,
+        inserted_by_path: {file_path: rows inserted}, and slowest_files:
+        [(file_path, seconds)] of the slowest reads.
+
+    Memory is bounded by the pipeline settings, not the corpus size: at most
+    LOAD_QUEUE_SIZE files per reader in flight, LOAD_EMBED_BATCH_SIZE chunks
+    awaiting embedding and LOAD_QUEUE_SIZE + 1 insert batches of rows.
+    """
+    stats = {"files": 0, "processed_files": 0, "failed_files": 0, "chunks": 0,
+             "failed_embedding_chunks": 0, "inserted": 0, "failed_insert_batches": 0}
+    slowest: List[Tuple[float, str]] = [] # Min-heap of the SLOWEST_FILES slowest reads
+    reader_workers = _reader_worker_count()
+    max_in_flight = reader_workers * max(1, config.LOAD_QUEUE_SIZE)
+    embed_batch_size = max(1, config.LOAD_EMBED_BATCH_SIZE)
+    insert_batch_size = max(1, config.LOAD_INSERT_BATCH_SIZE)
+    logging.info(
+        f"Ingesting with {reader_workers} reader processes, embedding batches of "
+        f"{embed_batch_size} chunks, inserts of {insert_batch_size} rows."
+    )
+
+    # The readers are forked from a process that already holds the embedding
+    # model (with torch's thread pools), its fast tokenizer and the DB pool's
+    # sockets; they inherit all of it. The readers only use the chunker and
+    # never touch the model or the DB connections. The Rust tokenizer's own
+    # thread pool does not survive a fork, so it is switched off before the
+    # readers start (the embedding batches here are then tokenized
+    # sequentially). The writer thread and tqdm's monitor start after the
+    # first readers.
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    pool = ProcessPoolExecutor(
+        max_workers=reader_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_reader,
+        initargs=(chunker or split_words, count_terms),
+    )
+    file_iter = iter(files) # Consumed lazily, never held as a full list
+    in_flight = {}
+
+    def submit_more() -> None:
+        for file_path, category in file_iter:
+            in_flight[pool.submit(parse_file, file_path)] = (file_path, category)
+            stats["files"] += 1
+            if len(in_flight) >= max_in_flight:
+                break
+
+    submit_more()
+    writer = _DatabaseWriter(insert_batch, config.LOAD_QUEUE_SIZE)
+    pending_texts: List[str] = []
+    pending_categories: List[str] = []
+    pending_paths: List[str] = []
+    pending_rows: List[Row] = []
+    progress = tqdm(desc="Ingesting", unit="file")
+
+    def embed_pending() -> None:
+        if not pending_texts:
+            return
+        embeddings = encode(pending_texts, config.LOAD_ENCODE_BATCH_SIZE)
+        if embeddings is None or len(embeddings) != len(pending_texts):
+            logging.error(f"Embedding failed for a batch of {len(pending_texts)} chunks; skipping it.")
+            stats["failed_embedding_chunks"] += len(pending_texts)
+        else:
+            pending_rows.extend(zip(pending_texts, embeddings, pending_categories, pending_paths))
+            stats["chunks"] += len(pending_texts)
+            while len(pending_rows) >= insert_batch_size:
+                writer.put(pending_rows[:insert_batch_size])
+                del pending_rows[:insert_batch_size]
+        pending_texts.clear()
+        pending_categories.clear()
+        pending_paths.clear()
+
+    try:
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, category = in_flight.pop(future)
+                progress.update(1)
+                try:
+                    read_ok, chunks, content_hash, term_counts, seconds = future.result()
+                except Exception as e:
+                    logging.error(f"Reader process failed for '{file_path}': {e}")
+                    read_ok, chunks, content_hash, term_counts, seconds = False, [], "", None, 0.0
+                if seconds >= config.LOAD_SLOW_FILE_SECONDS:
+                    logging.warning(f"Slow file: reading and chunking '{file_path}' took {seconds:.1f}s.")
+                heapq.heappush(slowest, (seconds, file_path))
+                if len(slowest) > SLOWEST_FILES:
+                    heapq.heappop(slowest)
+                if on_file is not None:
+                    on_file(file_path, category, (dict(term_counts or {}) if read_ok else None), chunks, content_hash)
+                if not read_ok or not chunks:
+                    if read_ok:
+                        logging.warning(f"No valid chunks generated for file: {file_path}")
+                    stats["failed_files"] += 1
+                    continue
+                pending_texts.extend(chunks)
+                pending_categories.extend([category] * len(chunks))
+                pending_paths.extend([file_path] * len(chunks))
+                stats["processed_files"] += 1
+
+            submit_more() # Keep the readers busy while this thread embeds
+            if len(pending_texts) >= embed_batch_size:
+                embed_pending()
+
+        embed_pending()
+        writer.put(pending_rows)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        progress.close()
+        writer.close()
+
+    if not stats["files"]:
+        logging.warning("No files to ingest.")
+    stats["inserted"] = writer.inserted
+    stats["inserted_by_path"] = dict(writer.inserted_by_path)
+    stats["failed_insert_batches"] = writer.failed_batches
+    stats["slowest_files"] = [(path, round(seconds, 2)) for seconds, path in sorted(slowest, reverse=True)]
+    insert_rate = writer.inserted / writer.seconds if writer.seconds > 0 else 0.0
+    logging.info(
+        f"Ingestion finished. Processed files: {stats['processed_files']}, failed/skipped: {stats['failed_files']}, "
+        f"chunks: {stats['chunks']}, inserted rows: {stats['inserted']} ({insert_rate:.0f} rows/s in the writer), "
+        f"failed insert batches: {stats['failed_insert_batches']}"
+    )
+    if slowest:
+        logging.info("Slowest files to read: " + ", ".join(f"{os.path.basename(path)} {seconds}s" for path, seconds in stats["slowest_files"]))
+    return stats
@@ -1,6 +1,9 @@
 # load/processing.py
+import re
 import logging
-from typing import List
+from typing import Iterable, List, Optional
+
+import numpy as np
 
 # Configure basic logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -49,4 +52,175 @@ def split_text_chunks(text: str, chunk_size: int = 100, chunk_overlap: int = 10)
     # Filter out any potentially empty strings again just in case
     valid_chunks = [chunk for chunk in chunks if chunk]
     logging.info(f"Split text into {len(valid_chunks)} chunks (chunk_size={chunk_size}, overlap={chunk_overlap}).")
-    return valid_chunks
\ No newline at end of file
+    return valid_chunks
+
+
+# Strength of the boundary in front of a token, used to pick chunk ends
+_INSIDE_WORD, _WORD, _SENTENCE, _PARAGRAPH = 0, 1, 2, 3
+_SENTENCE_END = re.compile(r"[.!?\u3002\uff01\uff1f][\"'\u2019\u201d)\]]*$")
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n")
+_WHITESPACE = re.compile(r"\s")
+
+
+class TokenChunker:
+    """
+    Splits text into chunks measured in tokens of the embedding model, so
+    no chunk is silently truncated by the model's max sequence length.
+
+    Each document is tokenized once with a fast tokenizer (offsets
+    included). Chunks are cut at the strongest boundary in the second half
+    of the token budget: a paragraph break, else a sentence end, else a
+    word gap, else the budget itself. Consecutive chunks overlap by up to
+    overlap_tokens, starting at a sentence (or word) start. All chunks of a
+    document are then re-tokenized in one batched call and any chunk that
+    tokenizes longer than max_tokens on its own is cut again.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, overlap_tokens: int = 32, min_chunk_chars: int = 20):
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("TokenChunker needs a fast (Rust) tokenizer for offset mappings")
+        self.tokenizer = tokenizer
+        self.max_tokens = max(8, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 4))
+        self.min_chunk_chars = min_chunk_chars
+
+    def _offsets(self, text: str) -> np.ndarray:
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return np.asarray(encoding["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+
+    @staticmethod
+    def _boundary_levels(text: str, offsets: np.ndarray) -> np.ndarray:
+        """Boundary strength in front of each token (index 0 = start of text)."""
+        levels = np.full(len(offsets), _INSIDE_WORD, dtype=np.int8)
+        if not len(offsets):
+            return levels
+        levels[0] = _PARAGRAPH
+        for i in range(1, len(offsets)):
+            previous_end, start = offsets[i - 1][1], offsets[i][0]
+            gap = text[previous_end:start + 1] # Some tokenizers include the leading space in the token
+            if not _WHITESPACE.search(gap):
+                continue # Sub-word piece or attached punctuation
+            if _PARAGRAPH_BREAK.search(gap):
+                levels[i] = _PARAGRAPH
+            elif _SENTENCE_END.search(text[max(0, previous_end - 3):previous_end]):
+                levels[i] = _SENTENCE
+            else:
+                levels[i] = _WORD
+        return levels
+
+    def _chunk_spans(self, levels: np.ndarray, max_tokens: int) -> List[tuple]:
+        """Greedy (start, end) token spans of at most max_tokens tokens."""
+        spans = []
+        token_count = len(levels)
+        overlap_tokens = min(self.overlap_tokens, max_tokens // 4)
+        start = 0
+        while start < token_count:
+            limit = start + max_tokens
+            if limit >= token_count:
+                spans.append((start, token_count))
+                break
+            end = limit # Hard cut if no boundary is found
+            floor = start + max_tokens // 2
+            window = levels[floor + 1:limit + 1]
+            for level in (_PARAGRAPH, _SENTENCE, _WORD):
+                candidates = np.flatnonzero(window >= level)
+                if len(candidates):
+                    end = floor + 1 + int(candidates[-1])
+                    break
+            spans.append((start, end))
+
+            next_start = end
+            if overlap_tokens:
+                overlap = levels[end - overlap_tokens:end]
+                for level in (_SENTENCE, _WORD):
+                    candidates = np.flatnonzero(overlap >= level)
+                    if len(candidates):
+                        next_start = end - overlap_tokens + int(candidates[0])
+                        break
+            start = max(start + 1, next_start)
+        return spans
+
+    def _split(self, text: str, max_tokens: int) -> List[str]:
+        offsets = self._offsets(text)
+        if not len(offsets):
+            return []
+        spans = self._chunk_spans(self._boundary_levels(text, offsets), max_tokens)
+        return [text[offsets[start][0]:offsets[end - 1][1]].strip() for start, end in spans]
+
+    def __call__(self, text: str) -> List[str]:
+        if not text or not isinstance(text, str):
+            logging.warning("TokenChunker received invalid text input.")
+            return []
+        return self.chunk_pages([text])
+
+    def chunk_pages(self, pages: Iterable[str]) -> List[str]:
+        """
+        Chunks a document given as a stream of sections (e.g. PDF pages)
+        without joining it into one string. Sections are joined with a
+        newline as they arrive; every chunk but the last of the text seen so
+        far is final, and the last one is carried into the next section, so
+        the chunks are the same as for the joined text while only about one
+        section is held and re-tokenized at a time.
+        """
+        chunks = []
+        carry = ""
+        for page in pages:
+            if not page:
+                continue
+            text = f"{carry}\n{page}" if carry else page
+            offsets = self._offsets(text)
+            if not len(offsets):
+                continue
+            spans = self._chunk_spans(self._boundary_levels(text, offsets), self.max_tokens)
+            chunks.extend(text[offsets[start][0]:offsets[end - 1][1]].strip() for start, end in spans[:-1])
+            carry = text[offsets[spans[-1][0]][0]:]
+        if carry:
+            chunks.extend(self._split(carry, self.max_tokens))
+        chunks = [chunk for chunk in chunks if len(chunk) >= self.min_chunk_chars]
+        if not chunks:
+            return []
+
+        # A chunk can tokenize differently on its own than inside the document; re-check all at once
+        lengths = [len(ids) for ids in self.tokenizer(chunks, add_special_tokens=False, verbose=False)["input_ids"]]
+        fitted = []
+        for chunk, length in zip(chunks, lengths):
+            if length <= self.max_tokens:
+                fitted.append(chunk)
+            else:
+                fitted.extend(self._refit(chunk))
+        logging.info(f"Split text into {len(fitted)} chunks (max {self.max_tokens} tokens, overlap {self.overlap_tokens}).")
+        return fitted
+
+    def _refit(self, chunk: str) -> List[str]:
+        """Cuts an over-long chunk with a shrinking budget until every part fits, else by token ids."""
+        budget = self.max_tokens
+        while budget > 8:
+            budget -= max(1, budget // 16)
+            parts = [part for part in self._split(chunk, budget) if part]
+            lengths = [len(ids) for ids in self.tokenizer(parts, add_special_tokens=False, verbose=False)["input_ids"]]
+            if all(length <= self.max_tokens for length in lengths):
+                return [part for part in parts if len(part) >= self.min_chunk_chars]
+        # No boundary-based cut fits: cut by token ids so no text is lost to the model's truncation
+        logging.warning(f"Could not fit a chunk into {self.max_tokens} tokens at a boundary; cutting it by tokens.")
+        ids = self.tokenizer(chunk, add_special_tokens=False, verbose=False)["input_ids"]
+        parts = [
+            self.tokenizer.decode(ids[start:start + self.max_tokens], skip_special_tokens=True).strip()
+            for start in range(0, len(ids), self.max_tokens)
+        ]
+        return [part for part in parts if part]
+
+
+def create_token_chunker(model, max_tokens: int = 0, overlap_tokens: int = 32) -> Optional[TokenChunker]:
+    """
+    Builds a TokenChunker for a loaded SentenceTransformer. max_tokens 0
+    fills the model window (max_seq_length minus the special tokens the
+    model adds). Returns None if the model has no fast tokenizer.
+    """
+    try:
+        tokenizer = model.tokenizer
+        window = model.max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+        budget = min(max_tokens, window) if max_tokens > 0 else window
+        return TokenChunker(tokenizer, budget, overlap_tokens)
+    except Exception as e:
+        logging.warning(f"Token-aware chunking unavailable ({e}); falling back to word chunks.")
+        return None
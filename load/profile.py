@@ -0,0 +1,134 @@
+# load/profile.py
+import math
+import string
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    from app.config import config
+except ImportError:
+    # Fallback
+    import os
+    class TempConfig:
+        STOPWORDS_LNG = os.getenv("STOPWORDS_LNG", "english")
+        NLTK_DATA_PATH = os.getenv("NLTK_DATA", "/root/nltk_data")
+    config = TempConfig()
+    logging.warning("Could not import app.config, using fallback for STOPWORDS_LNG.")
+
+# Configure basic logging for this module
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+def _load_stopwords() -> set[str]:
+    """Returns NLTK stopwords if they are installed locally (no download is attempted)."""
+    try:
+        import nltk
+        from nltk.corpus import stopwords
+        nltk.data.path.append(config.NLTK_DATA_PATH)
+        return set(stopwords.words(config.STOPWORDS_LNG))
+    except Exception as e:
+        logging.info(f"NLTK stopwords unavailable ({e}); relying on IDF to suppress common words.")
+        return set()
+
+
+class CategoryProfileBuilder:
+    """
+    Accumulates per-category statistics during ingestion: term counts of the
+    extracted document text (all file formats), file and chunk counts, and
+    the sum of chunk embeddings. build() turns them into profiles with
+    discriminative keywords (TF-IDF with each category treated as one
+    document) and the mean embedding (centroid).
+    """
+
+    def __init__(self):
+        self._stopwords = _load_stopwords()
+        self._term_counts: Dict[str, Counter] = defaultdict(Counter)
+        self._file_counts: Counter = Counter()
+        self._chunk_counts: Counter = Counter()
+        self._embedding_sums: Dict[str, np.ndarray] = {}
+
+    def _tokenize(self, text: str) -> List[str]:
+        tokens = text.lower().translate(_PUNCTUATION_TABLE).split()
+        return [tok for tok in tokens if len(tok) > 2 and tok not in self._stopwords and not tok.isdigit()]
+
+    def count_terms(self, text: str) -> Counter:
+        """Term counts of one extracted document (what add_document adds)."""
+        return Counter(self._tokenize(text))
+
+    def add_document(self, category: str, text: str) -> None:
+        """Counts the terms of one extracted document."""
+        self._term_counts[category].update(self._tokenize(text))
+        self._file_counts[category] += 1
+
+    def add_category_stats(self, category: str, term_counts: Dict[str, int], file_count: int,
+                           chunk_count: int, centroid: Optional[np.ndarray]) -> None:
+        """
+        Adds aggregated statistics of already stored documents (see
+        load.database.load_stored_category_stats), so profiles can be rebuilt
+        without re-reading the files.
+        """
+        self._term_counts[category].update(term_counts)
+        self._file_counts[category] += file_count
+        if chunk_count and centroid is not None:
+            batch_sum = np.asarray(centroid, dtype=np.float64) * chunk_count
+            if category in self._embedding_sums:
+                self._embedding_sums[category] += batch_sum
+            else:
+                self._embedding_sums[category] = batch_sum
+            self._chunk_counts[category] += chunk_count
+
+    def add_embeddings(self, category: str, embeddings) -> None:
+        """Adds chunk embeddings (a list of vectors or a 2-D array) to the category centroid."""
+        if embeddings is None or len(embeddings) == 0:
+            return
+        batch_sum = np.asarray(embeddings, dtype=np.float64).sum(axis=0)
+        if category in self._embedding_sums:
+            self._embedding_sums[category] += batch_sum
+        else:
+            self._embedding_sums[category] = batch_sum
+        self._chunk_counts[category] += len(embeddings)
+
+    def build(self, top_k: int = 10) -> List[dict]:
+        """Returns one profile dict per category: category, keywords, file_count, chunk_count, centroid."""
+        categories = sorted(set(self._term_counts) | set(self._chunk_counts))
+        category_count = len(categories)
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts.values():
+            document_frequency.update(counts.keys())
+
+        profiles = []
+        for category in categories:
+            counts = self._term_counts.get(category, Counter())
+            total_terms = sum(counts.values()) or 1
+            if category_count > 1:
+                # Terms that occur in every category get idf = 0 and are never keywords
+                scored = {
+                    term: (count / total_terms) * math.log(category_count / document_frequency[term])
+                    for term, count in counts.items()
+                }
+            else:
+                scored = {term: count / total_terms for term, count in counts.items()}
+            keywords = [term for term, score in sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+                        if score > 0][:top_k]
+
+            centroid: Optional[np.ndarray] = None
+            chunk_count = self._chunk_counts.get(category, 0)
+            if chunk_count:
+                centroid = (self._embedding_sums[category] / chunk_count).astype(np.float32)
+
+            profiles.append({
+                "category": category,
+                "keywords": keywords,
+                "file_count": self._file_counts.get(category, 0),
+                "chunk_count": chunk_count,
+                "centroid": centroid,
+            })
+            logging.debug(f"Profile for '{category}': {chunk_count} chunks, keywords {keywords}")
+
+        logging.info(f"Built category profiles for {len(profiles)} categories.")
+        return profiles
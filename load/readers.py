@@ -1,15 +1,11 @@
 # load/readers.py
 import os
 import logging
-from typing import Optional
+from typing import Iterable, Optional
 
-# Gerekli kütüphaneleri import et (requirements.txt içinde olmalı)
-try:
-    from PyPDF2 import PdfReader
-except ImportError:
-    logging.error("PyPDF2 library not found. Please install it: pip install pypdf2")
-    PdfReader = None # Hata durumunda None ata
+from .pdf_extract import PdfExtraction
 
+# Gerekli kütüphaneleri import et (requirements.txt içinde olmalı)
 try:
     from docx import Document
 except ImportError:
@@ -20,39 +16,26 @@ except ImportError:
 # Configure basic logging for this module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def read_pdf(file_path: str) -> Optional[str]:
-    """Reads and extracts text content from a PDF file."""
-    if not PdfReader: # Kütüphane yüklenememişse çalışma
-        logging.error("PDF reading skipped because PyPDF2 library is missing.")
-        return None
-    try:
-        logging.debug(f"Reading PDF: {file_path}")
-        reader = PdfReader(file_path)
-        # reader.pages boşsa veya text extract edilemezse hata vermemeli
-        if not reader.pages:
-             logging.warning(f"PDF file has no pages or is unreadable: {file_path}")
-             return None
-
-        text_content = "\n".join(
-            page.extract_text() or "" # Sayfa boşsa veya text yoksa boş string döndür
-            for page in reader.pages
-        ).strip() # Başındaki/sonundaki boşlukları temizle
-
-        if not text_content:
+def read_pdf(file_path: str, empty_ok: bool = False) -> Optional[str]:
+    """
+    Reads and extracts text content from a PDF file (see load.pdf_extract).
+    A file without text gives None, or "" with empty_ok (so it can be told
+    apart from an error).
+    """
+    extraction = PdfExtraction(file_path)
+    text_content = "\n".join(extraction).strip()
+    if not text_content:
+        if extraction.error is None:
             logging.warning(f"No text could be extracted from PDF: {file_path}")
-            return None
-        logging.debug(f"Successfully extracted text from PDF: {file_path}")
-        return text_content
-    except FileNotFoundError:
-        logging.error(f"PDF file not found: {file_path}")
-        return None
-    except Exception as e:
-        # PyPDF2 bazen şifreli veya bozuk PDF'lerde hata verebilir
-        logging.exception(f"Error reading PDF file '{file_path}': {e}")
+            return "" if empty_ok else None
         return None
+    return text_content
 
-def read_docx(file_path: str) -> Optional[str]:
-    """Reads and extracts text content from a DOCX file."""
+def read_docx(file_path: str, empty_ok: bool = False) -> Optional[str]:
+    """
+    Reads and extracts text content from a DOCX file. A file without text
+    gives None, or "" with empty_ok (so it can be told apart from an error).
+    """
     if not Document: # Kütüphane yüklenememişse çalışma
         logging.error("DOCX reading skipped because python-docx library is missing.")
         return None
@@ -67,7 +50,7 @@ def read_docx(file_path: str) -> Optional[str]:
 
         if not text_content:
             logging.warning(f"No text could be extracted from DOCX: {file_path}")
-            return None
+            return "" if empty_ok else None
         logging.debug(f"Successfully extracted text from DOCX: {file_path}")
         return text_content
     except FileNotFoundError:
@@ -78,15 +61,18 @@ def read_docx(file_path: str) -> Optional[str]:
         logging.exception(f"Error reading DOCX file '{file_path}': {e}")
         return None
 
-def read_txt(file_path: str) -> Optional[str]:
-    """Reads and returns the content of a TXT file."""
+def read_txt(file_path: str, empty_ok: bool = False) -> Optional[str]:
+    """
+    Reads and returns the content of a TXT file. An empty file gives None,
+    or "" with empty_ok (so it can be told apart from an error).
+    """
     try:
         logging.debug(f"Reading TXT: {file_path}")
         with open(file_path, "r", encoding="utf-8") as f:
             content = f.read().strip() # Başındaki/sonundaki boşlukları temizle
             if not content:
                 logging.warning(f"TXT file is empty: {file_path}")
-                return None
+                return "" if empty_ok else None
             logging.debug(f"Successfully read TXT file: {file_path}")
             return content
     except FileNotFoundError:
@@ -96,8 +82,8 @@ def read_txt(file_path: str) -> Optional[str]:
         logging.exception(f"Error reading TXT file '{file_path}': {e}")
         return None
 
-def read_file(file_path: str) -> Optional[str]:
-    """Detects file type based on extension and calls the appropriate reader function."""
+def _file_extension(file_path: str) -> Optional[str]:
+    """Lower-case extension of an existing file, None (logged) if the path is unusable."""
     if not isinstance(file_path, str) or not file_path:
          logging.error(f"Invalid file path provided: {file_path}")
          return None
@@ -112,19 +98,56 @@ def read_file(file_path: str) -> Optional[str]:
     # Dosya uzantısını al ve küçük harfe çevir
     try:
         _, file_ext = os.path.splitext(file_path)
-        file_ext = file_ext.lower()
+        return file_ext.lower()
     except Exception as e:
          logging.error(f"Could not determine file extension for {file_path}: {e}")
          return None
 
+def read_file(file_path: str, empty_ok: bool = False) -> Optional[str]:
+    """
+    Detects file type based on extension and calls the appropriate reader
+    function. With empty_ok, a readable file without text gives "" instead
+    of None.
+    """
+    file_ext = _file_extension(file_path)
+    if file_ext is None:
+        return None
+
+    logging.info(f"Attempting to read file: '{os.path.basename(file_path)}' (Extension: '{file_ext}')")
+
+    if file_ext == '.pdf':
+        return read_pdf(file_path, empty_ok)
+    elif file_ext == '.docx':
+        return read_docx(file_path, empty_ok)
+    elif file_ext == '.txt':
+        return read_txt(file_path, empty_ok)
+    else:
+        logging.warning(f"Unsupported file type skipped: '{file_path}'")
+        return None
+
+def read_file_pages(file_path: str) -> Optional[Iterable[str]]:
+    """
+    Like read_file, but returns the text as a lazy sequence of sections: the
+    pages of a PDF as they are extracted, the whole text of other files.
+    A PdfExtraction is returned for PDFs, so its timing can be read after
+    iterating. None if the file cannot be read; a file without text gives
+    no sections.
+    """
+    file_ext = _file_extension(file_path)
+    if file_ext is None:
+        return None
+
     logging.info(f"Attempting to read file: '{os.path.basename(file_path)}' (Extension: '{file_ext}')")
 
     if file_ext == '.pdf':
-        return read_pdf(file_path)
+        return PdfExtraction(file_path)
     elif file_ext == '.docx':
-        return read_docx(file_path)
+        content = read_docx(file_path, empty_ok=True)
     elif file_ext == '.txt':
-        return read_txt(file_path)
+        content = read_txt(file_path, empty_ok=True)
     else:
         logging.warning(f"Unsupported file type skipped: '{file_path}'")
-        return None
\ No newline at end of file
+        return None
+    if content is None:
+        return None
+    return [content] if content else []
@@ -0,0 +1,94 @@
+# load/sync.py
+"""
+Change detection for the incremental corpus sync.
+
+The source_file table is a manifest of every ingested file: path, category,
+size, mtime and SHA-256 of the contents. plan_sync() compares DATA_DIR with
+it. A file whose size and mtime match its manifest entry is unchanged and is
+not even read. A file whose stat differs is hashed; if only the stat changed
+(e.g. a copy or `touch`), just the manifest is updated. Everything else is
+new or changed and goes through the pipeline again. Manifest entries without
+a file on disk are deletions. A file that is listed but cannot be stat'ed
+or hashed right now is left as it is (chunks and manifest entry kept) and
+looked at again on the next run.
+"""
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from .pipeline import discover_files, file_digest
+
+# Configure basic logging for this module
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SyncPlan:
+    """The work an incremental sync has to do."""
+
+    def __init__(self):
+        self.to_process: List[Tuple[str, str]] = [] # (path, category) of new and changed files
+        self.changed: List[str] = [] # Paths of changed files (their old chunks are replaced)
+        self.deleted: List[str] = [] # Paths in the manifest that no longer exist
+        self.touched: List[dict] = [] # Manifest updates for files with a new stat but the same contents
+        self.unchanged = 0
+        self.skipped = 0 # Files that could not be stat'ed or hashed; kept as they are
+        self.file_stats: Dict[str, Tuple[int, float]] = {} # path -> (size, mtime) as seen while planning
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.to_process or self.deleted)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.to_process) - len(self.changed)} new, {len(self.changed)} changed, "
+            f"{len(self.deleted)} deleted, {self.unchanged + len(self.touched)} unchanged, "
+            f"{self.skipped} skipped files"
+        )
+
+
+def _stat(file_path: str) -> Optional[Tuple[int, float]]:
+    try:
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime
+    except OSError as e:
+        logging.warning(f"Cannot stat '{file_path}', skipping it: {e}")
+        return None
+
+
+def plan_sync(directory_path: str, manifest: Dict[str, dict]) -> SyncPlan:
+    """
+    Compares the files under directory_path with the manifest ({path: entry},
+    see load.database.load_manifest) and returns the resulting SyncPlan.
+    """
+    plan = SyncPlan()
+    seen = set()
+    for file_path, category in discover_files(directory_path):
+        seen.add(file_path) # Listed files are never deletions, even if they cannot be read right now
+        file_stat = _stat(file_path)
+        if file_stat is None:
+            plan.skipped += 1
+            continue
+        plan.file_stats[file_path] = file_stat
+        entry = manifest.get(file_path)
+        if entry is None or entry["category"] != category:
+            plan.to_process.append((file_path, category))
+            if entry is not None:
+                plan.changed.append(file_path)
+            continue
+        if (entry["size"], entry["mtime"]) == file_stat:
+            plan.unchanged += 1
+            continue
+        try:
+            content_hash = file_digest(file_path)
+        except OSError as e:
+            logging.warning(f"Cannot hash '{file_path}', skipping it: {e}")
+            plan.skipped += 1
+            continue
+        if content_hash == entry["content_hash"]:
+            plan.touched.append({"path": file_path, "size": file_stat[0], "mtime": file_stat[1]})
+        else:
+            plan.to_process.append((file_path, category))
+            plan.changed.append(file_path)
+
+    plan.deleted = sorted(path for path in manifest if path not in seen)
+    return plan
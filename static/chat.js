@@ -447,6 +447,90 @@ function addMessageToChat(role, text) {
   return messageElement;
 }
 
+// Function to show a chat error and drop the user message that caused it
+function handleChatError(errorText) {
+  // MODIFIED: Use currentActiveSettings for error translation
+  const errorPrefix = translations[currentActiveSettings.language].error;
+  const errorMessage = `${errorPrefix}${errorText}`;
+  const errorDiv = addMessageToChat('error', errorMessage); // addMessageToChat handles settings
+  errorDiv.classList.add('error-message');
+  const chatHistory = JSON.parse(localStorage.getItem("chatHistory") || "[]");
+  chatHistory.pop(); // Remove user message that led to error
+  localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
+  showNotification(errorMessage, 'error');
+}
+
+// Function to read a Server-Sent Events stream from /chat and render tokens as they arrive
+async function readChatStream(response, thinkingDiv) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let responseText = '';
+  let liveDiv = null;
+  let renderPending = false;
+
+  const render = () => {
+    renderPending = false;
+    if (liveDiv) {
+      liveDiv.innerHTML = markdownToHtml(responseText);
+      scrollToBottom();
+    }
+  };
+
+  const handleEvent = (eventName, data) => {
+    if (eventName === 'token') {
+      if (!liveDiv) {
+        // Replace the "thinking" indicator with the message being streamed
+        if (thinkingDiv && thinkingDiv.parentNode) thinkingDiv.parentNode.removeChild(thinkingDiv);
+        liveDiv = appendMessage('bot', '', null, currentActiveSettings);
+      }
+      responseText += data.content;
+      if (!renderPending) {
+        renderPending = true;
+        requestAnimationFrame(render);
+      }
+    } else if (eventName === 'done') {
+      if (liveDiv && liveDiv.parentNode) liveDiv.parentNode.removeChild(liveDiv);
+      if (thinkingDiv && thinkingDiv.parentNode) thinkingDiv.parentNode.removeChild(thinkingDiv);
+      liveDiv = null;
+      addMessageToChat('bot', data.response || responseText); // Persist the final message with a timestamp
+      console.debug('Chat timings:', data.timings);
+    } else if (eventName === 'error') {
+      if (liveDiv && liveDiv.parentNode) liveDiv.parentNode.removeChild(liveDiv);
+      if (thinkingDiv && thinkingDiv.parentNode) thinkingDiv.parentNode.removeChild(thinkingDiv);
+      liveDiv = null;
+      handleChatError(data.error);
+    }
+  };
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE frames are separated by a blank line
+    let separatorIndex;
+    while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, separatorIndex);
+      buffer = buffer.slice(separatorIndex + 2);
+
+      let eventName = 'message';
+      const dataLines = [];
+      frame.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+      });
+      if (dataLines.length) handleEvent(eventName, JSON.parse(dataLines.join('\n')));
+    }
+  }
+
+  // Stream ended without a final event (e.g. connection dropped)
+  if (liveDiv) {
+    liveDiv.parentNode.removeChild(liveDiv);
+    addMessageToChat('bot', responseText);
+  }
+}
+
 // Function to send a message
 async function sendMessage() {
   const messageInput = document.getElementById('message');
@@ -475,35 +559,39 @@ async function sendMessage() {
     
     const response = await fetch('/chat', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream, application/json' },
       // MODIFIED: Pass currentActiveSettings.language to API
       body: JSON.stringify({
         messages: chatHistory,
         message: message,
-        language: currentActiveSettings.language || 'tr'
+        language: currentActiveSettings.language || 'tr',
+        stream: true
       })
     });
 
-    if (thinkingDiv && thinkingDiv.parentNode) {
-      thinkingDiv.parentNode.removeChild(thinkingDiv);
-    }
-
     if (!response.ok) {
+      if (thinkingDiv && thinkingDiv.parentNode) thinkingDiv.parentNode.removeChild(thinkingDiv);
       throw new Error(`HTTP error! status: ${response.status}`);
     }
 
+    const contentType = response.headers.get('Content-Type') || '';
+    if (contentType.includes('text/event-stream') && response.body) {
+      await readChatStream(response, thinkingDiv);
+      const chatContainer = document.getElementById('chat');
+      const wasAtBottom = chatContainer.scrollHeight - chatContainer.scrollTop === chatContainer.clientHeight;
+      if (wasAtBottom) scrollToBottom(); else showScrollButton();
+      return;
+    }
+
+    // Non-streamed reply (e.g. insufficient context)
+    if (thinkingDiv && thinkingDiv.parentNode) {
+      thinkingDiv.parentNode.removeChild(thinkingDiv);
+    }
+
     const data = await response.json();
     
     if (data.error) {
-      // MODIFIED: Use currentActiveSettings for error translation
-      const errorPrefix = translations[currentActiveSettings.language].error;
-      const errorMessage = `${errorPrefix}${data.error}`;
-      const errorDiv = addMessageToChat('error', errorMessage); // addMessageToChat handles settings
-      errorDiv.classList.add('error-message');
-      const chatHistory = JSON.parse(localStorage.getItem("chatHistory") || "[]");
-      chatHistory.pop(); // Remove user message that led to error
-      localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
-      showNotification(errorMessage, 'error');
+      handleChatError(data.error);
     } else {
       addMessageToChat('bot', data.response); // addMessageToChat handles settings
       const chatContainer = document.getElementById('chat');
@@ -513,15 +601,7 @@ async function sendMessage() {
   } catch (error) {
     if (thinkingDiv && thinkingDiv.parentNode) thinkingDiv.parentNode.removeChild(thinkingDiv);
     console.error('Error:', error);
-    // MODIFIED: Use currentActiveSettings for error translation
-    const errorPrefix = translations[currentActiveSettings.language].error;
-    const errorMessage = `${errorPrefix}${error.message}`;
-    const errorDiv = addMessageToChat('error', errorMessage); // addMessageToChat handles settings
-    errorDiv.classList.add('error-message');
-    showNotification(errorMessage, 'error');
-    const chatHistory = JSON.parse(localStorage.getItem("chatHistory") || "[]");
-    chatHistory.pop();
-    localStorage.setItem("chatHistory", JSON.stringify(chatHistory));
+    handleChatError(error.message);
   } finally {
     messageInput.disabled = false;
     sendBtn.disabled = false;
@@ -0,0 +1,62 @@
+# tests/test_batching.py
+import threading
+
+import pytest
+
+from app.batching import MicroBatcher
+
+
+class RecordingBatchFn:
+    """Doubles each item; fails batches containing `fail_on`."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, items):
+        self.release.wait(5)
+        self.batches.append(list(items))
+        if self.fail_on in items:
+            raise ValueError(f"bad item {self.fail_on}")
+        return [item * 2 for item in items]
+
+
+def test_concurrent_items_share_a_batch_and_get_their_own_results():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6]
+    assert batch_fn.batches == [[0, 1, 2, 3]]
+    assert batcher.stats()["batch_size_histogram"] == {"3-4": 1}
+
+
+def test_batches_are_capped_at_max_batch_size():
+    batch_fn = RecordingBatchFn()
+    batch_fn.release.clear() # Hold the worker so all items are queued first
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=2, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(5)]
+    batch_fn.release.set()
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6, 8]
+    assert all(len(batch) <= 2 for batch in batch_fn.batches)
+    assert batcher.stats()["items"] == 5
+
+
+def test_a_failed_batch_raises_in_every_caller_and_the_worker_keeps_running():
+    batch_fn = RecordingBatchFn(fail_on=1)
+    batcher = MicroBatcher("test", batch_fn, max_batch_size=8, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="bad item 1"):
+            future.result(5)
+    assert batcher.stats()["errors"] == 1
+    assert batcher(5, timeout=5) == 10
+
+
+def test_a_result_count_mismatch_fails_the_whole_batch():
+    batcher = MicroBatcher("test", lambda items: items[:-1], max_batch_size=8, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="2 items"):
+            future.result(5)
@@ -0,0 +1,110 @@
+# tests/test_caches.py
+from types import SimpleNamespace
+
+import pytest
+
+from app import cache, response_store
+from app.cache import TTLCache
+from app.response_store import ResponseStore, make_response_key
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=fake))
+    monkeypatch.setattr(response_store, "time", SimpleNamespace(time=fake))
+    return fake
+
+
+def test_ttl_cache_evicts_the_least_recently_used_entry():
+    lru = TTLCache(maxsize=2, ttl=0)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1 # "b" is now the least recently used
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert lru.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries(clock):
+    lru = TTLCache(maxsize=10, ttl=30)
+    lru.set("a", 1)
+    clock.now += 29
+    assert lru.get("a") == 1
+    clock.now += 2
+    assert lru.get("a", "missing") == "missing"
+    assert len(lru) == 0
+    assert (lru.hits, lru.misses) == (1, 1)
+
+
+def test_ttl_cache_with_no_size_stores_nothing():
+    lru = TTLCache(maxsize=0, ttl=60)
+    lru.set("a", 1)
+    assert lru.get("a") is None
+
+
+def make_store(tmp_path, max_bytes=1_000_000, ttl=0):
+    return ResponseStore(str(tmp_path / "cache" / "responses.sqlite3"), max_bytes=max_bytes, ttl=ttl)
+
+
+def test_response_key_depends_on_every_input():
+    key = make_response_key("question", "en", "model", "context")
+    assert key == make_response_key("question", "en", "model", "context")
+    assert key != make_response_key("question", "de", "model", "context")
+    assert key != make_response_key("question", "en", "other-model", "context")
+    assert key != make_response_key("question", "en", "model", "other context")
+
+
+def test_response_store_round_trip(tmp_path, clock):
+    store = make_store(tmp_path)
+    assert store.get("key") is None
+    store.set("key", "answer")
+    assert store.get("key") == "answer"
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_response_store_expires_entries(tmp_path, clock):
+    store = make_store(tmp_path, ttl=60)
+    store.set("key", "answer")
+    clock.now += 61
+    assert store.get("key") is None
+    assert store.stats()["size"] == 0
+
+
+def test_response_store_evicts_least_recently_used_rows_beyond_the_cap(tmp_path, clock):
+    answer = "x" * 97 # 100 bytes per row with the 3-character key
+    store = make_store(tmp_path, max_bytes=1000)
+    for i in range(20):
+        store.set(f"{i:03d}", answer)
+        clock.now += 1
+    clock.now += 100
+    assert store.get("000") == answer # Refreshes the access time of the oldest row
+    store.set("020", answer) # Every 20th insert checks the total size
+
+    kept = {f"{i:03d}" for i in range(21) if store.get(f"{i:03d}") is not None}
+    assert "000" in kept and "020" in kept
+    assert len(kept) * 100 <= 900 # Trimmed to 90% of the cap
+    assert not {f"{i:03d}" for i in range(1, 13)} & kept # Oldest accessed rows go first
+    assert store.evictions == 21 - len(kept)
+
+
+def test_response_store_skips_responses_larger_than_the_cap(tmp_path, clock):
+    store = make_store(tmp_path, max_bytes=50)
+    store.set("key", "x" * 100)
+    assert store.get("key") is None
+
+
+def test_disabled_response_store_never_hits(tmp_path):
+    store = ResponseStore("", max_bytes=1000, ttl=0)
+    store.set("key", "answer")
+    assert store.get("key") is None
+    assert not (tmp_path / "cache").exists()
@@ -0,0 +1,111 @@
+# tests/test_context_builder.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import context_builder
+from app.config import config
+from app.context_builder import assemble_context
+
+
+@pytest.fixture(autouse=True)
+def context_settings(monkeypatch):
+    settings = {
+        "CONTEXT_TOKEN_BUDGET": 1000,
+        "CONTEXT_CHARS_PER_TOKEN": 4.0,
+        "CONTEXT_MMR_LAMBDA": 0.7,
+        "CONTEXT_DUPLICATE_SIMILARITY": 0.95,
+        "CONTEXT_MIN_OVERLAP_WORDS": 3,
+        "OLLAMA_NUM_CTX": 8192,
+        "OLLAMA_NUM_PREDICT": 512,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setitem(context_builder._prompt_tokens, "en", 200) # No prompt files needed
+
+
+QUERY = SimpleNamespace(query="question", embedding=None)
+
+
+def chunk(chunk_id, content, score, embedding=None):
+    return {"id": chunk_id, "content": content, "score": score, "embedding": embedding}
+
+
+def contents(chunks):
+    return [item["content"] for item in chunks]
+
+
+def test_nothing_retrieved_gives_no_context():
+    assert assemble_context([], QUERY, "en") == []
+
+
+def test_identical_and_contained_chunks_are_dropped_in_favour_of_the_more_relevant():
+    chunks = [
+        chunk(1, "The pump must be primed before the first start.", 0.5),
+        chunk(2, "the pump must be PRIMED before the first start.", 0.9),
+        chunk(3, "Before the first start. Check the oil level.", 0.4),
+        chunk(4, "primed before", 0.8),
+    ]
+    assert [item["id"] for item in assemble_context(chunks, QUERY, "en")] == [2, 3]
+
+
+def test_chunks_with_near_identical_embeddings_are_duplicates():
+    chunks = [
+        chunk(1, "Reset the controller by holding the button.", 0.9, [1.0, 0.0]),
+        chunk(2, "Hold the button to reset the controller unit.", 0.8, [0.999, 0.01]),
+        chunk(3, "The warranty covers parts for two years.", 0.7, [0.0, 1.0]),
+    ]
+    assert [item["id"] for item in assemble_context(chunks, QUERY, "en")] == [1, 3]
+
+
+def test_text_repeated_from_a_picked_chunk_is_trimmed():
+    chunks = [
+        chunk(1, "Open the valve. Then wait until the pressure gauge shows two bar.", 0.9),
+        chunk(2, "until the pressure gauge shows two bar. Finally close the lid.", 0.8),
+    ]
+    assert contents(assemble_context(chunks, QUERY, "en")) == [
+        "Open the valve. Then wait until the pressure gauge shows two bar.",
+        "Finally close the lid.",
+    ]
+    assert context_builder.get_context_stats()["overlaps_trimmed"] >= 1
+
+
+@pytest.mark.parametrize("min_words", [0, -1])
+def test_a_minimum_overlap_below_one_still_trims(monkeypatch, min_words):
+    monkeypatch.setattr(config, "CONTEXT_MIN_OVERLAP_WORDS", min_words)
+    chunks = [
+        chunk(1, "Open the valve and wait for the gauge.", 0.9),
+        chunk(2, "gauge. Finally close the lid and step back.", 0.8),
+        chunk(3, "Nothing in common with the others here.", 0.7),
+    ]
+    assert contents(assemble_context(chunks, QUERY, "en")) == [
+        "Open the valve and wait for the gauge.",
+        "Finally close the lid and step back.",
+        "Nothing in common with the others here.",
+    ]
+
+
+def test_chunks_beyond_the_budget_are_skipped_for_smaller_ones(monkeypatch):
+    monkeypatch.setattr(config, "CONTEXT_TOKEN_BUDGET", 30) # About 120 characters
+    chunks = [
+        chunk(1, "A" * 80, 0.9),
+        chunk(2, "B" * 80, 0.8),
+        chunk(3, "Small fitting chunk.", 0.7),
+    ]
+    assert [item["id"] for item in assemble_context(chunks, QUERY, "en")] == [1, 3]
+
+
+def test_the_best_chunk_is_cut_to_the_budget_when_it_alone_is_too_long(monkeypatch):
+    monkeypatch.setattr(config, "CONTEXT_TOKEN_BUDGET", 5) # About 20 characters
+    picked = assemble_context([chunk(1, "one two three four five six seven eight nine", 0.9)], QUERY, "en")
+    assert contents(picked) == ["one two three four"]
+
+
+def test_relevance_falls_back_to_the_query_embedding():
+    query = SimpleNamespace(query="question", embedding=np.array([0.0, 1.0]))
+    chunks = [
+        {"id": 1, "content": "Unrelated text about the warranty terms.", "embedding": [1.0, 0.0]},
+        {"id": 2, "content": "Text that answers the question asked here.", "embedding": [0.1, 1.0]},
+    ]
+    assert [item["id"] for item in assemble_context(chunks, query, "en")] == [2, 1]
@@ -0,0 +1,55 @@
+# tests/test_copy_encoding.py
+import struct
+
+import numpy as np
+
+from load.database import _copy_binary_payload
+
+
+def parse_copy(payload: bytes):
+    """Decodes a binary COPY stream of (text, vector, text, text) rows."""
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00")
+    flags, extension = struct.unpack_from("!ii", payload, 11)
+    assert (flags, extension) == (0, 0)
+    offset = 19
+    rows = []
+    while True:
+        (field_count,) = struct.unpack_from("!h", payload, offset)
+        offset += 2
+        if field_count == -1:
+            assert offset == len(payload)
+            return rows
+        assert field_count == 4
+        fields = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from("!i", payload, offset)
+            offset += 4
+            fields.append(None if length == -1 else payload[offset:offset + length])
+            offset += max(length, 0)
+        content, vector, category, source_path = fields
+        dim, unused = struct.unpack_from("!hh", vector)
+        assert unused == 0 and len(vector) == 4 + 4 * dim
+        rows.append((
+            content.decode("utf-8"),
+            np.frombuffer(vector, dtype=">f4", offset=4),
+            category.decode("utf-8"),
+            None if source_path is None else source_path.decode("utf-8"),
+        ))
+
+
+def test_rows_round_trip_through_the_binary_copy_format():
+    rows = [
+        ("first chunk", np.array([0.5, -1.25, 3.0], dtype=np.float32), "manuals", "/data/manuals/a.pdf"),
+        ("zweiter Abschnitt – äöü", np.array([1e-8, 0.0, -2.5], dtype=np.float64), "faq", None),
+    ]
+    decoded = parse_copy(_copy_binary_payload(rows).getvalue())
+    assert len(decoded) == 2
+    for (content, embedding, category, source_path), row in zip(rows, decoded):
+        assert row[0] == content
+        np.testing.assert_array_equal(row[1], embedding.astype(np.float32))
+        assert row[2:] == (category, source_path)
+
+
+def test_vectors_are_big_endian_float4():
+    payload = _copy_binary_payload([("text", np.array([1.0], dtype=np.float32), "c", "p")]).getvalue()
+    assert struct.pack("!ihhf", 8, 1, 0, 1.0) in payload
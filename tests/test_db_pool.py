@@ -0,0 +1,139 @@
+# tests/test_db_pool.py
+import os
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from app import db
+from app.config import config
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.connection.executed.append(sql)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every connection the pool opens, in order."""
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(db.psycopg2, "connect", connect)
+    return opened
+
+
+def make_pool(**overrides):
+    settings = dict(min_size=0, max_size=2, max_lifetime=0, health_check_interval=60, acquire_timeout=0.05)
+    settings.update(overrides)
+    return db.ConnectionPool(**settings)
+
+
+def test_reuses_the_most_recently_returned_connection(connections):
+    pool = make_pool()
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    pool.putconn(second)
+    assert pool.getconn() is second
+    assert len(connections) == 2
+
+
+def test_recycles_connections_older_than_max_lifetime(connections):
+    pool = make_pool(max_lifetime=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    pool._info[id(conn)].created_at -= 61
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["connections_recycled"] == 1
+
+
+def test_discards_idle_connections_that_fail_the_health_check(connections):
+    pool = make_pool(health_check_interval=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["failed_health_checks"] == 1
+
+
+def test_times_out_when_all_connections_are_in_use(connections):
+    pool = make_pool(max_size=1)
+    pool.getconn()
+    with pytest.raises(db.PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_operational_error_discards_the_connection(connections):
+    pool = make_pool()
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            raise psycopg2.OperationalError("connection lost")
+    assert conn.closed
+    assert pool.stats()["open"] == 0
+    pool.getconn() # The slot was released
+    pool.getconn()
+
+
+def test_prepares_each_statement_once_per_connection(connections):
+    pool = make_pool()
+    pool.register_prepared_statement("lookup", ["int"], "SELECT $1")
+    conn = pool.getconn()
+    cur = conn.cursor()
+    pool.execute_prepared(cur, "lookup", [1])
+    pool.execute_prepared(cur, "lookup", [2])
+    assert [sql for sql in conn.executed if sql.startswith("PREPARE")] == ["PREPARE lookup (int) AS SELECT $1"]
+    assert conn.executed.count("EXECUTE lookup (%s)") == 2
+
+
+def test_a_pool_inherited_across_fork_is_replaced_but_not_closed(connections, monkeypatch):
+    monkeypatch.setattr(config, "DB_POOL_MIN_SIZE", 1)
+    inherited = make_pool(min_size=1)
+    monkeypatch.setattr(db, "_pool", inherited)
+    monkeypatch.setattr(db, "_pool_pid", os.getpid() + 1) # Created by the parent process
+
+    pool = db.get_pool()
+    assert pool is not inherited
+    assert db.get_pool() is pool
+    assert not connections[0].closed # The parent still uses this socket
+    assert db.get_pool_stats()["pid"] == os.getpid()
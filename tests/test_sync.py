@@ -0,0 +1,140 @@
+# tests/test_sync.py
+import os
+
+import pytest
+
+from load import main, sync
+from load.pipeline import file_digest
+from load.sync import plan_sync
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "faq").mkdir()
+    (tmp_path / "manuals").mkdir()
+    (tmp_path / "faq" / "a.txt").write_text("first answer")
+    (tmp_path / "manuals" / "b.txt").write_text("second answer")
+    return tmp_path
+
+
+def manifest_entry(file_path, category, **overrides):
+    stat = os.stat(file_path)
+    entry = {"category": category, "size": stat.st_size, "mtime": stat.st_mtime, "content_hash": file_digest(file_path)}
+    entry.update(overrides)
+    return entry
+
+
+def full_manifest(data_dir):
+    return {
+        str(data_dir / "faq" / "a.txt"): manifest_entry(data_dir / "faq" / "a.txt", "faq"),
+        str(data_dir / "manuals" / "b.txt"): manifest_entry(data_dir / "manuals" / "b.txt", "manuals"),
+    }
+
+
+def test_everything_is_new_without_a_manifest(data_dir):
+    plan = plan_sync(str(data_dir), {})
+    assert sorted(plan.to_process) == [(str(data_dir / "faq" / "a.txt"), "faq"), (str(data_dir / "manuals" / "b.txt"), "manuals")]
+    assert plan.changed == [] and plan.deleted == []
+    assert plan.has_changes
+
+
+def test_unchanged_files_are_not_hashed(data_dir, monkeypatch):
+    manifest = full_manifest(data_dir)
+    monkeypatch.setattr(sync, "file_digest", lambda path: pytest.fail(f"hashed {path}"))
+    plan = plan_sync(str(data_dir), manifest)
+    assert plan.unchanged == 2
+    assert not plan.has_changes
+
+
+def test_a_new_stat_with_the_same_contents_only_touches_the_manifest(data_dir):
+    manifest = full_manifest(data_dir)
+    path = str(data_dir / "faq" / "a.txt")
+    manifest[path]["mtime"] -= 100
+    plan = plan_sync(str(data_dir), manifest)
+    assert [entry["path"] for entry in plan.touched] == [path]
+    assert not plan.has_changes
+
+
+def test_changed_contents_and_moved_categories_are_reprocessed(data_dir):
+    manifest = full_manifest(data_dir)
+    a, b = str(data_dir / "faq" / "a.txt"), str(data_dir / "manuals" / "b.txt")
+    manifest[a].update(mtime=0, content_hash="0" * 64)
+    manifest[b]["category"] = "faq"
+    plan = plan_sync(str(data_dir), manifest)
+    assert sorted(plan.to_process) == [(a, "faq"), (b, "manuals")]
+    assert sorted(plan.changed) == [a, b]
+
+
+def test_manifest_entries_without_a_file_are_deletions(data_dir):
+    manifest = full_manifest(data_dir)
+    gone = str(data_dir / "faq" / "gone.txt")
+    manifest[gone] = {"category": "faq", "size": 1, "mtime": 0.0, "content_hash": "0" * 64}
+    plan = plan_sync(str(data_dir), manifest)
+    assert plan.deleted == [gone]
+    assert "1 deleted" in plan.summary()
+
+
+def test_a_file_whose_stat_fails_is_kept(data_dir):
+    manifest = full_manifest(data_dir)
+    dangling = data_dir / "faq" / "dangling.txt"
+    os.symlink(data_dir / "missing.txt", dangling)
+    manifest[str(dangling)] = {"category": "faq", "size": 1, "mtime": 0.0, "content_hash": "0" * 64}
+    plan = plan_sync(str(data_dir), manifest)
+    assert plan.deleted == []
+    assert plan.to_process == []
+    assert plan.skipped == 1
+
+
+def test_a_file_that_cannot_be_hashed_is_kept(data_dir, monkeypatch):
+    manifest = full_manifest(data_dir)
+    path = str(data_dir / "faq" / "a.txt")
+    manifest[path]["mtime"] -= 100
+
+    def unreadable(file_path):
+        raise PermissionError(f"Permission denied: '{file_path}'")
+
+    monkeypatch.setattr(sync, "file_digest", unreadable)
+    plan = plan_sync(str(data_dir), manifest)
+    assert plan.skipped == 1
+    assert not plan.has_changes and plan.touched == []
+
+
+@pytest.fixture
+def sync_run(data_dir, monkeypatch):
+    """Runs sync_directory on data_dir against an empty manifest with the database and pipeline faked."""
+    saved = []
+    monkeypatch.setattr(main, "load_manifest", lambda table: {})
+    monkeypatch.setattr(main, "touch_manifest", lambda entries, table: True)
+    monkeypatch.setattr(main, "load_embedding_model", lambda: object())
+    monkeypatch.setattr(main, "delete_source_files", lambda paths, deleted, data_table, manifest_table: 0)
+    monkeypatch.setattr(main, "save_manifest", lambda entries, table: saved.extend(entries) or True)
+
+    def run(inserted_by_path):
+        def process_files(files, on_file, table, count_terms):
+            for file_path, category in files:
+                on_file(file_path, category, {}, ["chunk one", "chunk two"], "0" * 64)
+            return {
+                "inserted": sum(inserted_by_path.values()),
+                "inserted_by_path": inserted_by_path,
+                "failed_embedding_chunks": 0,
+                "failed_insert_batches": 0 if sum(inserted_by_path.values()) == 2 * len(files) else 1,
+            }
+
+        monkeypatch.setattr(main, "process_files", process_files)
+        return main.sync_directory(str(data_dir)), [entry["path"] for entry in saved]
+
+    return run
+
+
+def test_sync_records_every_fully_inserted_file(data_dir, sync_run):
+    a, b = str(data_dir / "faq" / "a.txt"), str(data_dir / "manuals" / "b.txt")
+    stats, saved = sync_run({a: 2, b: 2})
+    assert stats["inserted"] == 4 and "inserted_by_path" not in stats
+    assert sorted(saved) == [a, b]
+
+
+def test_sync_leaves_only_short_files_out_of_the_manifest(data_dir, sync_run):
+    a, b = str(data_dir / "faq" / "a.txt"), str(data_dir / "manuals" / "b.txt")
+    stats, saved = sync_run({a: 2, b: 1})
+    assert stats is None # The run still fails
+    assert saved == [a]
@@ -0,0 +1,47 @@
+# tests/test_think_tag_stripper.py
+import pytest
+
+from app.utils import ThinkTagStripper, extract_message_content
+
+
+def stream(chunks):
+    stripper = ThinkTagStripper()
+    return "".join(stripper.feed(chunk) for chunk in chunks) + stripper.flush()
+
+
+def non_streaming(text):
+    return extract_message_content({"message": {"content": text}})
+
+
+@pytest.mark.parametrize("text", [
+    "Plain answer.",
+    "<think>reasoning</think>\n\nThe answer.",
+    "  Leading and trailing whitespace  \n",
+    "Before <THINK>hidden</Think> after.",
+    "<think>a</think> one <think>b</think>\ntwo",
+    "Answer with <b>markup</b> and a < sign.",
+    "Unterminated <think>block stays visible",
+])
+def test_matches_non_streaming_output_for_any_split(text):
+    expected = non_streaming(text)
+    assert stream([text]) == expected
+    assert stream(list(text)) == expected # One character per chunk splits every tag
+    for cut in range(1, len(text)):
+        assert stream([text[:cut], text[cut:]]) == expected
+
+
+def test_holds_back_a_partial_open_tag():
+    stripper = ThinkTagStripper()
+    assert stripper.feed("Hello <thi") == "Hello"
+    assert stripper.feed("nk>secret</think> world") == " world"
+    assert stripper.flush() == ""
+
+
+def test_releases_a_held_back_prefix_that_is_not_a_tag():
+    stripper = ThinkTagStripper()
+    assert stripper.feed("a <th") == "a"
+    assert stripper.feed("is") == " <this"
+
+
+def test_only_a_think_block_gives_no_output():
+    assert stream(["<think>", "all hidden", "</think>", "\n\n"]) == ""
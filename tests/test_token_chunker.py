@@ -0,0 +1,116 @@
+# tests/test_token_chunker.py
+import re
+
+import pytest
+
+from load.processing import TokenChunker
+
+_TOKEN = re.compile(r"\w{1,4}|[^\w\s]") # Words are split into pieces of up to 4 characters
+
+
+class FakeFastTokenizer:
+    """Deterministic stand-in for a Hugging Face fast tokenizer (no model download)."""
+    is_fast = True
+
+    def __init__(self):
+        self.vocab = {}
+        self.pieces = []
+
+    def _encode(self, text):
+        ids, offsets = [], []
+        for match in _TOKEN.finditer(text):
+            if match.group() not in self.vocab:
+                self.vocab[match.group()] = len(self.pieces)
+                self.pieces.append(match.group())
+            ids.append(self.vocab[match.group()])
+            offsets.append(match.span())
+        return ids, offsets
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, verbose=True):
+        if isinstance(text, list):
+            return {"input_ids": [self._encode(item)[0] for item in text]}
+        ids, offsets = self._encode(text)
+        encoding = {"input_ids": ids}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = offsets
+        return encoding
+
+    def decode(self, ids, skip_special_tokens=True):
+        return " ".join(self.pieces[i] for i in ids)
+
+    def count(self, text):
+        return len(self._encode(text)[0])
+
+
+@pytest.fixture
+def tokenizer():
+    return FakeFastTokenizer()
+
+
+def words(text):
+    return re.findall(r"\w+", text)
+
+
+SENTENCES = [f"Sentence number {i} talks about topic {i % 7} in some detail." for i in range(40)]
+
+
+def test_rejects_slow_tokenizers():
+    class SlowTokenizer:
+        is_fast = False
+
+    with pytest.raises(ValueError):
+        TokenChunker(SlowTokenizer(), max_tokens=64)
+
+
+def test_chunks_fit_the_budget_and_cover_the_text(tokenizer):
+    text = " ".join(SENTENCES)
+    chunks = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=8)(text)
+    assert len(chunks) > 1
+    assert all(tokenizer.count(chunk) <= 40 for chunk in chunks)
+    assert set(words(text)) == set(word for chunk in chunks for word in words(chunk))
+
+
+def test_chunks_end_at_sentence_boundaries(tokenizer):
+    chunks = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=0)(" ".join(SENTENCES))
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_paragraph_breaks_win_over_sentence_ends(tokenizer):
+    text = " ".join(SENTENCES[:2]) + "\n\n" + " ".join(SENTENCES[2:5])
+    first = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=0)(text)[0]
+    assert first == " ".join(SENTENCES[:2])
+
+
+def test_consecutive_chunks_overlap_from_a_word_start(tokenizer):
+    chunks = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=10)(" ".join(SENTENCES))
+    for previous, chunk in zip(chunks, chunks[1:]):
+        repeated = chunk[:chunk.index(".") + 1]
+        assert previous.endswith(" " + repeated)
+
+
+def test_overlap_prefers_a_sentence_start(tokenizer):
+    text = " ".join(f"Fact {i} holds." for i in range(60))
+    chunks = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=10)(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.startswith("Fact")
+        assert chunk[:chunk.index(".") + 1] in previous
+
+
+def test_chunk_pages_matches_chunking_the_joined_text(tokenizer):
+    pages = [" ".join(SENTENCES[i:i + 6]) for i in range(0, len(SENTENCES), 6)]
+    chunker = TokenChunker(tokenizer, max_tokens=40, overlap_tokens=8)
+    assert chunker.chunk_pages(iter(pages)) == chunker("\n".join(pages))
+
+
+def test_short_chunks_are_dropped(tokenizer):
+    assert TokenChunker(tokenizer, max_tokens=40, min_chunk_chars=20)("Too short.") == []
+
+
+def test_refit_falls_back_to_cutting_by_token_ids(tokenizer, monkeypatch):
+    chunker = TokenChunker(tokenizer, max_tokens=16, overlap_tokens=0, min_chunk_chars=1)
+    monkeypatch.setattr(chunker, "_split", lambda text, budget: [text]) # No boundary cut ever fits
+    chunk = " ".join(f"word{i}" for i in range(30))
+    parts = chunker._refit(chunk)
+    assert len(parts) > 1
+    assert all(tokenizer.count(part) <= 16 for part in parts)
+    assert " ".join(parts).split() == tokenizer.decode(tokenizer(chunk)["input_ids"]).split()